@@ -0,0 +1,560 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:14:52 2026
+
+Background spectrum acquisition for the HR4000.
+
+One thread owns the spectrometer and reads spectra back to back into a
+preallocated ring buffer. Every frame is stamped with a sequence number,
+the integration time and the start and end of its integration, so a
+consumer can ask for a frame that was taken after some event instead of
+whatever spectrum happened to be read last. Consumers never read the
+spectrometer themselves, so the realtime plot and a measurement can run
+at the same time without duplicate USB reads.
+"""
+
+import threading, time
+import numpy as np
+
+# NUMBER OF FRAMES KEPT IN THE RING BUFFER
+FRAMES = 64
+
+# INFORMATION STORED WITH EVERY FRAME
+FRAME_DTYPE = np.dtype([("sequence", "<i8"),
+                        ("integrationTime", "<f8"),
+                        ("tStart", "<f8"),
+                        ("tEnd", "<f8")])
+
+def main():
+    """
+    For testing
+
+    Returns
+    -------
+    None.
+
+    """
+    import spectrum_analyzer
+
+    SA = spectrum_analyzer.SpectrumAnalyzer()
+    SA.connect()
+
+    ACQ = SpectrumAcquisition(SA)
+    ACQ.start()
+
+    # WAIT FOR A FRAME STARTED AFTER NOW
+    info, y = ACQ.waitForFrame(after = time.time(), timeout = 5)
+    print(info)
+    print(np.max(y))
+
+    ACQ.stop()
+    SA.close()
+
+    return
+
+class SpectrumAcquisition:
+    def __init__(self, osa, frames = FRAMES):
+        """
+        Init method.
+
+        Parameters
+        ----------
+        osa : SpectrumAnalyzer
+            connected spectrum analyzer, only this object reads it once
+            started.
+        frames : int, optional
+            number of frames kept in the ring buffer. The default is FRAMES.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.osa = osa
+        self.wavelengths = osa.wavelengths
+        self.frames = frames
+
+        # PREALLOCATED RING BUFFER
+        self.intensities = np.zeros((frames, len(self.wavelengths)))
+        self.info = np.zeros(frames, dtype = FRAME_DTYPE)
+
+        # NUMBER OF FRAMES TAKEN, FRAME k IS IN SLOT k % frames
+        self.count = 0
+
+        # NEW FRAMES ARE ANNOUNCED THROUGH THE CONDITION
+        self.condition = threading.Condition()
+        self.subscribers = []
+
+        # PENDING INTEGRATION TIME CHANGE
+        self.integrationTime = osa.integration_time
+        self.newIntegrationTime = None
+
+        # THREAD CONTROL
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.error = None
+
+        return
+
+    def start(self):
+        """
+        Start the acquisition thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        if(self.thread.is_alive() == False):
+            self.stopEvent.clear()
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.thread.start()
+
+        return
+
+    def stop(self, timeout = 5):
+        """
+        Stop the acquisition thread after the current read finishes.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            seconds to wait for the thread. The default is 5.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stopEvent.set()
+        if(self.thread.is_alive()):
+            self.thread.join(timeout)
+
+        # WAKE ANYONE STILL WAITING FOR A FRAME
+        with self.condition:
+            self.condition.notify_all()
+
+        return
+
+    def isRunning(self):
+        """
+        Check if the acquisition thread is running.
+
+        Returns
+        -------
+        bool
+            True if frames are being taken.
+
+        """
+        return self.thread.is_alive() and self.stopEvent.is_set() == False
+
+    def setIntegrationTime(self, integrationTime):
+        """
+        Change the integration time, applied before the next read.
+
+        Parameters
+        ----------
+        integrationTime : int
+            integration time in micro-seconds.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.condition:
+            self.newIntegrationTime = integrationTime
+
+        return
+
+    def subscribe(self, callback):
+        """
+        Call a function with every new frame.
+
+        The callback runs on the acquisition thread with the frame info and
+        a view of the ring buffer slot. It must return quickly and copy the
+        intensities if it keeps them.
+
+        Parameters
+        ----------
+        callback : function
+            called as callback(info, intensities).
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.condition:
+            self.subscribers.append(callback)
+
+        return
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling a function subscribed with subscribe.
+
+        Parameters
+        ----------
+        callback : function
+            subscribed function.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.condition:
+            if(callback in self.subscribers):
+                self.subscribers.remove(callback)
+
+        return
+
+    def run(self):
+        """
+        Acquisition loop, runs on the acquisition thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        while(self.stopEvent.is_set() == False):
+
+            # APPLY A PENDING INTEGRATION TIME CHANGE BETWEEN READS
+            with self.condition:
+                integrationTime = self.newIntegrationTime
+                self.newIntegrationTime = None
+            try:
+                if(integrationTime != None):
+                    self.osa.spec.integration_time_micros(integrationTime)
+                    self.osa.integration_time = integrationTime
+                    self.integrationTime = integrationTime
+
+                    # THE FIRST SPECTRUM AFTER A CHANGE IS FROM THE OLD SETTING
+                    self.osa.spec.intensities()
+
+                # READ THE NEXT SPECTRUM
+                tRequest = time.time()
+                y = self.osa.spec.intensities()
+                tEnd = time.time()
+
+            except Exception as e:
+                # KEEP THE ERROR FOR CONSUMERS AND TRY AGAIN
+                self.error = e
+                print("Spectrum acquisition error: {}".format(e))
+                self.stopEvent.wait(0.5)
+                continue
+
+            # DATE THE START EARLY RATHER THAN LATE, THE EARLIER OF THE
+            # REQUEST AND ONE INTEGRATION BEFORE THE READ FINISHED
+            tStart = min(tRequest, tEnd - self.integrationTime * 1e-6)
+
+            # STORE THE FRAME
+            with self.condition:
+                slot = self.count % self.frames
+                self.intensities[slot] = y
+                self.info[slot] = (self.count, self.integrationTime, tStart, tEnd)
+                self.count = self.count + 1
+                self.error = None
+                subscribers = list(self.subscribers)
+                self.condition.notify_all()
+
+            # PASS THE FRAME ON
+            for callback in subscribers:
+                try:
+                    callback(self.info[slot], self.intensities[slot])
+                except Exception as e:
+                    print("Spectrum subscriber error: {}".format(e))
+
+        return
+
+    def _find(self, after, sequence, integrationTime = None):
+        """
+        Find the oldest buffered frame matching a request, the condition
+        must be held.
+
+        Returns
+        -------
+        int
+            ring buffer slot, None if no frame matches.
+
+        """
+        first = max(0, self.count - self.frames)
+        for k in range(first, self.count):
+            slot = k % self.frames
+            info = self.info[slot]
+            if(after != None and info["tStart"] < after):
+                continue
+            if(sequence != None and info["sequence"] <= sequence):
+                continue
+            if(integrationTime != None and info["integrationTime"] != integrationTime):
+                continue
+            return slot
+
+        return None
+
+    def waitForFrame(self, after = None, sequence = None, integrationTime = None, timeout = None):
+        """
+        Wait for the first complete frame matching a request.
+
+        Parameters
+        ----------
+        after : float, optional
+            only accept a frame whose integration started at or after this
+            time.time() value. The default is None.
+        sequence : int, optional
+            only accept a frame newer than this sequence number. The
+            default is None.
+        integrationTime : float, optional
+            only accept a frame with this integration time. The default is
+            any.
+        timeout : float, optional
+            seconds to wait. The default is to wait forever.
+
+        Raises
+        ------
+        TimeoutError
+            no matching frame arrived in time or acquisition stopped.
+
+        Returns
+        -------
+        info : numpy record
+            sequence, integrationTime, tStart and tEnd of the frame.
+        y : numpy array
+            copy of the intensities.
+
+        """
+        if(after == None and sequence == None):
+            sequence = self.count - 1
+        deadline = None if timeout == None else time.time() + timeout
+
+        with self.condition:
+            while(True):
+                slot = self._find(after, sequence, integrationTime)
+                if(slot != None):
+                    return self.info[slot].copy(), self.intensities[slot].copy()
+
+                # GIVE UP IF THE THREAD STOPPED OR THE TIME RAN OUT
+                if(self.isRunning() == False):
+                    raise TimeoutError("Spectrum acquisition is not running")
+                remaining = None if deadline == None else deadline - time.time()
+                if(remaining != None and remaining <= 0):
+                    raise TimeoutError("No spectrum received in {} s".format(timeout))
+                self.condition.wait(remaining)
+
+        return
+
+    def averageFrames(self, averager, count, after = None, integrationTime = None, timeout = None):
+        """
+        Average the newest frames started after a time, waiting only if not
+        enough have been taken yet. Frames taken during a dwell are used, so
+        averaging adds no time when the dwell is long enough.
+
+        Parameters
+        ----------
+        averager : FrameAverager
+            averager to reset and fill.
+        count : int
+            number of frames to average.
+        after : float, optional
+            only use frames whose integration started at or after this
+            time.time() value. The default is frames taken from now on.
+        integrationTime : float, optional
+            only use frames with this integration time. The default is any.
+        timeout : float, optional
+            seconds to wait. The default is to wait forever.
+
+        Raises
+        ------
+        TimeoutError
+            not enough frames arrived in time or acquisition stopped.
+
+        Returns
+        -------
+        info : numpy record
+            sequence and tEnd of the last frame, tStart of the first frame
+            and the integration time.
+
+        """
+        if(after == None):
+            after = time.time()
+        deadline = None if timeout == None else time.time() + timeout
+
+        with self.condition:
+            while(True):
+                # NEWEST FRAMES THAT STARTED AFTER THE TIME
+                first = max(0, self.count - self.frames)
+                slots = [k % self.frames for k in range(first, self.count)
+                         if self.info[k % self.frames]["tStart"] >= after
+                         and (integrationTime == None or self.info[k % self.frames]["integrationTime"] == integrationTime)]
+                if(len(slots) >= count):
+                    break
+
+                # GIVE UP IF THE THREAD STOPPED OR THE TIME RAN OUT
+                if(self.isRunning() == False):
+                    raise TimeoutError("Spectrum acquisition is not running")
+                remaining = None if deadline == None else deadline - time.time()
+                if(remaining != None and remaining <= 0):
+                    raise TimeoutError("Only {} of {} spectra received in {} s".format(len(slots), count, timeout))
+                self.condition.wait(remaining)
+
+            # AVERAGE THEM WHILE THE RING BUFFER IS LOCKED
+            slots = slots[-count:]
+            averager.reset()
+            for slot in slots:
+                averager.add(self.intensities[slot])
+            info = self.info[slots[-1]].copy()
+            info["tStart"] = self.info[slots[0]]["tStart"]
+
+        return info
+
+    def getLatest(self):
+        """
+        Get the most recent frame without waiting.
+
+        Returns
+        -------
+        info : numpy record
+            frame information, None if no frame has been taken.
+        y : numpy array
+            copy of the intensities.
+
+        """
+        with self.condition:
+            if(self.count == 0):
+                return None, None
+            slot = (self.count - 1) % self.frames
+
+            return self.info[slot].copy(), self.intensities[slot].copy()
+
+class DarkFrameManager:
+    def __init__(self, maxAge = 600):
+        """
+        Dark spectra taken with the laser off, one per integration time.
+
+        Parameters
+        ----------
+        maxAge : float, optional
+            seconds before a dark spectrum is too old to use. The default
+            is 600.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.maxAge = maxAge
+
+        # DARK SPECTRA AS (time taken, intensities), KEYED BY INTEGRATION TIME
+        self.darks = {}
+
+        return
+
+    def store(self, integrationTime, y, t = None):
+        """
+        Store a dark spectrum.
+
+        Parameters
+        ----------
+        integrationTime : float
+            integration time in micro-seconds.
+        y : numpy array
+            dark intensities.
+        t : float, optional
+            time.time() the dark was taken. The default is now.
+
+        Returns
+        -------
+        None.
+
+        """
+        if(t == None):
+            t = time.time()
+        self.darks[float(integrationTime)] = (t, np.array(y, dtype = float))
+
+        return
+
+    def capture(self, acquisition, averager, count, after, integrationTime = None, timeout = None):
+        """
+        Capture a dark spectrum from frames taken with the laser off.
+
+        Parameters
+        ----------
+        acquisition : SpectrumAcquisition
+            running acquisition.
+        averager : FrameAverager
+            averager to use.
+        count : int
+            number of frames to average.
+        after : float
+            time.time() the laser was turned off.
+        integrationTime : float, optional
+            integration time to capture the dark for. The default is the
+            current integration time.
+        timeout : float, optional
+            seconds to wait. The default is to wait forever.
+
+        Returns
+        -------
+        info : numpy record
+            frame information of the dark spectrum.
+        y : numpy array
+            dark intensities.
+
+        """
+        if(integrationTime == None):
+            integrationTime = acquisition.integrationTime
+        info = acquisition.averageFrames(averager, count, after = after, integrationTime = integrationTime, timeout = timeout)
+        y = averager.getMean()
+        self.store(integrationTime, y, info["tEnd"])
+
+        return info, y
+
+    def get(self, integrationTime):
+        """
+        Get the dark spectrum for an integration time.
+
+        Parameters
+        ----------
+        integrationTime : float
+            integration time in micro-seconds.
+
+        Returns
+        -------
+        numpy array
+            dark intensities, None if there is none or it is too old.
+
+        """
+        dark = self.darks.get(float(integrationTime))
+        if(dark == None or time.time() - dark[0] > self.maxAge):
+            return None
+
+        return dark[1]
+
+    def subtract(self, y, integrationTime):
+        """
+        Subtract the dark spectrum from a spectrum in place.
+
+        Parameters
+        ----------
+        y : numpy array
+            float intensities, modified in place.
+        integrationTime : float
+            integration time of the spectrum in micro-seconds.
+
+        Returns
+        -------
+        bool
+            True if a dark spectrum was subtracted.
+
+        """
+        dark = self.get(integrationTime)
+        if(dark is None):
+            return False
+        y -= dark
+
+        return True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:25:07 2026
+
+Cache of dutyCycleData analysis results.
+
+Results are keyed by the spectrum file path, size and modification time
+plus dataanalysis.ANALYSIS_VERSION, so a file that changes or an analysis
+change makes the old entry unreachable. Recently used results are kept in
+memory and every result is written to a size bounded folder on disk, the
+least recently used files are deleted when the folder grows too large.
+"""
+
+import os, hashlib
+import numpy as np
+from collections import OrderedDict
+import threading
+
+import dataanalysis
+
+# DEFAULT CACHE LOCATION AND SIZE
+CACHE_FOLDER = os.path.join(os.path.expanduser("~"), ".sets", "cache")
+MEMORY_ENTRIES = 512
+DISK_BYTES = 256 * 1024**2
+
+# SCALAR RESULTS, STORED AHEAD OF THE x, y AND yf ARRAYS
+SCALARS = ["dutyCycle", "reliable", "wMean", "sdev", "skew", "kurt"]
+
+def pack(results):
+    """
+    Pack results into one float array for the disk cache.
+
+    Parameters
+    ----------
+    results : dict
+        results from dutyCycleData.getResults.
+
+    Returns
+    -------
+    numpy array
+        scalars followed by the x, y and yf arrays.
+
+    """
+    scalars = [float(results[name]) for name in SCALARS]
+
+    return np.concatenate((scalars, results["x"], results["y"], results["yf"]))
+
+def unpack(data):
+    """
+    Unpack a float array from pack.
+
+    Parameters
+    ----------
+    data : numpy array
+        packed results.
+
+    Returns
+    -------
+    dict
+        results in the dutyCycleData.getResults layout.
+
+    """
+    results = {name : float(value) for name, value in zip(SCALARS, data)}
+    results["reliable"] = bool(results["reliable"])
+    x, y, yf = np.split(data[len(SCALARS):], 3)
+    results["x"] = x
+    results["y"] = y
+    results["yf"] = yf
+
+    return results
+
+class AnalysisCache:
+    def __init__(self, folder = CACHE_FOLDER, memoryEntries = MEMORY_ENTRIES, diskBytes = DISK_BYTES, version = dataanalysis.ANALYSIS_VERSION):
+        """
+        Init method.
+
+        Parameters
+        ----------
+        folder : str, optional
+            folder for the disk cache, None to only cache in memory.
+        memoryEntries : int, optional
+            number of results kept in memory.
+        diskBytes : int, optional
+            maximum size of the disk cache in bytes.
+        version : str, optional
+            analysis version the results belong to.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.folder = folder
+        self.memoryEntries = memoryEntries
+        self.diskBytes = diskBytes
+        self.version = version
+
+        # IN MEMORY TIER, MOST RECENTLY USED LAST
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        # SIZE OF THE DISK TIER, FOUND ON FIRST WRITE
+        self.diskSize = None
+
+        # HIT COUNTERS
+        self.hits = 0
+        self.misses = 0
+
+        return
+
+    def key(self, filename):
+        """
+        Generate the cache key for a file.
+
+        Parameters
+        ----------
+        filename : str
+            spectrum file.
+
+        Returns
+        -------
+        str
+            key, None if the file does not exist.
+
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        text = "|".join([os.path.abspath(filename), str(stat.st_size), str(stat.st_mtime_ns), self.version])
+
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def load(self, filename):
+        """
+        Load the cached results for a file.
+
+        Parameters
+        ----------
+        filename : str
+            spectrum file.
+
+        Returns
+        -------
+        dict
+            results from dutyCycleData.getResults, None if not cached.
+
+        """
+        key = self.key(filename)
+        if(key == None):
+            return None
+
+        # CHECK MEMORY
+        with self.lock:
+            if(key in self.memory):
+                self.memory.move_to_end(key)
+                self.hits = self.hits + 1
+                return self.memory[key]
+
+        # CHECK DISK
+        results = None
+        if(self.folder != None):
+            path = os.path.join(self.folder, key + ".npy")
+            try:
+                results = unpack(np.load(path))
+
+                # MARK AS RECENTLY USED
+                os.utime(path)
+            except (OSError, ValueError, KeyError):
+                results = None
+
+        with self.lock:
+            if(results == None):
+                self.misses = self.misses + 1
+                return None
+            self.hits = self.hits + 1
+        self._remember(key, results)
+
+        return results
+
+    def store(self, filename, results):
+        """
+        Store the results for a file.
+
+        Parameters
+        ----------
+        filename : str
+            spectrum file.
+        results : dict
+            results from dutyCycleData.getResults.
+
+        Returns
+        -------
+        None.
+
+        """
+        key = self.key(filename)
+        if(key == None):
+            return
+
+        self._remember(key, results)
+
+        if(self.folder == None):
+            return
+
+        # WRITE TO A TEMPORARY FILE AND MOVE IT INTO PLACE
+        os.makedirs(self.folder, exist_ok = True)
+        path = os.path.join(self.folder, key + ".npy")
+        tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, pack(results))
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("Analysis cache write failed: {}".format(e))
+            return
+
+        # KEEP THE DISK TIER UNDER ITS SIZE LIMIT
+        with self.lock:
+            if(self.diskSize == None):
+                self.diskSize = self._scan()[1]
+            else:
+                self.diskSize = self.diskSize + size
+            if(self.diskSize > self.diskBytes):
+                self._evict()
+
+        return
+
+    def clear(self):
+        """
+        Delete every cached result.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.lock:
+            self.memory.clear()
+            if(self.folder != None):
+                for path, size, mtime in self._scan()[0]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            self.diskSize = 0
+
+        return
+
+    def _remember(self, key, results):
+        """
+        Put results in the memory tier, dropping the least recently used.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.lock:
+            self.memory[key] = results
+            self.memory.move_to_end(key)
+            while(len(self.memory) > self.memoryEntries):
+                self.memory.popitem(last = False)
+
+        return
+
+    def _scan(self):
+        """
+        List the disk cache files.
+
+        Returns
+        -------
+        entries : list
+            (path, size, mtime) of every cache file.
+        total : int
+            total size in bytes.
+
+        """
+        entries = []
+        try:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if(entry.name.endswith(".npy")):
+                        stat = entry.stat()
+                        entries.append((entry.path, stat.st_size, stat.st_mtime))
+        except OSError:
+            pass
+
+        return entries, sum(entry[1] for entry in entries)
+
+    def _evict(self):
+        """
+        Delete the least recently used disk files until the cache is 90% of
+        its size limit.
+
+        Returns
+        -------
+        None.
+
+        """
+        entries, self.diskSize = self._scan()
+        entries.sort(key = lambda entry: entry[2])
+        for path, size, mtime in entries:
+            if(self.diskSize <= 0.9 * self.diskBytes):
+                break
+            try:
+                os.remove(path)
+                self.diskSize = self.diskSize - size
+            except OSError:
+                pass
+
+        return
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:40:33 2026
+
+Reprocess every hexel under the save folder with the current analysis.
+
+Each Hexel*-* folder is analyzed with dataanalysis.hexelData in a process
+pool and the results are streamed into one table with a row per emitter
+and duty cycle. A log next to the table records every finished hexel and
+the table size after it, so an interrupted run picks up where it stopped.
+
+Usage:
+    python batch_analysis.py [root] [-o table.csv] [-w workers] [-c chunksize]
+"""
+
+import os, csv, time, argparse, configparser
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import dataanalysis as da
+import spectrum_files
+
+# TABLE COLUMNS
+COLUMNS = ["hexel", "emitter", "dutyCycle", "reliable", "wMean", "sdev", "skew", "kurt",
+           "dT", "dT_New", "slope", "intercept", "rsquare", "cwwl", "version", "path"]
+
+def main():
+    # DEFAULT ROOT FROM THE MEASUREMENT SETTINGS
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'measurement_settings.cfg'))
+    root = config.get('MEASUREMENT SETTINGS', 'Save_Folder', fallback = 'testdata')
+
+    parser = argparse.ArgumentParser(description = "Reprocess every hexel under a folder.")
+    parser.add_argument("root", nargs = "?", default = root, help = "folder to search for hexels")
+    parser.add_argument("-o", "--output", default = "sets_analysis.csv", help = "table to write")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "worker processes")
+    parser.add_argument("-c", "--chunksize", type = int, default = 4, help = "hexels per task")
+    args = parser.parse_args()
+
+    reprocess(args.root, args.output, args.workers, args.chunksize)
+
+    return
+
+def findHexels(root):
+    """
+    Find every hexel folder under a folder.
+
+    Parameters
+    ----------
+    root : str
+        folder to search.
+
+    Returns
+    -------
+    list
+        sorted hexel folder paths.
+
+    """
+    hexels = []
+    for path, folders, files in os.walk(root):
+        name = os.path.basename(path)
+        if(name.startswith("Hexel") and "-" in name):
+            if(spectrum_files.RUNFILE in files or any(f.startswith("emitter-") for f in folders)):
+                hexels.append(path)
+
+                # DO NOT SEARCH INSIDE A HEXEL
+                folders[:] = []
+
+    return sorted(hexels)
+
+def analyzeHexel(path):
+    """
+    Analyze one hexel folder.
+
+    Parameters
+    ----------
+    path : str
+        hexel folder.
+
+    Returns
+    -------
+    path : str
+        hexel folder.
+    rows : list
+        table rows, one per emitter and duty cycle.
+    nfiles : int
+        number of spectra analyzed.
+    error : str
+        error message, None if the hexel was analyzed.
+
+    """
+    try:
+        hexel = os.path.basename(path)
+        runfile = os.path.join(path, spectrum_files.RUNFILE)
+
+        # ANALYZE THE WHOLE HEXEL AT ONCE
+        HX = da.hexelData()
+        if(os.path.exists(runfile)):
+            HX.loadRunFile(runfile)
+        else:
+            emitters = sorted(f for f in os.listdir(path) if f.startswith("emitter-"))
+            HX.loadFolder(path, emitters)
+
+        # CW WAVELENGTH COLUMN
+        cw = np.where(HX.dutyCycles == 99)[0]
+
+        rows = []
+        for i, title in enumerate(HX.titles):
+            cwwl = HX.wMean[i, cw[0]] if len(cw) > 0 else np.nan
+            for j, dc in enumerate(HX.dutyCycles):
+                if(HX.present[i, j] == False):
+                    continue
+                rows.append([hexel, title.split("-")[-1], dc, int(HX.reliable[i, j]),
+                             HX.wMean[i, j], HX.sdev[i, j], HX.skew[i, j], HX.kurt[i, j],
+                             HX.dT[i], HX.slope[i] / 0.06 * 100, HX.slope[i], HX.intercept[i],
+                             HX.rsquare[i], cwwl, da.ANALYSIS_VERSION, path])
+
+        return path, rows, int(np.sum(HX.present)), None
+
+    except Exception as ex:
+        return path, [], 0, "{}: {}".format(type(ex).__name__, ex)
+
+def readLog(logname):
+    """
+    Read the log of finished hexels.
+
+    Parameters
+    ----------
+    logname : str
+        log file.
+
+    Returns
+    -------
+    done : set
+        hexel folders finished with the current analysis version.
+    size : int
+        table size in bytes after the last finished hexel.
+
+    """
+    done = set()
+    size = 0
+    if(os.path.exists(logname)):
+        with open(logname, 'r') as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if(len(parts) != 4):
+                    continue
+                version, status, tablesize, path = parts
+                if(version != da.ANALYSIS_VERSION):
+                    continue
+                size = int(tablesize)
+                if(status == "OK"):
+                    done.add(path)
+
+    return done, size
+
+def reprocess(root, output, workers = None, chunksize = 4):
+    """
+    Reprocess every hexel under a folder into one table.
+
+    Parameters
+    ----------
+    root : str
+        folder to search for hexels.
+    output : str
+        table to write, rows are appended when resuming.
+    workers : int, optional
+        number of worker processes. The default is the number of CPUs.
+    chunksize : int, optional
+        hexels sent to a worker at a time. The default is 4.
+
+    Returns
+    -------
+    None.
+
+    """
+    logname = output + ".log"
+
+    # SKIP HEXELS FINISHED BY AN EARLIER RUN, DROP ANY HALF WRITTEN ROWS
+    done, size = readLog(logname)
+    if(os.path.exists(output) and size > 0):
+        with open(output, 'r+b') as f:
+            f.truncate(size)
+    elif(os.path.exists(output)):
+        os.remove(output)
+
+    hexels = [path for path in findHexels(root) if path not in done]
+    print("Found {} hexels to analyze, {} already done.".format(len(hexels), len(done)))
+    if(len(hexels) == 0):
+        return
+
+    start = time.perf_counter()
+    nfiles = 0
+    nerrors = 0
+    with open(output, 'a', newline = '') as table, open(logname, 'a') as log:
+        writer = csv.writer(table)
+        if(table.tell() == 0):
+            writer.writerow(COLUMNS)
+
+        # FAN THE HEXELS OUT ACROSS THE POOL AND STREAM THE RESULTS
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            for k, (path, rows, n, error) in enumerate(pool.map(analyzeHexel, hexels, chunksize = chunksize)):
+                if(error != None):
+                    nerrors = nerrors + 1
+                    print("...{}\n......{}".format(path, error))
+                else:
+                    writer.writerows(rows)
+                table.flush()
+                log.write("\t".join([da.ANALYSIS_VERSION, "OK" if error == None else "ERROR", str(table.tell()), path]) + "\n")
+                log.flush()
+
+                # REPORT PROGRESS
+                nfiles = nfiles + n
+                elapsed = time.perf_counter() - start
+                print("{}/{} hexels, {} files, {:.1f} files/s".format(k + 1, len(hexels), nfiles, nfiles / elapsed))
+
+    elapsed = time.perf_counter() - start
+    print("Finished {} hexels ({} errors) in {:.1f} s, {:.1f} files/s.".format(len(hexels), nerrors, elapsed, nfiles / elapsed))
+
+    return
+
+if __name__ == "__main__":
+    main()
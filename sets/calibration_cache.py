@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:31:16 2026
+
+IDs of spectrometer wavelength calibrations.
+
+Each calibration has an ID made from the spectrometer serial number and a
+hash of the wavelength array, so a recalibrated or swapped spectrometer
+gets a new ID. The ID is written into the run file metadata so saved data
+names the calibration it was taken with, and dataanalysis looks the
+analysis window up by it.
+"""
+
+import hashlib
+import numpy as np
+
+def calibrationId(serial, wavelengths):
+    """
+    Generate the ID of a calibration.
+
+    Parameters
+    ----------
+    serial : str
+        spectrometer serial number.
+    wavelengths : numpy array
+        wavelength axis.
+
+    Returns
+    -------
+    str
+        calibration ID, "serial-hash".
+
+    """
+    digest = hashlib.sha1(np.asarray(wavelengths, dtype = "<f8").tobytes()).hexdigest()
+
+    return "{}-{}".format(serial, digest[:12])
@@ -27,15 +27,427 @@ A linear regression fit to the data – Wavelength vs Duty Cycle for each emitte
 # from scipy import stats as sts
 import numpy as np # for data manipulation
 import os # for directory navigating
-import math # for math
-import matplotlib.pyplot as plt # for plotting
+import threading # for the shared calibrations
+import lazy_import # for deferred imports
 from operator import attrgetter # for sortings
+from collections import deque # for sliding windows
+import spectrum_files # for reading spectrum files
+
+# PLOTTING IS ONLY LOADED WHEN A FIGURE IS MADE
+plt = lazy_import.LazyModule("matplotlib.pyplot")
 
 
 # CONSTANTS
 FH = 6.35
 FW = 8.9
 
+# CHANGE WHENEVER THE ANALYSIS PARAMETERS CHANGE SO CACHED RESULTS ARE REDONE
+# 2022-11-16: window changed to 425-460 nm
+ANALYSIS_VERSION = "2022-11-16"
+
+# WAVELENGTH RANGE ANALYZED IN nm
+WINDOW_START = 425
+WINDOW_END = 460
+
+# PEAK TO PEAK COUNTS IN THE WINDOW FOR A SPECTRUM TO BE RELIABLE
+# RAW COUNTS ON PURPOSE, THE GATE TELLS A PEAK FROM THE READ NOISE, WHICH DOES
+# NOT SCALE WITH INTEGRATION TIME, SO SCALING THE COUNTS WOULD PASS NOISE
+# TAKEN AT SHORT INTEGRATION TIMES
+RELIABLE_COUNTS = 200
+
+# WAVELENGTH CALIBRATIONS IN USE, MOST RECENTLY USED LAST
+# THE ACQUISITION AND THE ANALYSIS THREADS BOTH LOOK THEM UP
+CALIBRATIONS = []
+CALIBRATIONS_LOCK = threading.Lock()
+MAX_CALIBRATIONS = 4
+
+class wavelengthCalibration:
+    def __init__(self, x, calcwidth = 2.0, halfwidth = 10.0, ID = None):
+        """
+        Index lookups for one spectrometer wavelength axis, worked out once
+        so spectra on that axis can be analyzed without searching it.
+
+        Parameters
+        ----------
+        x : numpy array
+            full wavelength axis of the spectrometer.
+        calcwidth : float, optional
+            half width in nm of the window kept for the moments. The default is 2.0.
+        halfwidth : float, optional
+            half width in nm of the peak excluded from the floor. The default is 10.0.
+        ID : str, optional
+            calibration ID from calibration_cache.calibrationId. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        # THE CALLER'S ARRAY IS KEPT SO PASSING IT AGAIN MATCHES WITHOUT A COMPARE
+        self.axis = np.asarray(x)
+        self.id = ID
+        self.calcwidth = calcwidth
+        self.halfwidth = halfwidth
+        
+        # ANALYSIS WINDOW, FIRST PIXELS ABOVE WINDOW_START AND WINDOW_END
+        index_start = np.searchsorted(self.axis, WINDOW_START, side = 'right')
+        index_end = np.searchsorted(self.axis, WINDOW_END, side = 'right')
+        self.window = slice(index_start, index_end)
+        self.x = self.axis[self.window]
+        
+        # WAVELENGTH SPACING BELOW EACH PIXEL OF THE WINDOW
+        self.spacing = self.x - np.roll(self.x, 1)
+        
+        # PEAK AND CALCULATION HALF WIDTHS IN PIXELS AT EACH PIXEL
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            self.dIndex = np.trunc(halfwidth / self.spacing).astype(int)
+            self.cIndex = np.trunc(calcwidth / self.spacing).astype(int)
+        
+        return
+    
+    def matches(self, x, calcwidth = 2.0, halfwidth = 10.0, ID = None):
+        """
+        Check if this calibration belongs to a wavelength axis, by its ID
+        when both have one and by comparing the axis otherwise.
+
+        Parameters
+        ----------
+        x : numpy array
+            full wavelength axis.
+        calcwidth : float, optional
+            calculation half width in nm. The default is 2.0.
+        halfwidth : float, optional
+            peak half width in nm. The default is 10.0.
+        ID : str, optional
+            calibration ID of x. The default is None.
+
+        Returns
+        -------
+        bool
+            True if the calibration can be used for x.
+
+        """
+        if(calcwidth != self.calcwidth or halfwidth != self.halfwidth):
+            return False
+        if(ID != None and self.id != None):
+            return ID == self.id
+        
+        return x is self.axis or np.array_equal(x, self.axis)
+
+def getCalibration(x, calcwidth = 2.0, halfwidth = 10.0, ID = None):
+    """
+    Get the wavelength calibration for a wavelength axis, creating it the
+    first time the axis is seen. Callers that keep the axis should keep
+    the calibration's axis, it matches without comparing the arrays.
+
+    Parameters
+    ----------
+    x : numpy array
+        full wavelength axis.
+    calcwidth : float, optional
+        half width in nm of the window kept for the moments. The default is 2.0.
+    halfwidth : float, optional
+        half width in nm of the peak excluded from the floor. The default is 10.0.
+    ID : str, optional
+        calibration ID of x, a calibration with the same ID is used without
+        comparing the axis. The default is None.
+
+    Returns
+    -------
+    wavelengthCalibration
+        calibration for x.
+
+    """
+    with CALIBRATIONS_LOCK:
+        for i in range(len(CALIBRATIONS) - 1, -1, -1):
+            cal = CALIBRATIONS[i]
+            if(cal.matches(x, calcwidth, halfwidth, ID)):
+                if(i != len(CALIBRATIONS) - 1):
+                    CALIBRATIONS.append(CALIBRATIONS.pop(i))
+                return cal
+        
+        cal = wavelengthCalibration(x, calcwidth, halfwidth, ID)
+        CALIBRATIONS.append(cal)
+        if(len(CALIBRATIONS) > MAX_CALIBRATIONS):
+            CALIBRATIONS.pop(0)
+    
+    return cal
+
+def getMoments(x, yf):
+    """
+    Weighted mean, standard deviation, skew and kurtosis for a stack of
+    normalized spectra that share one wavelength axis.
+
+    Parameters
+    ----------
+    x : numpy array
+        wavelength axis, shape (pixels,).
+    yf : numpy array
+        normalized intensities, shape (pixels,) or (N spectra, pixels).
+
+    Returns
+    -------
+    mean : numpy array
+        weighted mean for each spectrum, shape (N,).
+    sdev : numpy array
+        standard deviation for each spectrum.
+    skew : numpy array
+        skew for each spectrum.
+    kurt : numpy array
+        kurtosis for each spectrum.
+
+    """
+    # TREAT A SINGLE SPECTRUM AS A STACK OF ONE
+    yf = np.atleast_2d(yf)
+    
+    # WEIGHTED MEAN FOR EVERY SPECTRUM AT ONCE
+    mean = yf @ x
+    
+    # CENTERED POWERS, EACH ONE BUILT FROM THE PREVIOUS
+    d1 = x[np.newaxis,:] - mean[:,np.newaxis]
+    d2 = d1 * d1
+    m2 = np.einsum('ij,ij->i', d2, yf)
+    d1 *= d2
+    m3 = np.einsum('ij,ij->i', d1, yf)
+    d2 *= d2
+    m4 = np.einsum('ij,ij->i', d2, yf)
+    
+    # SCALE THE MOMENTS BY THE STANDARD DEVIATION
+    sdev = np.sqrt(np.abs(m2))
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        skew = m3 / sdev**3
+        kurt = m4 / sdev**4
+    
+    return mean, sdev, skew, kurt
+
+def parseDutyCycle(filename):
+    """
+    Parse the duty cycle from a dc-XX.csv filename.
+
+    Parameters
+    ----------
+    filename : str
+        filename with or without the folder path.
+
+    Returns
+    -------
+    float
+        duty cycle in percent.
+
+    """
+    name = filename.replace("/", "\\").split("\\")[-1]
+    
+    return float(name.strip('.csv').strip('dc-'))
+
+def normalizeSpectra(y, cal, reliable = None, floor = True):
+    """
+    Subtract the floor, zero everything outside the peak window and
+    normalize, for one spectrum or a stack of spectra.
+
+    Parameters
+    ----------
+    y : numpy array
+        windowed intensities, shape (pixels,) or (N spectra, pixels).
+    cal : wavelengthCalibration
+        calibration of the wavelength axis.
+    reliable : numpy array, optional
+        bool array marking the spectra with a peak, the others are set to
+        0. The default is all spectra.
+    floor : bool or numpy array, optional
+        subtract the floor found outside the peak, False for spectra that
+        already had a dark frame subtracted, or one bool per spectrum. The
+        default is True.
+
+    Returns
+    -------
+    numpy array
+        normalized intensities, same shape as y.
+
+    """
+    single = np.ndim(y) == 1
+    y = np.atleast_2d(y)
+    n = y.shape[1]
+    if(reliable is None):
+        reliable = np.ones(len(y), dtype = bool)
+    
+    # FIND THE INDEX OF THE MAX PEAK
+    index = np.argmax(y, axis = 1)
+    
+    # DEFINE DATA WITHOUT PEAKS AKA FLOOR, FOR THE SPECTRA THAT NEED IT
+    pixels = np.arange(n)[np.newaxis,:]
+    subtract = np.broadcast_to(floor, (len(y),))
+    floor = np.zeros(len(y))
+    if(np.any(subtract)):
+        d_index = cal.dIndex[index]
+        dplus_index = np.minimum(index + d_index, n)[:,np.newaxis]
+        dminus_index = np.maximum(index - d_index, 0)[:,np.newaxis]
+        outside = (pixels < dminus_index) | (pixels >= dplus_index)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            floor = np.where(subtract, np.sum(y * outside, axis = 1) / np.sum(outside, axis = 1), 0.0)
+    
+    # SUBTRACT THE FLOOR AND DEFINE DATA OUTSIDE OF PEAKS AS 0
+    c_index = cal.cIndex[index]
+    c_minus = (index - c_index)[:,np.newaxis]
+    c_plus = (index + c_index)[:,np.newaxis]
+    yf = np.where((pixels < c_minus) | (pixels > c_plus), 0.0, y - floor[:,np.newaxis])
+    
+    # NORMALIZE, NOISE ONLY SPECTRA ARE SET TO 0
+    yf[~reliable] = 0.0
+    total = np.sum(yf, axis = 1)
+    total[~reliable] = 1.0
+    yf /= total[:,np.newaxis]
+    
+    return yf[0] if single else yf
+
+def filteredMoments(x, y, filterlv = 0.0015, floor = True):
+    """
+    Moments of raw spectra after removing the minimum and zeroing every
+    pixel below a fraction of the total, for one spectrum or a stack.
+
+    Parameters
+    ----------
+    x : numpy array
+        wavelength axis, shape (pixels,).
+    y : numpy array
+        intensities, shape (pixels,) or (N spectra, pixels).
+    filterlv : float, optional
+        pixels below this fraction of the total are zeroed. The default is 0.0015.
+    floor : bool, optional
+        subtract the minimum, False for dark subtracted spectra. The
+        default is True.
+
+    Returns
+    -------
+    mean : numpy array
+        weighted mean for each spectrum, NaN for an empty spectrum.
+    sdev : numpy array
+        standard deviation for each spectrum.
+    skew : numpy array
+        skew for each spectrum.
+    kurt : numpy array
+        kurtosis for each spectrum.
+
+    """
+    # SUBTRACT THE NOISE FLOOR
+    y = np.atleast_2d(y)
+    if(floor):
+        yf = np.subtract(y, np.min(y, axis = 1)[:,np.newaxis], dtype = float)
+    else:
+        yf = np.array(y, dtype = float)
+    
+    # NORMALIZE, ZERO VALUES UNDER THE FILTER LEVEL AND NORMALIZE AGAIN
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        total = np.sum(yf, axis = 1)
+        valid = total != 0
+        yf /= total[:,np.newaxis]
+        yf[yf < filterlv] = 0
+        total = np.sum(yf, axis = 1)
+        valid &= total != 0
+        yf /= total[:,np.newaxis]
+    yf[~valid] = 0.0
+    
+    # GENERATE MOMENTS, NaN FOR EMPTY SPECTRA
+    mean, sdev, skew, kurt = getMoments(x, yf)
+    for moment in (mean, sdev, skew, kurt):
+        moment[~valid] = np.nan
+    
+    return mean, sdev, skew, kurt
+
+def analyzeSpectra(x, y, calcwidth = 2.0, halfwidth = 10.0, floor = True):
+    """
+    Run the dutyCycleData analysis on a stack of spectra at once.
+
+    Parameters
+    ----------
+    x : numpy array
+        full wavelength axis shared by every spectrum, shape (pixels,).
+    y : numpy array
+        intensities, shape (N spectra, pixels).
+    calcwidth : float, optional
+        half width in nm of the window kept for the moments. The default is 2.0.
+    halfwidth : float, optional
+        half width in nm of the peak excluded from the floor. The default is 10.0.
+    floor : bool or numpy array, optional
+        subtract the floor found outside the peak, False for dark
+        subtracted spectra, or one bool per spectrum. The default is True.
+
+    Returns
+    -------
+    dict
+        x, y, window, yf, reliable, wMean, sdev, skew and kurt arrays.
+
+    """
+    # LIMIT THE RANGE OF THE DATA
+    cal = getCalibration(x, calcwidth, halfwidth)
+    window = cal.window
+    x = cal.x
+    y = y[:,window]
+    
+    # DETERMINE DATA RELIABILITY
+    reliable = np.ptp(y, axis = 1) >= RELIABLE_COUNTS
+    
+    # FLOOR SUBTRACTED, WINDOWED AND NORMALIZED SPECTRA
+    yf = normalizeSpectra(y, cal, reliable, floor)
+    
+    # GENERATE MOMENTS, NaN WHERE THE DATA IS UNRELIABLE
+    wMean, sdev, skew, kurt = getMoments(x, yf)
+    for moment in (wMean, sdev, skew, kurt):
+        moment[~reliable] = np.nan
+    
+    return {"x" : x, "y" : y, "window" : window, "yf" : yf, "reliable" : reliable,
+            "wMean" : wMean, "sdev" : sdev, "skew" : skew, "kurt" : kurt}
+
+def fitLines(x, y, mask):
+    """
+    Least squares line fits for many data sets sharing one x axis.
+
+    Parameters
+    ----------
+    x : numpy array
+        x values, shape (points,).
+    y : numpy array
+        y values, shape (sets, points).
+    mask : numpy array
+        bool array marking the points to use, same shape as y.
+
+    Returns
+    -------
+    slope : numpy array
+        slope of each fit, NaN if fewer than 2 points are used.
+    intercept : numpy array
+        intercept of each fit.
+    rsquare : numpy array
+        coefficient of determination of each fit, NaN if the y values
+        do not vary.
+
+    """
+    w = mask.astype(float)
+    y = np.where(mask, y, 0.0)
+    n = np.sum(w, axis = 1)
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        # MEANS OF THE USED POINTS
+        mx = (w @ x) / n
+        my = np.sum(y, axis = 1) / n
+        
+        # CENTERED SUMS OF SQUARES
+        dx = (x[np.newaxis,:] - mx[:,np.newaxis]) * w
+        dy = (y - my[:,np.newaxis]) * w
+        sxx = np.sum(dx * dx, axis = 1)
+        sxy = np.sum(dx * dy, axis = 1)
+        syy = np.sum(dy * dy, axis = 1)
+        
+        # FIT
+        slope = sxy / sxx
+        intercept = my - slope * mx
+        rsquare = sxy * sxy / (sxx * syy)
+    
+    slope[n < 2] = np.nan
+    intercept[n < 2] = np.nan
+    rsquare[(n < 2) | ~(syy > 0)] = np.nan
+    
+    return slope, intercept, rsquare
+
 def main():
     """
     For testing
@@ -100,9 +512,186 @@ def main():
     return
 
 
+# RUNNING LEAST SQUARES LINE FIT
+class lineFit:
+    def __init__(self):
+        """
+        Least squares line fit kept as running centered sums, so adding or
+        removing a point and reading the fit take constant time.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.n = 0
+        self.mx = 0.0
+        self.my = 0.0
+        self.cxx = 0.0
+        self.cxy = 0.0
+        self.cyy = 0.0
+        
+        return
+    
+    def add(self, x, y):
+        """
+        Add a point to the fit.
+
+        Parameters
+        ----------
+        x : float
+            x value.
+        y : float
+            y value.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.n = self.n + 1
+        dx = x - self.mx
+        dy = y - self.my
+        self.mx = self.mx + dx / self.n
+        self.my = self.my + dy / self.n
+        self.cxx = self.cxx + dx * (x - self.mx)
+        self.cxy = self.cxy + dx * (y - self.my)
+        self.cyy = self.cyy + dy * (y - self.my)
+        
+        return
+    
+    def remove(self, x, y):
+        """
+        Remove a point that was added to the fit.
+
+        Parameters
+        ----------
+        x : float
+            x value.
+        y : float
+            y value.
+
+        Returns
+        -------
+        None.
+
+        """
+        if(self.n <= 1):
+            self.__init__()
+            return
+        
+        # UNDO THE UPDATE MADE BY add
+        mx = (self.n * self.mx - x) / (self.n - 1)
+        my = (self.n * self.my - y) / (self.n - 1)
+        self.cxx = self.cxx - (x - mx) * (x - self.mx)
+        self.cxy = self.cxy - (x - mx) * (y - self.my)
+        self.cyy = self.cyy - (y - my) * (y - self.my)
+        self.mx = mx
+        self.my = my
+        self.n = self.n - 1
+        
+        return
+    
+    def getFit(self):
+        """
+        Get the fit.
+
+        Returns
+        -------
+        slope : float
+            slope, None if there are fewer than 2 points.
+        intercept : float
+            y-intercept.
+        rsquare : float
+            coefficient of determination, NaN if the y values do not vary.
+
+        """
+        if(self.n < 2 or self.cxx == 0):
+            return None, None, None
+        
+        slope = self.cxy / self.cxx
+        intercept = self.my - slope * self.mx
+        rsquare = self.cxy**2 / (self.cxx * self.cyy) if self.cyy > 0 else np.nan
+        
+        return slope, intercept, rsquare
+
+# STEADY STATE DETECTION FROM THE PEAK DRIFT
+class steadyStateDetector:
+    def __init__(self, window = 1.0, drift = 0.002):
+        """
+        Decide when a stream of peak wavelengths has stopped moving.
+
+        A line is fit to the weighted means inside a sliding time window,
+        the stream is steady once the window is full and the slope of that
+        line is below the drift limit.
+
+        Parameters
+        ----------
+        window : float, optional
+            length of the sliding window in seconds. The default is 1.0.
+        drift : float, optional
+            largest slope in nm/s that counts as steady. The default is 0.002.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.window = window
+        self.drift = drift
+        self.reset()
+        
+        return
+    
+    def reset(self):
+        """
+        Forget all points, used when the duty cycle changes.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.points = deque()
+        self.lineFit = lineFit()
+        self.slope = None
+        
+        return
+    
+    def add(self, t, wMean):
+        """
+        Add a point and check for steady state.
+
+        Parameters
+        ----------
+        t : float
+            time of the spectrum in seconds, measured from a recent start
+            such as the start of the dwell to keep the fit precise.
+        wMean : float
+            weighted mean of the spectrum in nm.
+
+        Returns
+        -------
+        bool
+            True if the peak is steady.
+
+        """
+        # ADD THE POINT AND DROP THE ONES THAT LEFT THE WINDOW
+        self.points.append((t, wMean))
+        self.lineFit.add(t, wMean)
+        while(self.points[0][0] < t - self.window):
+            self.lineFit.remove(*self.points.popleft())
+        
+        # THE WINDOW MUST BE COVERED BEFORE THE DRIFT MEANS ANYTHING
+        self.slope = self.lineFit.getFit()[0]
+        if(self.slope == None or self.points[-1][0] - self.points[0][0] < 0.9 * self.window):
+            return False
+        
+        return abs(self.slope) <= self.drift
+
 # OBJECT FOR DUTY CYCLE DATA
 class dutyCycleData:
-    def __init__(self, dutyCycle = 0, x = [], y = []):
+    def __init__(self, dutyCycle = 0, x = [], y = [], floor = True):
         """
         Init method
 
@@ -114,6 +703,9 @@ class dutyCycleData:
             DESCRIPTION. The default is [].
         y : TYPE, optional
             DESCRIPTION. The default is [].
+        floor : bool, optional
+            subtract the floor found outside the peak, False for dark
+            subtracted spectra. The default is True.
 
         Returns
         -------
@@ -124,6 +716,7 @@ class dutyCycleData:
         self.dutyCycle = dutyCycle
         self.x = x
         self.y = y
+        self.floor = floor
         
         # ANALYZE DATA IF DATA HAS BEEN ENTERED
         if(dutyCycle != 0 and len(x) > 0 and len(y) > 0):
@@ -147,12 +740,10 @@ class dutyCycleData:
 
         """
         # PARSE THE INTENSITY DATA
-        data = np.genfromtxt(filename, delimiter = ",")
-        self.x = data[:,0]
-        self.y = data[:,1]
+        self.x, self.y = spectrum_files.loadSpectrum(filename)
         
         # Parse duty cycle from filename
-        self.dutyCycle = float(filename.split("\\")[-1].strip('.csv').strip('dc-'))
+        self.dutyCycle = parseDutyCycle(filename)
         
         self.analyzeData()
         
@@ -169,29 +760,78 @@ class dutyCycleData:
 
         """
         # LIMIT THE RANGE OF THE DATA
-        index_start = np.where(self.x > 425)[0][0] #'''#changed on 11/16/2022 riley 435 to 455'''
-        index_end = np.where(self.x > 460)[0][0]        
-        self.x = self.x[index_start:index_end]
-        self.y = self.y[index_start:index_end]
+        self.calibration = getCalibration(self.x) #'''#changed on 11/16/2022 riley 435 to 455'''
+        self.x = self.calibration.x
+        self.y = self.y[self.calibration.window]
         
         
         
         # DETERMINE DATA RELIABILITY
         self.reliable = True
-        if(np.max(self.y) - np.min(self.y) < 200):
+        if(np.max(self.y) - np.min(self.y) < RELIABLE_COUNTS):
             self.reliable = False
+            self.yf = np.zeros(len(self.x))
+            self.wMean = None
+            self.sdev = None
+            self.skew = None
+            self.kurt = None
             return self.reliable
             
         
         # GENERATE DATA
         self.getNorm()
-        self.getMean()
-        self.getSdev()
-        self.getSkew()
-        self.getKurt()
+        
+        # CALCULATE ALL MOMENTS IN ONE PASS
+        mean, sdev, skew, kurt = getMoments(self.x, self.yf)
+        self.wMean = float(mean[0])
+        self.sdev = float(sdev[0])
+        self.skew = float(skew[0])
+        self.kurt = float(kurt[0])
         
         return self.reliable
     
+    def getResults(self):
+        """
+        Get the analysis results, used to cache them.
+
+        Returns
+        -------
+        dict
+            duty cycle, windowed x, y and yf, reliability and moments.
+
+        """
+        results = {"dutyCycle" : self.dutyCycle, "x" : self.x, "y" : self.y,
+                   "yf" : self.yf, "reliable" : self.reliable}
+        for key in ["wMean", "sdev", "skew", "kurt"]:
+            value = getattr(self, key)
+            results[key] = np.nan if value == None else value
+        
+        return results
+    
+    def setResults(self, results):
+        """
+        Set the analysis results from getResults without reanalyzing.
+
+        Parameters
+        ----------
+        results : dict
+            results from getResults.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.dutyCycle = float(results["dutyCycle"])
+        self.x = results["x"]
+        self.y = results["y"]
+        self.yf = results["yf"]
+        self.reliable = bool(results["reliable"])
+        for key in ["wMean", "sdev", "skew", "kurt"]:
+            setattr(self, key, float(results[key]) if self.reliable else None)
+        
+        return
+    
     def getDutyCycle(self):
         """
         Get current duty cycle.
@@ -227,127 +867,62 @@ class dutyCycleData:
             
             return self.yf
         
-        # FIND THE INDEX OF THE MAX PEAK
-        index = np.argmax(self.y)
-        
-        # DETERMINE WAVELENGHT SPACING
-        wavelength_spacing = self.x[index] - self.x[index - 1]
-        
-        # OVER ESTIMATE PEAK WIDTH IN TERMS OF INDEX NUMBERS
-        halfwidth = 10.0
-        d_index = int(halfwidth / wavelength_spacing)
-        
-        # DEFINE UPPER INDEX AND ENSURE IT IS WITHIN BOUNDS
-        dplus_index = d_index + index
-        if(dplus_index > len(self.x)):
-            dplus_index = len(self.x)
-        
-        # DEFINE LOWER INDEX AND ENSURE IT IS WITHIN BOUNDS
-        dminus_index = index - d_index
-        if(dminus_index < 0):
-            dminus_index = 0
+        # WAVELENGHT SPACING AND PIXEL WIDTHS FROM THE CALIBRATION
+        cal = self.calibration
+        if(cal.calcwidth != calcwidth):
+            cal = getCalibration(cal.axis, calcwidth = calcwidth)
         
-        # DEFINE DATA WITHOUT PEAKS AKA FLOOR
-        ynoise = np.concatenate((self.y[:dminus_index],self.y[dplus_index:]), axis = None)
-        
-        # SUBTRACT THE FLOOR
-        self.yf = self.y - np.average(ynoise)
-        
-        # SET ANY VALUE BELOW THE FLOOR TO 0
-        
-        """ New """
-        # DEFINE DATA OUTSIDE OF PEAKS AS 0
-        c_index = int(calcwidth / wavelength_spacing)
-        c_minus = index - c_index
-        c_plus = index + c_index
-        
-        for i in range(0,len(self.yf)):
-            if(i < c_minus or i > c_plus):
-                self.yf[i] = 0    
-        
-        # floor = 10
-        # for i in range(0,len(self.yf)):
-        #     if(self.yf[i] < floor):
-        #         self.yf[i] = 0       
-        
-        # NORMALIZE
-        self.yf = self.yf / np.sum(self.yf)                
+        # SUBTRACT THE FLOOR, DEFINE DATA OUTSIDE OF PEAKS AS 0 AND NORMALIZE
+        self.yf = normalizeSpectra(self.y, cal, floor = self.floor)
     
         return self.yf
     
     def getMean(self):
         """
-        Generate the weighted mean.
+        Get the weighted mean.
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        float
+            weighted mean, None if the data is unreliable.
 
         """
-        # FIND WEIGHTED MEAN PEAK
-        if(self.reliable):        
-            self.wMean = np.dot(self.x, self.yf)
-        else:
-            self.wMean = None
-        
         return self.wMean
     
     def getSdev(self):
         """
-        Generate the standard deviation.
+        Get the standard deviation.
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        float
+            standard deviation, None if the data is unreliable.
 
         """
-        # CALCULATE THE VARIANCE
-        n = 2
-        moment = np.dot((self.x - self.wMean)**n, self.yf)
-        
-        # CALCULATE STANDARD DEVIATION
-        self.sdev = math.sqrt(abs(moment))
-        
         return self.sdev
 
     def getSkew(self):
         """
-        Generate the skew.
+        Get the skew.
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        float
+            skew, None if the data is unreliable.
 
         """
-        # CALCULATE THIRD CENTRAL MOMENT
-        n = 3
-        moment = np.dot((self.x - self.wMean)**n, self.yf)
-        
-        # CALCULATE KURTOSIS
-        self.skew = moment / (self.sdev**n)
-        
         return self.skew
     
     def getKurt(self):
         """
-        Generate the kurtosis
+        Get the kurtosis
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        float
+            kurtosis, None if the data is unreliable.
 
         """
-        # CALCULATE FOURTH CENTRAL MOMENT
-        n = 4
-        moment = np.dot((self.x - self.wMean)**n, self.yf)
-        
-        # CALCULATE KURTOSIS
-        self.kurt = moment / (self.sdev**n)
-        
         return self.kurt
 
 # CLASS FOR EMITTER DATA OBJECT
@@ -373,9 +948,26 @@ class emitterData:
         # GENERATE FULL FILEPATH TO DUTY CYCLE CSV FILES
         self.dutyCycles = []
         
+        # DUTY CYCLE OBJECTS BY DUTY CYCLE, AND THE LIST THEY WERE INDEXED FROM
+        self.dcIndex = {}
+        self.dcIndexList = None
+        
+        # SUBTRACT THE FLOOR, OFF FOR DARK SUBTRACTED SPECTRA
+        self.floor = True
+        
+        # ID OF THE WAVELENGTH CALIBRATION, None IF UNKNOWN
+        self.calibrationId = None
+        
+        # fit result
+        self.lineFit = lineFit()
+        self.fit = None
+        self.rsquare = None
+        self.dcs = []
+        self.wls = []
+        
         return
     
-    def loadFolder(self, filepath):
+    def loadFolder(self, filepath, cache = None):
         """
         Load the emitter folder.
 
@@ -383,6 +975,8 @@ class emitterData:
         ----------
         filepath : str
             path to the folder to load.
+        cache : AnalysisCache, optional
+            cache of analysis results to use. The default is None.
 
         Returns
         -------
@@ -403,14 +997,21 @@ class emitterData:
         
         # GENERATE FULL FILEPATH TO DUTY CYCLE CSV FILES
         self.dutyCycles = []
+        self.dcIndex = {}
         for file in self.files:
             filewithpath = filepath + "\\" + file
             
             # GENERATE DUTY CYCLE DATA OBJECT
             DC = dutyCycleData()
             
-            # LOAD IN DATA
-            DC.loadFile(filewithpath)
+            # LOAD IN DATA, FROM THE CACHE IF THE FILE IS UNCHANGED
+            results = None if cache == None else cache.load(filewithpath)
+            if(results != None):
+                DC.setResults(results)
+            else:
+                DC.loadFile(filewithpath)
+                if(cache != None):
+                    cache.store(filewithpath, DC.getResults())
             
             # APPEND DUTY CYCLE DATA OBJECT TO EMITTER DATA OBJECT
             # if(DC.reliable == True):
@@ -425,9 +1026,63 @@ class emitterData:
         
         return
     
-    def addDutyCycle(self, dutyCycle, x, y):
+    def loadRunFile(self, filename, emitter):
+        """
+        Load one emitter from a run file.
+
+        Parameters
+        ----------
+        filename : str
+            path to the run file.
+        emitter : int
+            emitter number, starting at 1.
+
+        Returns
+        -------
+        None.
+
+        """
+        # GET EMITTER AND HEXEL NAMES
+        self.title = "emitter-{}".format(emitter)
+        self.hexel = os.path.basename(os.path.dirname(os.path.abspath(filename)))
+        
+        # OPEN THE RUN FILE
+        RF = spectrum_files.RunFile(filename)
+        self.calibrationId = RF.calibration
+        
+        # THE CALIBRATION OF THE RUN, THE SPECTRA SHARE ITS AXIS
+        x = getCalibration(RF.getWavelengths(), ID = self.calibrationId).axis
+        
+        # GENERATE DUTY CYCLE DATA OBJECTS, A RETAKE REPLACES THE EARLIER SPECTRUM
+        # THE FLOOR IS SUBTRACTED FROM EVERY SPECTRUM THAT DID NOT HAVE A DARK SUBTRACTED
+        dutyCycles = {}
+        for record in RF.getRecords():
+            if(spectrum_files.isSpectrum(record["flags"]) and record["emitter"] == emitter):
+                dutyCycles[float(record["dutyCycle"])] = record
+        self.dutyCycles = []
+        self.dcIndex = {}
+        for dc, record in dutyCycles.items():
+            floor = (record["flags"] & spectrum_files.FLAG_DARK_SUBTRACTED) == 0
+            self.dutyCycles.append(dutyCycleData(dutyCycle = dc, x = x, y = np.array(record["intensities"], dtype = float), floor = bool(floor)))
+        
+        # SORT DUTY CYCLE OBJECTS BY DUTY CYCLE
+        self.dutyCycles.sort(key = attrgetter('dutyCycle'))
+        
+        # fit result
+        self.fit = None
+        self.fit_Wl()
+        
+        return
+    
+    def addDutyCycle(self, dutyCycle, x, y, floor = None):
         """
         Add a duty cycle data set manually.
+        
+        The fit is updated from running sums and the fitted points are
+        appended, so this costs the same no matter how many duty cycles are
+        already loaded. A duty cycle that is already loaded is replaced in
+        place, only then or when one arrives out of order are the fitted
+        points rebuilt.
 
         Parameters
         ----------
@@ -437,6 +1092,9 @@ class emitterData:
             DESCRIPTION.
         y : TYPE
             DESCRIPTION.
+        floor : bool, optional
+            subtract the floor found outside the peak, False if the dark
+            spectrum was subtracted. The default is None, self.floor.
 
         Returns
         -------
@@ -444,9 +1102,33 @@ class emitterData:
 
         """
         # Add duty cycle object
-        DC = dutyCycleData(dutyCycle = dutyCycle, x = x, y = y)
-        self.dutyCycles.append(DC)
-        self.dutyCycles.sort(key = attrgetter('dutyCycle'))
+        if(floor == None):
+            floor = self.floor
+        DC = dutyCycleData(dutyCycle = dutyCycle, x = x, y = y, floor = floor)
+        
+        # Replace a retaken duty cycle where it is, the order is unchanged
+        old = self.findDC(dutyCycle, report = False)
+        if(old != None):
+            self.dutyCycles[self.dutyCycles.index(old)] = DC
+            if(old.reliable):
+                self.lineFit.remove(old.dutyCycle, old.wMean)
+        
+        # Duty cycles are normally taken in order, only sort if needed
+        else:
+            self.dutyCycles.append(DC)
+            if(len(self.dutyCycles) > 1 and self.dutyCycles[-2].dutyCycle > dutyCycle):
+                self.dutyCycles.sort(key = attrgetter('dutyCycle'))
+        self.dcIndex[DC.dutyCycle] = DC
+        
+        # Update the fit, the points are appended unless the order changed
+        if(DC.reliable):
+            self.lineFit.add(DC.dutyCycle, DC.wMean)
+        if(old != None or self.dutyCycles[-1] is not DC):
+            self.updatePoints()
+        elif(DC.reliable):
+            self.dcs.append(DC.dutyCycle)
+            self.wls.append(DC.wMean)
+        self.updateFit()
         
         return
                 
@@ -463,7 +1145,7 @@ class emitterData:
         """
         return self.title.split("-")[-1]
     
-    def findDC(self, dc):
+    def findDC(self, dc, report = True):
         """
         Get specific duty cycle object given the duty cycle
 
@@ -471,6 +1153,8 @@ class emitterData:
         ----------
         dc : int
             duty cycle to measure.
+        report : bool, optional
+            print an error if the duty cycle is missing. The default is True.
 
         Returns
         -------
@@ -478,13 +1162,17 @@ class emitterData:
             dutyCycleData object for specific given dc.
 
         """
+        # REBUILD THE INDEX IF THE LIST WAS REPLACED OR CHANGED DIRECTLY
+        if(self.dcIndexList is not self.dutyCycles or len(self.dcIndex) != len(self.dutyCycles)):
+            self.dcIndex = {DC.dutyCycle : DC for DC in self.dutyCycles}
+            self.dcIndexList = self.dutyCycles
+        
         # FIND THE CORRESPONDING DUTY CYCLE
-        for DC in self.dutyCycles:
-            if(DC.dutyCycle == dc):
-                return DC
-        print("Error: Duty cycle {} not found".format(dc))
+        DC = self.dcIndex.get(dc)
+        if(DC == None and report):
+            print("Error: Duty cycle {} not found".format(dc))
         
-        return None
+        return DC
     
     def getDT(self):
         """
@@ -524,24 +1212,51 @@ class emitterData:
         return dt
     
     def fit_Wl(self):
-        #TODO
-        
-        self.dcs = []
-        self.wls = []
-        
+        """
+        Fit wavelength vs duty cycle from all reliable duty cycles.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.dcIndex = {}
+        self.lineFit = lineFit()
         for dc in self.dutyCycles:
             if(dc.reliable):
-                self.dcs.append(dc.dutyCycle)
-                self.wls.append(dc.wMean)
+                self.lineFit.add(dc.dutyCycle, dc.wMean)
         
-        if(len(self.dcs) > 1):
-            
-            res = np.polyfit(self.dcs, self.wls, deg = 1)
-            self.fit = res
+        self.updatePoints()
+        self.updateFit()
         
-        # print(res[0]) # Slope
-        # print(res[1]) # Y-Intercept
-        # print(dcs)
+        return
+    
+    def updatePoints(self):
+        """
+        Rebuild the fitted duty cycles and wavelengths from the reliable
+        duty cycles.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.dcs = [dc.dutyCycle for dc in self.dutyCycles if dc.reliable]
+        self.wls = [dc.wMean for dc in self.dutyCycles if dc.reliable]
+        
+        return
+    
+    def updateFit(self):
+        """
+        Update the fit results from the running fit.
+
+        Returns
+        -------
+        None.
+
+        """
+        slope, intercept, self.rsquare = self.lineFit.getFit()
+        self.fit = None if slope == None else np.array([slope, intercept])
         
         return
     
@@ -549,6 +1264,18 @@ class emitterData:
         
         return (self.fit[0] / 0.06) * 100
     
+    def getRsquare(self):
+        """
+        Get the R squared of the wavelength vs duty cycle fit.
+
+        Returns
+        -------
+        float
+            R squared, None if there is no fit.
+
+        """
+        return self.rsquare
+    
     def getCWWL(self):
         """
         Get the mean wavelength at 99% duty cycle.
@@ -988,5 +1715,419 @@ class emitterData:
                 
             return fig, plot1
 
+# CLASS FOR A WHOLE HEXEL ANALYZED AS ONE ARRAY
+class hexelData:
+    def __init__(self):
+        """
+        Init method.
+        
+        Spectra are held in one (emitters, duty cycles, pixels) array with a
+        shared wavelength axis and every emitter is analyzed at once.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.hexel = ""
+        self.titles = []
+        self.dutyCycles = np.array([])
+        self.x = np.array([])
+        self.y = np.empty((0, 0, 0))
+        self.present = np.empty((0, 0), dtype = bool)
+        self.emitters = []
+        
+        # INTEGRATION TIME OF EACH SPECTRUM IN MICRO-SECONDS, NaN IF UNKNOWN
+        self.integrationTime = np.empty((0, 0))
+        
+        # MEAN LASER DRIVER CURRENT AND VOLTAGE DURING EACH SPECTRUM, NaN IF UNKNOWN
+        self.ldCurrent = np.empty((0, 0))
+        self.ldVoltage = np.empty((0, 0))
+        
+        # SUBTRACT THE FLOOR FROM EACH SPECTRUM, OFF FOR DARK SUBTRACTED SPECTRA
+        self.floor = np.empty((0, 0), dtype = bool)
+        
+        # ID OF THE WAVELENGTH CALIBRATION, None IF UNKNOWN
+        self.calibrationId = None
+        
+        return
+    
+    def loadFolder(self, datapath, emitters = None, cache = None):
+        """
+        Load every emitter folder of a hexel and analyze all of the spectra.
+
+        Parameters
+        ----------
+        datapath : str
+            path to the hexel folder.
+        emitters : list, optional
+            emitter folder names to load, in order. The default is every
+            folder with "emitter" in the name.
+        cache : AnalysisCache, optional
+            cache of analysis results to use. The default is None.
+
+        Raises
+        ------
+        FileNotFoundError
+            no duty cycle files were found.
+        ValueError
+            the spectra do not share one wavelength axis.
+
+        Returns
+        -------
+        None.
+
+        """
+        # GET HEXEL SERIAL NUMBER FROM FOLDER NAME
+        self.hexel = datapath.replace("/", "\\").rstrip("\\").split("\\")[-1]
+        
+        # GENERATE EMITTER FOLDER NAMES
+        if(emitters == None):
+            emitters = [f for f in os.listdir(datapath) if "emitter" in f]
+        self.titles = list(emitters)
+        
+        # LIST ALL DUTY CYCLE FILES FOR EVERY EMITTER
+        files = []
+        for em in self.titles:
+            emfiles = os.listdir(os.path.join(datapath, em))
+            files.append({parseDutyCycle(f) : os.path.join(datapath, em, f) for f in emfiles})
+        self.dutyCycles = np.array(sorted(set(dc for emfiles in files for dc in emfiles)))
+        if(len(self.dutyCycles) == 0):
+            raise FileNotFoundError("No duty cycle files found in {}".format(datapath))
+        
+        # PARSE THE INTENSITY DATA INTO ONE ARRAY, SKIPPING CACHED FILES
+        self.x = None
+        self.y = None
+        self.present = np.zeros((len(self.titles), len(self.dutyCycles)), dtype = bool)
+        self.integrationTime = np.full(self.present.shape, np.nan)
+        self.ldCurrent = np.full(self.present.shape, np.nan)
+        self.ldVoltage = np.full(self.present.shape, np.nan)
+        self.floor = np.ones(self.present.shape, dtype = bool)
+        cached = {}
+        for i, emfiles in enumerate(files):
+            for j, dc in enumerate(self.dutyCycles):
+                if(dc not in emfiles):
+                    continue
+                self.present[i, j] = True
+                results = None if cache == None else cache.load(emfiles[dc])
+                if(results != None):
+                    cached[(i, j)] = results
+                elif(self.y is None):
+                    x, y = spectrum_files.loadSpectrum(emfiles[dc])
+                    self.x = getCalibration(x).axis
+                    self.y = np.full((len(self.titles), len(self.dutyCycles), len(self.x)), np.nan)
+                    self.y[i, j] = y
+                else:
+                    x, y = spectrum_files.loadSpectrum(emfiles[dc], y = self.y[i, j])
+                    if(x is not self.x and np.array_equal(x, self.x) == False):
+                        raise ValueError("{} does not share the hexel wavelength axis".format(emfiles[dc]))
+        
+        self.analyzeData(cached)
+        
+        # CACHE THE NEWLY ANALYZED FILES
+        if(cache != None):
+            for i, emfiles in enumerate(files):
+                for j, dc in enumerate(self.dutyCycles):
+                    if(dc in emfiles and (i, j) not in cached):
+                        cache.store(emfiles[dc], self.getResults(i, j))
+        
+        return
+    
+    def loadRunFile(self, filename):
+        """
+        Load every emitter of a hexel from a run file and analyze the spectra.
+
+        Parameters
+        ----------
+        filename : str
+            path to the run file.
+
+        Returns
+        -------
+        None.
+
+        """
+        # GET HEXEL SERIAL NUMBER FROM FOLDER NAME
+        self.hexel = os.path.basename(os.path.dirname(os.path.abspath(filename)))
+        
+        # MAP THE RECORDS, ONLY SPECTRA ARE ANALYZED
+        RF = spectrum_files.RunFile(filename)
+        records = RF.getRecords()
+        self.calibrationId = RF.calibration
+        spectra = np.where(spectrum_files.isSpectrum(records["flags"]))[0]
+        emitters = np.unique(records["emitter"][spectra])
+        self.titles = ["emitter-{}".format(em) for em in emitters]
+        self.dutyCycles = np.unique(records["dutyCycle"][spectra]).astype(float)
+        self.x = getCalibration(RF.getWavelengths(), ID = self.calibrationId).axis
+        
+        # COPY THE INTENSITIES INTO ONE ARRAY, A RETAKE REPLACES THE EARLIER SPECTRUM
+        self.y = np.full((len(emitters), len(self.dutyCycles), RF.pixels), np.nan)
+        self.present = np.zeros((len(emitters), len(self.dutyCycles)), dtype = bool)
+        self.integrationTime = np.full(self.present.shape, np.nan)
+        self.ldCurrent = np.full(self.present.shape, np.nan)
+        self.ldVoltage = np.full(self.present.shape, np.nan)
+        self.floor = np.ones(self.present.shape, dtype = bool)
+        rows = np.searchsorted(emitters, records["emitter"][spectra])
+        cols = np.searchsorted(self.dutyCycles, records["dutyCycle"][spectra])
+        for k, i, j in zip(spectra, rows, cols):
+            self.y[i, j] = records["intensities"][k]
+            self.present[i, j] = True
+            self.integrationTime[i, j] = records["integrationTime"][k]
+            self.floor[i, j] = (records["flags"][k] & spectrum_files.FLAG_DARK_SUBTRACTED) == 0
+            if("ldSamples" in records.dtype.names):
+                self.ldCurrent[i, j] = records["ldCurrent"][k]
+                self.ldVoltage[i, j] = records["ldVoltage"][k]
+        
+        self.analyzeData()
+        
+        return
+    
+    def analyzeData(self, cached = {}):
+        """
+        Analyze every spectrum and fit wavelength vs duty cycle per emitter.
+
+        Parameters
+        ----------
+        cached : dict, optional
+            results from getResults for spectra that were not loaded, keyed
+            by (emitter row, duty cycle column). The default is {}.
+
+        Raises
+        ------
+        ValueError
+            cached results do not share the analysis window.
+
+        Returns
+        -------
+        None.
+
+        """
+        E, D = self.present.shape
+        
+        # SPECTRA LOADED INTO THE ARRAY
+        loaded = self.present.copy()
+        for (i, j) in cached:
+            loaded[i, j] = False
+        
+        # ANALYZE ALL LOADED SPECTRA AS ONE STACK
+        if(np.any(loaded)):
+            res = analyzeSpectra(self.x, self.y[loaded], floor = self.floor[loaded])
+            self.xw = res["x"]
+        else:
+            res = None
+            self.xw = next(iter(cached.values()))["x"]
+        
+        # WINDOWED RESULTS FOR EVERY SPECTRUM
+        self.reliable = np.zeros((E, D), dtype = bool)
+        self.yw = np.full((E, D, len(self.xw)), np.nan)
+        self.yf = np.zeros((E, D, len(self.xw)))
+        for key in ["wMean", "sdev", "skew", "kurt"]:
+            setattr(self, key, np.full((E, D), np.nan))
+        
+        # FILL IN THE LOADED SPECTRA
+        if(res != None):
+            self.reliable[loaded] = res["reliable"]
+            self.yw[loaded] = res["y"]
+            self.yf[loaded] = res["yf"]
+            for key in ["wMean", "sdev", "skew", "kurt"]:
+                getattr(self, key)[loaded] = res[key]
+        
+        # FILL IN THE CACHED SPECTRA
+        for (i, j), results in cached.items():
+            if(np.array_equal(results["x"], self.xw) == False):
+                raise ValueError("Cached results do not share the hexel wavelength axis")
+            self.reliable[i, j] = results["reliable"]
+            self.yw[i, j] = results["y"]
+            self.yf[i, j] = results["yf"]
+            for key in ["wMean", "sdev", "skew", "kurt"]:
+                getattr(self, key)[i, j] = results[key]
+        
+        # FIT WAVELENGTH VS DUTY CYCLE FOR EVERY EMITTER
+        self.slope, self.intercept, self.rsquare = fitLines(self.dutyCycles, self.wMean, self.reliable)
+        
+        # DT FROM THE 10% AND 90% DUTY CYCLES
+        self.dT = np.full(E, np.nan)
+        if(10 in self.dutyCycles and 90 in self.dutyCycles):
+            self.dT = (self.wMean[:, self._dcIndex(90)] - self.wMean[:, self._dcIndex(10)]) / 0.06
+        
+        # BUILD EMITTER OBJECTS FOR PLOTTING
+        self.emitters = [self._emitterData(i) for i in range(E)]
+        
+        return
+    
+    def _dcIndex(self, dc):
+        """
+        Get the duty cycle column for a duty cycle.
+
+        Parameters
+        ----------
+        dc : int
+            duty cycle to find.
+
+        Raises
+        ------
+        ValueError
+            duty cycle was not measured.
+
+        Returns
+        -------
+        int
+            duty cycle column.
+
+        """
+        index = np.where(self.dutyCycles == dc)[0]
+        if(len(index) == 0):
+            raise ValueError("Duty cycle {} not found".format(dc))
+        
+        return index[0]
+    
+    def _emitterData(self, i):
+        """
+        Generate an emitterData object that views the analyzed arrays.
+
+        Parameters
+        ----------
+        i : int
+            emitter row.
+
+        Returns
+        -------
+        EM : emitterData
+            emitter data object for the emitter.
+
+        """
+        EM = emitterData(self.titles[i])
+        EM.hexel = self.hexel
+        EM.calibrationId = self.calibrationId
+        
+        for j in np.where(self.present[i])[0]:
+            DC = dutyCycleData(floor = bool(self.floor[i, j]))
+            DC.dutyCycle = self.dutyCycles[j]
+            DC.x = self.xw
+            DC.y = self.yw[i, j]
+            DC.yf = self.yf[i, j]
+            DC.reliable = bool(self.reliable[i, j])
+            for key in ["wMean", "sdev", "skew", "kurt"]:
+                value = getattr(self, key)[i, j]
+                setattr(DC, key, float(value) if DC.reliable else None)
+            EM.dutyCycles.append(DC)
+        
+        # FIT RESULT
+        EM.updatePoints()
+        EM.fit = None
+        if(len(EM.dcs) > 1):
+            EM.fit = np.array([self.slope[i], self.intercept[i]])
+            EM.rsquare = float(self.rsquare[i])
+        
+        return EM
+    
+    def getResults(self, i, j):
+        """
+        Get the analysis results of one spectrum, used to cache them.
+
+        Parameters
+        ----------
+        i : int
+            emitter row.
+        j : int
+            duty cycle column.
+
+        Returns
+        -------
+        dict
+            same layout as dutyCycleData.getResults.
+
+        """
+        results = {"dutyCycle" : self.dutyCycles[j], "x" : self.xw, "y" : self.yw[i, j],
+                   "yf" : self.yf[i, j], "reliable" : self.reliable[i, j]}
+        for key in ["wMean", "sdev", "skew", "kurt"]:
+            results[key] = getattr(self, key)[i, j]
+        
+        return results
+    
+    def getEmitter(self, i):
+        """
+        Get the emitterData object for an emitter.
+
+        Parameters
+        ----------
+        i : int
+            emitter row, in the order the folders were loaded.
+
+        Returns
+        -------
+        emitterData
+            emitter data object.
+
+        """
+        return self.emitters[i]
+    
+    def getDT(self, i):
+        """
+        Get the dT for an emitter.
+
+        Parameters
+        ----------
+        i : int
+            emitter row.
+
+        Returns
+        -------
+        float
+            dT measurement.
+
+        """
+        self._dcIndex(10)
+        self._dcIndex(90)
+        
+        # RETURN N/A IF DATA IS UNRELIABLE
+        if(np.isnan(self.dT[i])):
+            return "N/A"
+        
+        return float(self.dT[i])
+    
+    def getDT_New(self, i):
+        """
+        Get the dT for an emitter from the wavelength vs duty cycle fit.
+
+        Parameters
+        ----------
+        i : int
+            emitter row.
+
+        Returns
+        -------
+        float
+            dT measurement.
+
+        """
+        if(np.isnan(self.slope[i])):
+            raise ValueError("Not enough reliable duty cycles to fit")
+        
+        return float((self.slope[i] / 0.06) * 100)
+    
+    def getCWWL(self, i):
+        """
+        Get the mean wavelength at 99% duty cycle for an emitter.
+
+        Parameters
+        ----------
+        i : int
+            emitter row.
+
+        Returns
+        -------
+        float
+            Wavelength at `CW current
+
+        """
+        wl = self.wMean[i, self._dcIndex(99)]
+        
+        # Check if data exists
+        if(np.isnan(wl)):
+            return "N/A"
+        
+        return float(wl)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
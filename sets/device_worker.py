@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:26:45 2026
+
+One I/O thread per instrument.
+
+A DeviceWorker owns a device handle and runs every command for it from a
+queue, in order, on its own thread. Each command returns a
+concurrent.futures.Future, or an asyncio future from callAsync, so a
+caller can wait for it, check on it later or await it. A DeviceProxy
+stands in for the device: method calls are run on the worker and wait for
+the result, so existing code keeps working, while submit lets independent
+devices overlap their latency. Commands from the GUI, the measurement
+thread and the plot thread can no longer interleave on one device.
+"""
+
+import threading, queue, asyncio
+from concurrent.futures import Future
+
+class DeviceWorker:
+    def __init__(self, name = "device"):
+        """
+        Start the worker thread.
+
+        Parameters
+        ----------
+        name : str, optional
+            device name for the thread. The default is "device".
+
+        Returns
+        -------
+        None.
+
+        """
+        self.name = name
+        self.commands = queue.Queue()
+        self.stopped = False
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target = self.run, name = "{} worker".format(name), daemon = True)
+        self.thread.start()
+
+        return
+
+    def run(self):
+        """
+        Run the queued commands until the worker is stopped, runs on the
+        worker thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        while(True):
+            item = self.commands.get()
+            if(item == None):
+                break
+
+            future, func, args, kwargs = item
+            if(future.set_running_or_notify_cancel() == False):
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        return
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a command.
+
+        Parameters
+        ----------
+        func : function
+            command to run on the worker thread.
+        *args, **kwargs
+            arguments for the command.
+
+        Raises
+        ------
+        RuntimeError
+            the worker has been stopped.
+
+        Returns
+        -------
+        Future
+            result of the command.
+
+        """
+        future = Future()
+        with self.lock:
+            if(self.stopped):
+                raise RuntimeError("{} worker is stopped".format(self.name))
+            self.commands.put((future, func, args, kwargs))
+
+        return future
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run a command on the worker thread and wait for its result. A call
+        from the worker thread itself runs directly.
+
+        Returns
+        -------
+        object
+            the command result, its exception is raised here.
+
+        """
+        if(threading.current_thread() is self.thread):
+            return func(*args, **kwargs)
+
+        return self.submit(func, *args, **kwargs).result()
+
+    def stop(self, timeout = 5):
+        """
+        Stop the worker after the queued commands have run.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            seconds to wait for the worker to finish. The default is 5.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.lock:
+            if(self.stopped):
+                return
+            self.stopped = True
+            self.commands.put(None)
+
+        if(threading.current_thread() is not self.thread):
+            self.thread.join(timeout)
+
+        return
+
+class DeviceProxy:
+    def __init__(self, device, name = "device"):
+        """
+        Wrap a device so its methods run on its own worker thread.
+
+        Parameters
+        ----------
+        device : object
+            connected device, only used from the worker from now on.
+        name : str, optional
+            device name for the thread. The default is "device".
+
+        Returns
+        -------
+        None.
+
+        """
+        self._device = device
+        self._worker = DeviceWorker(name)
+
+        return
+
+    def __getattr__(self, attr):
+        value = getattr(self._device, attr)
+        if(callable(value) == False):
+            return value
+
+        # METHODS RUN ON THE WORKER, THE CALLER WAITS FOR THE RESULT
+        def call(*args, **kwargs):
+            return self._worker.call(value, *args, **kwargs)
+
+        return call
+
+    def __setattr__(self, attr, value):
+        if(attr.startswith("_")):
+            object.__setattr__(self, attr, value)
+        else:
+            self._worker.call(setattr, self._device, attr, value)
+
+        return
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Queue a device method without waiting for it.
+
+        Parameters
+        ----------
+        method : str
+            name of the device method.
+        *args, **kwargs
+            arguments for the method.
+
+        Returns
+        -------
+        Future
+            result of the method.
+
+        """
+        return self._worker.submit(getattr(self._device, method), *args, **kwargs)
+
+    def callAsync(self, method, *args, **kwargs):
+        """
+        Queue a device method for an asyncio caller, must be called from a
+        running event loop.
+
+        Returns
+        -------
+        asyncio.Future
+            awaitable result of the method.
+
+        """
+        return asyncio.wrap_future(self.submit(method, *args, **kwargs))
+
+    def close(self):
+        """
+        Close the device on its worker and stop the worker.
+
+        Returns
+        -------
+        object
+            result of the device close.
+
+        """
+        try:
+            return self._worker.call(self._device.close)
+        finally:
+            self._worker.stop()
@@ -6,20 +6,23 @@ Created on Fri Jan 28 11:51:49 2022
 """
 
 import numpy, os
-import matplotlib.pyplot as plt
 import time
+import lazy_import
+
+# HARDWARE AND PLOTTING PACKAGES ARE LOADED WHEN FIRST USED
+plt = lazy_import.LazyModule("matplotlib.pyplot")
 
 # FOR DAQ
-import nidaqmx.system
-from nidaqmx.constants import LineGrouping
+nidaqmx = lazy_import.LazyModule("nidaqmx")
+constants = lazy_import.LazyModule("nidaqmx.constants")
 
-import serial
+serial = lazy_import.LazyModule("serial")
 
 # FOR OCEAN OPTICS HR4000
-from seabreeze.spectrometers import Spectrometer
+spectrometers = lazy_import.LazyModule("seabreeze.spectrometers")
 
 # FOR THORLABS ITC4005 LASER DIODE DRIVER
-import pyvisa
+pyvisa = lazy_import.LazyModule("pyvisa")
 
 # CONTROLS THE OCEAN OPTICS HR4000 OSA
 # REQUIRES SEABREEZE TO BE INSTALLED
@@ -43,7 +46,7 @@ class SpectrumAnalyzer():
         # SERIAL NUMBER: HR4D1482
         # self.spec = Spectrometer.from_serial_number(serialnum)
         
-        self.spec = Spectrometer.from_first_available()
+        self.spec = spectrometers.Spectrometer.from_first_available()
         
         self.spec.integration_time_micros(self.integration_time)
         
@@ -543,7 +546,7 @@ class RelayControl():
 
         """
         with nidaqmx.Task() as task:
-            task.do_channels.add_do_chan(self.target, line_grouping=LineGrouping.CHAN_PER_LINE)
+            task.do_channels.add_do_chan(self.target, line_grouping=constants.LineGrouping.CHAN_PER_LINE)
             task.write(self.relays)
             
         return
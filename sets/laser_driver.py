@@ -5,26 +5,229 @@ Created on Fri Jan 28 11:51:49 2022
 @author: ryan.robinson
 """
 
-# FOR THORLABS ITC4005 LASER DIODE DRIVER
-import pyvisa
+import threading, time
+import numpy as np
+from collections import deque
+import lazy_import
+import laser_driver_sim
+
+# FOR THORLABS ITC4005 LASER DIODE DRIVER, LOADED WHEN AN INSTRUMENT IS OPENED
+pyvisa = lazy_import.LazyModule("pyvisa")
+
+# MOST QUERIES SENT IN ONE TRANSACTION
+BATCH_SIZE = 12
+
+# OLDEST ERROR IN THE QUEUE, CODE 0 WHEN THERE IS NONE
+ERROR_QUERY = "SYSTem:ERRor?"
+
+# TELEMETRY SAMPLES KEPT BY THE POLLER
+TELEMETRY_SAMPLES = 3000
+
+# TELEMETRY WINDOW FLAGS, THE OUTPUT WAS OFF OR A PROTECTION TRIPPED
+TELEMETRY_OFF = 1
+TELEMETRY_TRIPPED = 2
+
+def parseBool(response):
+    """
+    Parse a SCPI boolean response.
+
+    Parameters
+    ----------
+    response : str
+        "1", "0", "ON" or "OFF".
+
+    Returns
+    -------
+    bool
+        the state.
+
+    """
+    return response.strip().upper() in ("1", "ON")
+
+def parseError(response):
+    """
+    Parse the error code of a SYSTem:ERRor? response, with or without a
+    sign, '0,"No error"' or '+0,"No error"' gives 0.
+
+    Parameters
+    ----------
+    response : str
+        "code,message".
+
+    Returns
+    -------
+    int
+        error code, None if the response is malformed.
+
+    """
+    try:
+        return int(response.split(",", 1)[0].strip())
+    except ValueError:
+        return None
+
+def sameSetting(a, b):
+    """
+    Compare two setting values as written or read back, numbers by value
+    and keywords allowing the SCPI short form, "PULS" matches "PULSE".
+
+    Parameters
+    ----------
+    a : str
+        setting value.
+    b : str
+        setting value.
+
+    Returns
+    -------
+    bool
+        True if the values are the same setting.
+
+    """
+    a = str(a).strip().upper()
+    b = str(b).strip().upper()
+    try:
+        x, y = float(a), float(b)
+        return abs(x - y) <= 1e-9 * max(abs(x), abs(y), 1.0)
+    except ValueError:
+        return a.startswith(b) or b.startswith(a)
+
+# PROTECTION TRIPS CHECKED BEFORE A MEASUREMENT
+# "OUTPut:PROTection:INTernal:TRIPped?" IS NOT USED
+PROTECTION = {"voltage" : ("OUTPut:PROTection:VOLTage:TRIPped?", parseBool),
+              "external" : ("OUTPut:PROTection:EXTernal:TRIPped?", parseBool),
+              "interlock" : ("OUTPut:PROTection:INTLock:TRIPped?", parseBool),
+              "keylock" : ("OUTPut:PROTection:KEYLock:TRIPped?", parseBool),
+              "overTemperature" : ("OUTPut:PROTection:OTEMp:TRIPped?", parseBool)}
+
+# OUTPUT SETTINGS AND READINGS IN A STATUS SNAPSHOT
+STATUS = {"state" : ("OUTPut:STATe?", parseBool),
+          "shape" : ("SOURce:FUNCtion:SHAPe?", str),
+          "current" : ("SOURce:CURRent?", float),
+          "dutyCycle" : ("SOURce:PULSe:DCYCle?", float),
+          "measuredCurrent" : ("MEASure:CURRent?", float),
+          "measuredVoltage" : ("MEASure:VOLTage?", float)}
 
 # CONTROLS THE THORLABS ITC4005    
 class CurrentSupply():
-    def __init__(self, usbaddr = "USB::4883::32842::M00466376"):
+    def __init__(self, usbaddr = "USB::4883::32842::M00466376", simulation = {}):
         """
         Connects to the current supply device.
 
+        Parameters
+        ----------
+        usbaddr : str, optional
+            VISA address, an address starting with SIM connects to the
+            simulated ITC4005. The default is "USB::4883::32842::M00466376".
+        simulation : dict, optional
+            SimulatedITC4005 options (latency, commandLatency, errorRate,
+            seed, signedErrors) used with a SIM address. The default is {}.
+
         Returns
         -------
         None.
 
         """
-        usbaddr = "USB::4883::32842::M00466376"
+        self.itc = USBDevice(usbaddr, simulation)
         
-        self.itc = USBDevice(usbaddr)
+        # LAST VALUE WRITTEN TO OR READ FROM EACH SETTING, EMPTY ON CONNECT
+        self.shadow = {}
+        
+        # READ BACK CACHED SETTINGS BEFORE SKIPPING A WRITE
+        self.verify = False
+        
+        return
+    
+    def invalidate(self):
+        """
+        Forget the cached settings, the next write of every setting is sent.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.shadow.clear()
         
         return
     
+    def setSettings(self, settings):
+        """
+        Write the settings that differ from the cached state in one
+        transaction. Settings already in the cache are skipped, and with
+        verify on they are read back first and written if the instrument
+        disagrees. The error queue is read in the same transaction and the
+        written settings are dropped from the cache if the instrument
+        reports an error, the whole cache is cleared if the write fails.
+
+        Parameters
+        ----------
+        settings : dict
+            SCPI header: value, for example {"SOURce:CURRent" : 2.8}.
+
+        Returns
+        -------
+        int
+            number of settings written, 0 if they were rejected.
+
+        """
+        settings = {key : str(value) for key, value in settings.items()}
+        cached = [key for key, value in settings.items() if key in self.shadow and sameSetting(self.shadow[key], value)]
+        
+        # CONFIRM THE CACHED SETTINGS ON THE INSTRUMENT
+        if(self.verify and len(cached) > 0):
+            readings = self.readSettings(cached)
+            cached = [key for key in cached if sameSetting(readings[key], settings[key])]
+        
+        changed = {key : value for key, value in settings.items() if key not in cached}
+        if(len(changed) == 0):
+            return 0
+        
+        # THE ERROR QUERY IN THE SAME TRANSACTION TELLS IF THE WRITE WAS ACCEPTED
+        commands = ["{} {}".format(key, value) for key, value in changed.items()] + [ERROR_QUERY]
+        try:
+            error = self.itc.send(":" + ";:".join(commands))
+        except:
+            self.invalidate()
+            raise
+        
+        # A REJECTED SETTING OR AN UNREADABLE REPLY LEAVES THE INSTRUMENT STATE
+        # UNKNOWN, SEND THEM AGAIN NEXT TIME
+        if(parseError(error) != 0):
+            for key in changed:
+                self.shadow.pop(key, None)
+            print("Laser driver rejected {}:\n{}".format(", ".join(commands[:-1]), error))
+            return 0
+        
+        self.shadow.update(changed)
+        
+        return len(changed)
+    
+    def readSettings(self, keys):
+        """
+        Read settings from the instrument in one transaction and refresh
+        the cache with them.
+
+        Parameters
+        ----------
+        keys : list
+            SCPI headers of the settings.
+
+        Returns
+        -------
+        dict
+            SCPI header: value read back.
+
+        """
+        try:
+            readings = self.itc.sendBatch({key : (key + "?", str) for key in keys})
+        except:
+            self.invalidate()
+            raise
+        
+        self.shadow.update(readings)
+        
+        return readings
+    
     def protectionQuery(self):
         """
         Tests if any protection queries are tripped.
@@ -35,24 +238,46 @@ class CurrentSupply():
             returns a value of 1 if a protection query is tripped.
 
         """
-        vQ = "OUTPut:PROTection:VOLTage:TRIPped?"
-        eQ = "OUTPut:PROTection:EXTernal:TRIPped?"
-        # wQ = "OUTPut:PROTection:INTernal:TRIPped?" # Not used
-        iQ = "OUTPut:PROTection:INTLock:TRIPped?"
-        kQ = "OUTPut:PROTection:KEYLock:TRIPped?"
-        tQ = "OUTPut:PROTection:OTEMp:TRIPped?"
-        
-        listQ = [vQ, eQ, iQ, kQ, tQ]
+        # ALL PROTECTION QUERIES IN ONE TRANSACTION
+        tripped = self.itc.sendBatch(PROTECTION)
         
         test = 0
-        for Q in listQ:
-            response = self.itc.send(Q)
-            if(response == "1"):
-                print("Unable to start laser driver:\n"+Q+"\nreturned 1.")
+        for name, value in tripped.items():
+            if(value == True):
+                print("Unable to start laser driver:\n"+PROTECTION[name][0]+"\nreturned 1.")
                 test = 1
         
         return test
     
+    def getStatus(self):
+        """
+        Read the output settings, readings and protection trips in one
+        transaction.
+
+        Returns
+        -------
+        dict
+            state (bool), shape (str), current, dutyCycle, measuredCurrent
+            and measuredVoltage (float) and one bool per protection trip.
+
+        """
+        queries = dict(STATUS)
+        queries.update(PROTECTION)
+        
+        try:
+            status = self.itc.sendBatch(queries)
+        except:
+            self.invalidate()
+            raise
+        
+        # REFRESH THE CACHED SETTINGS
+        self.shadow.update({"OUTPut:STATe" : "ON" if status["state"] else "OFF",
+                            "SOURce:FUNCtion:SHAPe" : status["shape"],
+                            "SOURce:CURRent" : str(status["current"]),
+                            "SOURce:PULSe:DCYCle" : str(status["dutyCycle"])})
+        
+        return status
+    
     def setPresets(self, current = 2.8):
         """
         Sets the defaults for the ITC4005 current driver.
@@ -71,10 +296,9 @@ class CurrentSupply():
         shapeSet    = "SOURce:FUNCtion:SHAPe PULSE"         # Set to pulsed
         modSet      = "SOURce:AM 0"                         # Turn modulation off
         
-        # Send all preset commands relating to the laser driver
+        # Send the preset commands that change a setting, in one transaction
         commands = [limitSet, currentSet, periodSet, modeSet, shapeSet, modSet]
-        for command in commands:
-            self.itc.write(command)
+        self.setSettings(dict(command.split(" ", 1) for command in commands))
         
         return
     
@@ -92,9 +316,7 @@ class CurrentSupply():
         None.
 
         """
-        command = "SOURce:CURRent {}".format(curr)
-        
-        self.itc.write(command)
+        self.setSettings({"SOURce:CURRent" : curr})
         
         return
     
@@ -112,9 +334,7 @@ class CurrentSupply():
             current setting in Amphere.
 
         """
-        command = "SOURce:CURRent?"
-        
-        return self.itc.send(command)
+        return self.readSettings(["SOURce:CURRent"])["SOURce:CURRent"]
     
     def setDutyCycle(self, dutyCycle):
         """
@@ -133,15 +353,13 @@ class CurrentSupply():
         if(dutyCycle == 100):
             self.setCW()
         else:
-            self.setPulsed()
-            command = "SOURce:PULSe:DCYCle {}".format(dutyCycle)
-            self.itc.write(command)
+            self.setSettings({"SOURce:FUNCtion:SHAPe" : "PULSE",
+                              "SOURce:PULSe:DCYCle" : dutyCycle})
         
         return
     
     def getState(self):
-        command = ":OUTPut:STATe?"
-        return self.itc.send(command)
+        return self.readSettings(["OUTPut:STATe"])["OUTPut:STATe"]
     
     def switchOn(self):
         """
@@ -152,24 +370,31 @@ class CurrentSupply():
         None.
 
         """
-        command = ":OUTPut:STATe ON"
-    
-        self.itc.write(command)    
+        # ALWAYS SENT, A PROTECTION TRIP CAN TURN THE OUTPUT OFF BEHIND THE CACHE
+        self.shadow.pop("OUTPut:STATe", None)
+        self.setSettings({"OUTPut:STATe" : "ON"})
     
         return
     
-    def switchOff(self):
+    def switchOff(self, force = False):
         """
         Switches the laser diode off.
 
+        Parameters
+        ----------
+        force : bool, optional
+            send the command even if the output is cached as off. The
+            default is False.
+
         Returns
         -------
         None.
 
         """
-        command = ":OUTPut:STATe OFF"
+        if(force):
+            self.shadow.pop("OUTPut:STATe", None)
         
-        self.itc.write(command) 
+        self.setSettings({"OUTPut:STATe" : "OFF"})
         
         return
     
@@ -187,9 +412,7 @@ class CurrentSupply():
         None.
 
         """
-        command = "SOURce:PULse:PERiod {}".format(period)
-        
-        self.itc.write(command)
+        self.setSettings({"SOURce:PULse:PERiod" : period})
         
         return
     
@@ -202,9 +425,8 @@ class CurrentSupply():
         None.
 
         """
-        command = "SOURce:FUNC:MODE CURR;SHAP DC"
-        
-        self.itc.write(command)
+        self.setSettings({"SOURce:FUNCtion:MODE" : "CURRent",
+                          "SOURce:FUNCtion:SHAPe" : "DC"})
         
         return
     
@@ -217,10 +439,7 @@ class CurrentSupply():
         None.
 
         """
-        
-        command = "SOURce:FUNCtion:SHAPe PULSE"
-        
-        self.itc.write(command)
+        self.setSettings({"SOURce:FUNCtion:SHAPe" : "PULSE"})
         
         return
     
@@ -234,13 +453,11 @@ class CurrentSupply():
 
         """
         
-        command = "SOURce:FUNCtion:SHAPe?"
-        
-        return self.itc.send(command)
+        return self.readSettings(["SOURce:FUNCtion:SHAPe"])["SOURce:FUNCtion:SHAPe"]
     
     def getDutyCycle(self):
         
-        return self.itc.send("SOURce:PULSe:DCYCle?")
+        return self.readSettings(["SOURce:PULSe:DCYCle"])["SOURce:PULSe:DCYCle"]
     
     def close(self):
         """
@@ -253,7 +470,7 @@ class CurrentSupply():
         """
         try:
             # SHUT OFF CURRENT OUTPUT
-            self.switchOff()
+            self.switchOff(force = True)
         finally:
             # CLOSE THE DEVICE
             self.itc.close()
@@ -263,8 +480,16 @@ class CurrentSupply():
 # GENERIC USB DEVICE CLASS
 # USED TO COMMUNICATE WITH THE THORLABS ITC40005    
 class USBDevice:
-    def __init__(self,rname):
-        self.inst = pyvisa.ResourceManager().open_resource(rname)
+    def __init__(self, rname, simulation = {}):
+        if(rname.upper().startswith(laser_driver_sim.SIMULATED)):
+            self.inst = laser_driver_sim.SimulatedITC4005(**simulation)
+        else:
+            self.inst = pyvisa.ResourceManager().open_resource(rname)
+        
+        # TRANSACTIONS AND SECONDS SPENT WAITING ON THE INSTRUMENT
+        self.transactions = 0
+        self.busyTime = 0.0
+        
         return None
     
     def settimeout(self,timeout):
@@ -299,7 +524,12 @@ class USBDevice:
         None.
 
         """
-        self.inst.write(command)
+        start = time.perf_counter()
+        try:
+            self.inst.write(command)
+        finally:
+            self.transactions = self.transactions + 1
+            self.busyTime = self.busyTime + time.perf_counter() - start
         
         return
     
@@ -318,7 +548,49 @@ class USBDevice:
             command response.
 
         """
-        return self.inst.query(command).strip('\r\n')
+        start = time.perf_counter()
+        try:
+            return self.inst.query(command).strip('\r\n')
+        finally:
+            self.transactions = self.transactions + 1
+            self.busyTime = self.busyTime + time.perf_counter() - start
+    
+    def sendBatch(self, queries):
+        """
+        Sends several queries in one transaction. The queries are joined
+        with ";:" so each starts from the root of the command tree, and the
+        ";" separated response is split and parsed.
+
+        Parameters
+        ----------
+        queries : dict
+            name: (query, parser), the parser turns a response string into
+            its value, for example float or parseBool.
+
+        Raises
+        ------
+        ValueError
+            a response could not be parsed.
+
+        Returns
+        -------
+        dict
+            name: parsed response, in the order of the queries.
+
+        """
+        names = list(queries)
+        responses = []
+        for i in range(0, len(names), BATCH_SIZE):
+            commands = [queries[name][0].lstrip(":") for name in names[i:i + BATCH_SIZE]]
+            fields = self.send(":" + ";:".join(commands)).split(";")
+            
+            # ONE QUERY AT A TIME IF THE RESPONSE DOES NOT LINE UP
+            if(len(fields) != len(commands)):
+                fields = [self.send(":" + command) for command in commands]
+            
+            responses.extend(fields)
+        
+        return {name : queries[name][1](response.strip()) for name, response in zip(names, responses)}
     
     def close(self):
         """
@@ -333,3 +605,169 @@ class USBDevice:
         
         return
 
+# SAMPLES THE DRIVE CONDITIONS OF THE ITC4005 IN THE BACKGROUND
+class TelemetryPoller:
+    def __init__(self, supply, rate = 5.0, samples = TELEMETRY_SAMPLES):
+        """
+        Poll the laser driver status into a ring buffer.
+
+        Parameters
+        ----------
+        supply : CurrentSupply
+            laser driver, or its DeviceProxy so the polls queue with the
+            other commands.
+        rate : float, optional
+            samples per second. The default is 5.0.
+        samples : int, optional
+            samples kept. The default is TELEMETRY_SAMPLES.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.supply = supply
+        self.period = 1.0 / rate
+        
+        # TELEMETRY AS (time, measured current, measured voltage, output on, tripped)
+        self.telemetry = deque(maxlen = samples)
+        self.lock = threading.Lock()
+        
+        self.stopEvent = threading.Event()
+        self.thread = None
+        self.error = None
+        
+        return
+    
+    def start(self):
+        """
+        Start polling.
+
+        Returns
+        -------
+        None.
+
+        """
+        if(self.thread != None and self.thread.is_alive()):
+            return
+        
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target = self.pollLoop, daemon = True)
+        self.thread.start()
+        
+        return
+    
+    def stop(self):
+        """
+        Stop polling, the telemetry is kept.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stopEvent.set()
+        if(self.thread != None):
+            self.thread.join(2)
+        
+        return
+    
+    def pollLoop(self):
+        """
+        Read the status once per period until stopped, runs on the poller
+        thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        while(self.stopEvent.is_set() == False):
+            t0 = time.time()
+            try:
+                status = self.supply.getStatus()
+            except Exception as e:
+                # REPORT EACH NEW ERROR ONCE
+                if(str(e) != self.error):
+                    print("Laser driver telemetry error: {}".format(e))
+                    self.error = str(e)
+                self.stopEvent.wait(self.period)
+                continue
+            t1 = time.time()
+            
+            # DATE THE SAMPLE AT THE MIDDLE OF THE TRANSACTION
+            tripped = any(status[name] for name in PROTECTION)
+            with self.lock:
+                self.telemetry.append(((t0 + t1) / 2, status["measuredCurrent"], status["measuredVoltage"], status["state"], tripped))
+            self.error = None
+            
+            self.stopEvent.wait(max(0.0, self.period - (time.time() - t0)))
+        
+        return
+    
+    def getTelemetry(self, seconds = None):
+        """
+        Get the recent telemetry.
+
+        Parameters
+        ----------
+        seconds : float, optional
+            only return samples from the last few seconds. The default is
+            all samples kept.
+
+        Returns
+        -------
+        numpy array
+            time, current, voltage, output on and tripped columns, one row
+            per sample.
+
+        """
+        with self.lock:
+            data = np.array(self.telemetry, dtype = float).reshape(-1, 5)
+        
+        if(seconds != None):
+            data = data[data[:,0] >= time.time() - seconds]
+        
+        return data
+    
+    def getWindow(self, tStart, tEnd):
+        """
+        Summarize the telemetry over an integration, the samples taken
+        during it and the last sample before it.
+
+        Parameters
+        ----------
+        tStart : float
+            time the integration started.
+        tEnd : float
+            time the integration ended.
+
+        Returns
+        -------
+        dict
+            samples, current, voltage (means), voltageMin, voltageMax and
+            flags (TELEMETRY_OFF, TELEMETRY_TRIPPED), None if there is no
+            telemetry for the window.
+
+        """
+        data = self.getTelemetry()
+        first = max(np.searchsorted(data[:,0], tStart, side = 'right') - 1, 0)
+        last = np.searchsorted(data[:,0], tEnd, side = 'right')
+        window = data[first:last]
+        
+        # NOTHING BEFORE THE END, OR THE LAST SAMPLE IS TOO OLD TO DESCRIBE THE WINDOW
+        if(len(window) == 0 or window[-1,0] < tStart - 2 * self.period):
+            return None
+        
+        flags = 0
+        if(np.any(window[:,3] == 0)):
+            flags = flags | TELEMETRY_OFF
+        if(np.any(window[:,4] != 0)):
+            flags = flags | TELEMETRY_TRIPPED
+        
+        return {"samples" : len(window),
+                "current" : float(np.mean(window[:,1])),
+                "voltage" : float(np.mean(window[:,2])),
+                "voltageMin" : float(np.min(window[:,2])),
+                "voltageMax" : float(np.max(window[:,2])),
+                "flags" : flags}
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:05:38 2026
+
+Simulated Thorlabs ITC4005 for running the station without hardware.
+
+SimulatedITC4005 stands in for the pyvisa resource used by
+laser_driver.USBDevice. It keeps the instrument settings, answers the SCPI
+subset the station uses (current and limit, pulse period and duty cycle,
+function mode and shape, modulation, output state, protection trips,
+measured current and voltage, *IDN? and SYSTem:ERRor?) and follows the
+SCPI rules for short and long forms, optional nodes and ";" separated
+compound commands. Every transaction waits a configurable latency, and a
+fraction of them can be made to fail, so the measurement loop can be
+timed and its error handling exercised off the line.
+
+It is selected by setting ITC4005_Address in device_addresses.cfg to an
+address starting with SIM, for example SIM::ITC4005.
+"""
+
+import time, threading
+import numpy as np
+
+# ADDRESS PREFIX THAT SELECTS THE SIMULATOR
+SIMULATED = "SIM"
+
+# LONG FORMS OF THE SCPI NODES, ANYTHING ELSE IS TAKEN AS A SHORT FORM
+LONG_FORMS = {"SOURCE" : "SOUR", "CURRENT" : "CURR", "LIMIT" : "LIM", "PULSE" : "PULS",
+              "PERIOD" : "PER", "FUNCTION" : "FUNC", "SHAPE" : "SHAP", "DCYCLE" : "DCYC",
+              "OUTPUT" : "OUTP", "STATE" : "STAT", "PROTECTION" : "PROT", "VOLTAGE" : "VOLT",
+              "EXTERNAL" : "EXT", "INTERNAL" : "INT", "INTLOCK" : "INTL", "KEYLOCK" : "KEYL",
+              "OTEMP" : "OTEM", "TRIPPED" : "TRIP", "MEASURE" : "MEAS", "SYSTEM" : "SYST",
+              "ERROR" : "ERR", "LEVEL" : "LEV", "IMMEDIATE" : "IMM", "AMPLITUDE" : "AMPL",
+              "SCALAR" : "SCAL"}
+
+# OPTIONAL NODES, DROPPED BEFORE A HEADER IS LOOKED UP
+OPTIONAL = ("LEV", "IMM", "AMPL", "SCAL")
+
+# PROTECTION CIRCUITS, AS THE SHORT FORM OF THEIR NODE
+PROTECTIONS = ("VOLT", "EXT", "INT", "INTL", "KEYL", "OTEM")
+
+# SCPI ERRORS
+NO_ERROR = '0,"No error"'
+UNDEFINED_HEADER = '-113,"Undefined header"'
+DATA_OUT_OF_RANGE = '-222,"Data out of range"'
+ILLEGAL_PARAMETER = '-224,"Illegal parameter value"'
+SETTINGS_CONFLICT = '-221,"Settings conflict"'
+
+class SimulatedTimeout(IOError):
+    """ A simulated transaction that got no response in time. """
+    pass
+
+class SimulatedITC4005:
+    def __init__(self, latency = 0.004, commandLatency = 0.0005, errorRate = 0.0, seed = None, signedErrors = False):
+        """
+        Power on the simulated instrument.
+
+        Parameters
+        ----------
+        latency : float, optional
+            seconds each write or query transaction takes. The default is
+            0.004, about a USB-TMC round trip.
+        commandLatency : float, optional
+            extra seconds for each command in a compound transaction. The
+            default is 0.0005.
+        errorRate : float, optional
+            fraction of transactions that fail with SimulatedTimeout. The
+            default is 0.
+        seed : int, optional
+            seed for the injected errors and reading noise. The default is
+            None.
+        signedErrors : bool, optional
+            reply to SYSTem:ERRor? with a signed code, '+0,"No error"',
+            like some firmware does. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.latency = latency
+        self.commandLatency = commandLatency
+        self.errorRate = errorRate
+        self.signedErrors = signedErrors
+        self.rng = np.random.default_rng(seed)
+        self.timeout = 2000
+        self.lock = threading.Lock()
+
+        # DIODE MODEL FOR THE MEASURED VOLTAGE, V = V0 + R * I
+        self.v0 = 1.6
+        self.resistance = 0.12
+
+        # TIME SPENT AND TRANSACTIONS SERVED
+        self.transactions = 0
+        self.commands = 0
+        self.busyTime = 0.0
+
+        self.reset()
+
+        return
+
+    def reset(self):
+        """
+        Return to the power on settings and clear the trips and errors.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.settings = {"SOUR:CURR" : 0.0,
+                         "SOUR:CURR:LIM" : 4.0,
+                         "SOUR:PULS:PER" : 0.001,
+                         "SOUR:PULS:DCYC" : 50.0,
+                         "SOUR:FUNC:MODE" : "CURR",
+                         "SOUR:FUNC:SHAP" : "DC",
+                         "SOUR:AM" : False,
+                         "OUTP:STAT" : False}
+        self.tripped = {name : False for name in PROTECTIONS}
+        self.errors = []
+
+        return
+
+    def write(self, command):
+        """
+        Send commands that give no response.
+
+        Parameters
+        ----------
+        command : str
+            one command or several separated by ";".
+
+        Returns
+        -------
+        None.
+
+        """
+        self.transact(command)
+
+        return
+
+    def query(self, command):
+        """
+        Send commands and read the response.
+
+        Parameters
+        ----------
+        command : str
+            one query or several separated by ";".
+
+        Raises
+        ------
+        SimulatedTimeout
+            the transaction failed, or no query in it had a response.
+
+        Returns
+        -------
+        str
+            responses separated by ";", ending in a new line.
+
+        """
+        responses = self.transact(command)
+        if(len(responses) == 0):
+            raise SimulatedTimeout("Timeout expired before operation completed.")
+
+        return ";".join(responses) + "\n"
+
+    def transact(self, command):
+        """
+        Run one transaction.
+
+        Returns
+        -------
+        list
+            responses of the queries in the transaction.
+
+        """
+        with self.lock:
+            parts = [part.strip() for part in command.strip().split(";") if part.strip() != ""]
+
+            # WAIT LIKE THE BUS WOULD
+            delay = self.latency + self.commandLatency * len(parts)
+            time.sleep(delay)
+            self.transactions = self.transactions + 1
+            self.commands = self.commands + len(parts)
+            self.busyTime = self.busyTime + delay
+
+            if(self.errorRate > 0 and self.rng.random() < self.errorRate):
+                raise SimulatedTimeout("Simulated I/O error.")
+
+            responses = []
+            path = []
+            for part in parts:
+                header, _, value = part.partition(" ")
+
+                # COMMON COMMANDS ARE ALWAYS ABSOLUTE
+                if(header.startswith("*")):
+                    if(header.upper() == "*IDN?"):
+                        responses.append("Thorlabs,ITC4005,SIM00000,1.0.0")
+                    elif(header.upper() == "*RST"):
+                        self.reset()
+                    else:
+                        self.errors.append(UNDEFINED_HEADER)
+                    continue
+
+                # A HEADER WITHOUT A LEADING ":" CONTINUES FROM THE LAST ONE
+                nodes = [self.shortForm(node) for node in header.lstrip(":").split(":")]
+                if(header.startswith(":") == False and len(path) > 0):
+                    nodes = path[:-1] + nodes
+                path = nodes
+
+                response = self.execute(nodes, value.strip())
+                if(response != None):
+                    responses.append(response)
+
+        return responses
+
+    def shortForm(self, node):
+        """
+        Short form of a SCPI node, keeping a trailing "?".
+
+        Returns
+        -------
+        str
+            upper case short form.
+
+        """
+        node = node.upper()
+        query = node.endswith("?")
+        node = node.rstrip("?")
+        node = LONG_FORMS.get(node, node)
+
+        return node + "?" if query else node
+
+    def execute(self, nodes, value):
+        """
+        Run one command.
+
+        Parameters
+        ----------
+        nodes : list
+            short form header nodes, the last ends in "?" for a query.
+        value : str
+            parameter of a setting command.
+
+        Returns
+        -------
+        str
+            response of a query, None for a setting command or an error.
+
+        """
+        query = nodes[-1].endswith("?")
+        nodes = [node.rstrip("?") for node in nodes if node.rstrip("?") not in OPTIONAL]
+
+        # THE SOURCE ROOT IS OPTIONAL, OUTPUT STATE IS THE DEFAULT OUTPUT NODE
+        if(len(nodes) > 0 and nodes[0] in ("CURR", "PULS", "FUNC", "AM")):
+            nodes = ["SOUR"] + nodes
+        key = ":".join(nodes)
+        if(key == "OUTP"):
+            key = "OUTP:STAT"
+
+        # PROTECTION TRIPS
+        if(len(nodes) == 4 and nodes[:2] == ["OUTP", "PROT"] and nodes[2] in PROTECTIONS and nodes[3] == "TRIP" and query):
+            return "1" if self.tripped[nodes[2]] else "0"
+
+        # READINGS
+        if(key == "MEAS:CURR" and query):
+            return self.formatNumber(self.measuredCurrent())
+        if(key == "MEAS:VOLT" and query):
+            return self.formatNumber(self.measuredVoltage())
+        if(key == "SYST:ERR" and query):
+            error = self.errors.pop(0) if len(self.errors) > 0 else NO_ERROR
+            if(self.signedErrors and error[0] != "-"):
+                error = "+" + error
+            return error
+
+        if(key not in self.settings):
+            self.errors.append(UNDEFINED_HEADER)
+            return None
+
+        if(query):
+            return self.formatSetting(key)
+
+        self.set(key, value)
+
+        return None
+
+    def set(self, key, value):
+        """
+        Change a setting, checking the value like the instrument would.
+
+        Returns
+        -------
+        None.
+
+        """
+        try:
+            if(key in ("SOUR:AM", "OUTP:STAT")):
+                state = value.upper() in ("1", "ON")
+                if(value.upper() not in ("0", "1", "ON", "OFF")):
+                    raise ValueError()
+
+                # THE OUTPUT STAYS OFF WHILE A PROTECTION IS TRIPPED
+                if(key == "OUTP:STAT" and state and any(self.tripped.values())):
+                    self.errors.append(SETTINGS_CONFLICT)
+                    return
+                self.settings[key] = state
+
+            elif(key == "SOUR:FUNC:SHAP"):
+                shape = self.shortForm(value)
+                if(shape not in ("DC", "PULS")):
+                    raise ValueError()
+                self.settings[key] = shape
+
+            elif(key == "SOUR:FUNC:MODE"):
+                mode = self.shortForm(value)
+                if(mode not in ("CURR", "POW")):
+                    raise ValueError()
+                self.settings[key] = mode
+
+            else:
+                number = float(value)
+                limits = {"SOUR:CURR" : (0.0, self.settings["SOUR:CURR:LIM"]),
+                          "SOUR:CURR:LIM" : (0.0, 5.0),
+                          "SOUR:PULS:PER" : (1e-5, 1.0),
+                          "SOUR:PULS:DCYC" : (0.01, 99.99)}[key]
+                if(number < limits[0] or number > limits[1]):
+                    self.errors.append(DATA_OUT_OF_RANGE)
+                    return
+                self.settings[key] = number
+
+        except (ValueError, KeyError):
+            self.errors.append(ILLEGAL_PARAMETER)
+
+        return
+
+    def formatNumber(self, number):
+        return "{:+.6E}".format(number)
+
+    def formatSetting(self, key):
+        """
+        Response to a setting query.
+
+        Returns
+        -------
+        str
+            numbers in NR3 format, states as 1 or 0 and keywords in short
+            form.
+
+        """
+        value = self.settings[key]
+        if(isinstance(value, bool)):
+            return "1" if value else "0"
+        if(isinstance(value, float)):
+            return self.formatNumber(value)
+
+        return value
+
+    def measuredCurrent(self):
+        """
+        Current reading in A, 0 while the output is off.
+
+        Returns
+        -------
+        float
+            current.
+
+        """
+        if(self.settings["OUTP:STAT"] == False):
+            return 0.0
+
+        return self.settings["SOUR:CURR"] * (1 + 1e-3 * self.rng.standard_normal())
+
+    def measuredVoltage(self):
+        """
+        Voltage reading in V from the diode model, 0 while the output is off.
+
+        Returns
+        -------
+        float
+            voltage.
+
+        """
+        if(self.settings["OUTP:STAT"] == False):
+            return 0.0
+
+        return self.v0 + self.resistance * self.measuredCurrent() + 2e-3 * self.rng.standard_normal()
+
+    def outputPower(self):
+        """
+        Average electrical power into the diode in W from the settings, 0
+        while the output is off.
+
+        Returns
+        -------
+        float
+            power.
+
+        """
+        if(self.settings["OUTP:STAT"] == False):
+            return 0.0
+
+        current = self.settings["SOUR:CURR"]
+        dutyCycle = 100.0 if self.settings["SOUR:FUNC:SHAP"] == "DC" else self.settings["SOUR:PULS:DCYC"]
+
+        return current * (self.v0 + self.resistance * current) * dutyCycle / 100
+
+    def trip(self, protection = "INTL", tripped = True):
+        """
+        Trip or reset a protection circuit, a trip switches the output off.
+
+        Parameters
+        ----------
+        protection : str, optional
+            short form node of the protection. The default is "INTL".
+        tripped : bool, optional
+            trip or reset. The default is True.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.lock:
+            self.tripped[protection] = tripped
+            if(tripped):
+                self.settings["OUTP:STAT"] = False
+
+        return
+
+    def close(self):
+        return
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:14:52 2026
+
+Deferred imports for the hardware, database and plotting packages.
+
+seabreeze, pyvisa, pyserial, pyodbc, nidaqmx and matplotlib take most of
+the start up time and are not needed for offline analysis. A LazyModule
+stands in for a module and imports it the first time one of its
+attributes is used, so the package is only loaded when a device is
+connected, a plot is drawn or a database write happens. A missing package
+raises its ImportError at that point instead of at start up.
+"""
+
+import importlib, threading
+
+class LazyModule:
+    def __init__(self, name):
+        """
+        Init method.
+
+        Parameters
+        ----------
+        name : str
+            full module name, for example "matplotlib.pyplot".
+
+        Returns
+        -------
+        None.
+
+        """
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+        return
+
+    def _load(self):
+        """
+        Import the module if it has not been imported yet.
+
+        Returns
+        -------
+        module
+            the imported module.
+
+        """
+        if(self._module == None):
+            with self._lock:
+                if(self._module == None):
+                    self._module = importlib.import_module(self._name)
+
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module != None else "not loaded"
+
+        return "<lazy module '{}' ({})>".format(self._name, state)
@@ -5,30 +5,161 @@ Created on Wed Mar  8 13:47:05 2023
 @author: ryan.robinson
 """
 import serial
+import threading, time
+import numpy as np
+from collections import deque
+import serial_emulator
+
+# TELEMETRY SAMPLES KEPT, THE ARDUINO SENDS ONE PER SECOND
+TELEMETRY_SAMPLES = 600
+
+# TELEMETRY OLDER THAN THIS IN SECONDS IS NOT TRUSTED
+TELEMETRY_TIMEOUT = 5
+
+def main():
+    """ For unit testing. """
+
+    M = MuController("COM5")
+    try:
+        for i in range(0, 10):
+            time.sleep(1)
+            print(M.getFlow(), M.getTemperature())
+    finally:
+        M.close()
+
+    return
 
 class MuController():
 
-    def __init__(self):
-        self.ser = serial.Serial("COM8", 9600)
+    def __init__(self, comport = "COM8"):
+        """
+        Connect to the purge system arduino and start reading its telemetry.
+
+        Parameters
+        ----------
+        comport : str, optional
+            serial port of the arduino, one starting with SIM connects to
+            an emulated purge system. The default is "COM8".
+
+        Returns
+        -------
+        None.
+
+        """
+        self.emulator = None
+        if(comport.upper().startswith(serial_emulator.SIMULATED)):
+            self.emulator = serial_emulator.PurgeEmulator()
+            comport = self.emulator.port
+        self.ser = serial.Serial(comport, 9600, timeout = 1)
+
+        # TELEMETRY AS (time, flow in L/hour, cold plate temperature in C)
+        self.telemetry = deque(maxlen = TELEMETRY_SAMPLES)
+        self.lock = threading.Lock()
+
+        # READ THE TELEMETRY IN THE BACKGROUND
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target = self.readLoop, daemon = True)
+        self.thread.start()
+
         return
-        # try:
-        #     self.ser = serial.Serial("COM5", 9600)
-        #     self.ser.isOpen()
-        #     time.sleep(2)
-        #     self.ser.flush()
-        #
-        # except IOError:
-        #     pass
-        #
-        # while True:
-        #     text = self.ser.readline().decode()
-        #     data = text.split()
-        #     self.value = data[0]
-        #     self.value2 = data[1]
-        #     self.ser.flushInput()
-        #     # print(self.value2)
-        #     time.sleep(0.5)
 
+    def readLoop(self):
+        """
+        Read telemetry lines until the controller is closed, runs on the
+        reader thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        while(self.stopEvent.is_set() == False):
+            try:
+                line = self.ser.readline()
+            except Exception as e:
+                if(self.stopEvent.is_set() == False):
+                    print("Purge system read error: {}".format(e))
+                    self.stopEvent.wait(1)
+                continue
+
+            sample = parseTelemetry(line)
+            if(sample != None):
+                with self.lock:
+                    self.telemetry.append((time.time(),) + sample)
+
+        return
+
+    def getTelemetry(self, seconds = None):
+        """
+        Get the recent telemetry.
+
+        Parameters
+        ----------
+        seconds : float, optional
+            only return samples from the last few seconds. The default is
+            all samples kept.
+
+        Returns
+        -------
+        numpy array
+            time, flow and temperature columns, one row per sample.
+
+        """
+        with self.lock:
+            data = np.array(self.telemetry, dtype = float).reshape(-1, 3)
+
+        if(seconds != None):
+            data = data[data[:,0] >= time.time() - seconds]
+
+        return data
+
+    def getLatest(self):
+        """
+        Get the latest telemetry sample.
+
+        Returns
+        -------
+        tuple
+            (time, flow, temperature), None if nothing recent was received.
+
+        """
+        with self.lock:
+            if(len(self.telemetry) == 0):
+                return None
+            sample = self.telemetry[-1]
+
+        if(sample[0] < time.time() - TELEMETRY_TIMEOUT):
+            return None
+
+        return sample
+
+    def getFlow(self):
+        """
+        Get the purge flow.
+
+        Returns
+        -------
+        float
+            flow in L/hour, None if no recent telemetry.
+
+        """
+        sample = self.getLatest()
+
+        return None if sample == None else sample[1]
+
+    def getTemperature(self):
+        """
+        Get the cold plate temperature.
+
+        Returns
+        -------
+        float
+            temperature in C, None if no recent telemetry.
+
+        """
+        sample = self.getLatest()
+
+        return None if sample == None else sample[2]
 
     def purge(self):
         """
@@ -37,4 +168,133 @@ class MuController():
         self.ser.write(b'3')
 
         return
-    
\ No newline at end of file
+
+    def close(self):
+        """
+        Stop reading telemetry and close the serial port.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stopEvent.set()
+        try:
+            self.ser.close()
+        except Exception as e:
+            print(e)
+        self.thread.join(2)
+        if(self.emulator != None):
+            self.emulator.close()
+
+        return
+
+def parseTelemetry(line):
+    """
+    Parse a telemetry line from the purge system arduino, "flow temp".
+
+    Parameters
+    ----------
+    line : bytes
+        line read from the serial port.
+
+    Returns
+    -------
+    tuple
+        (flow, temperature), None if the line is not telemetry.
+
+    """
+    try:
+        fields = line.decode('ascii', errors = 'ignore').split()
+        if(len(fields) != 2):
+            return None
+
+        return float(fields[0]), float(fields[1])
+
+    except ValueError:
+        return None
+
+class CooldownController:
+    def __init__(self, muController, band = 0.5, slope = 0.01, window = 10):
+        """
+        Decide when the cold plate has cooled down after an emitter.
+
+        The cooldown is over when the temperature is back within a band of
+        the baseline taken before the measurement, or when it has stopped
+        falling.
+
+        Parameters
+        ----------
+        muController : MuController
+            purge system supplying the temperature.
+        band : float, optional
+            allowed rise over the baseline in C. The default is 0.5.
+        slope : float, optional
+            largest temperature change in C/s that counts as flat. The
+            default is 0.01.
+        window : float, optional
+            seconds of telemetry the slope is fit over. The default is 10.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.mu = muController
+        self.band = band
+        self.slope = slope
+        self.window = window
+        self.baseline = None
+
+        return
+
+    def setBaseline(self, seconds = 5):
+        """
+        Take the baseline temperature from the recent telemetry.
+
+        Parameters
+        ----------
+        seconds : float, optional
+            seconds of telemetry to average. The default is 5.
+
+        Returns
+        -------
+        float
+            baseline temperature in C, None if there is no recent telemetry.
+
+        """
+        data = self.mu.getTelemetry(seconds)
+        self.baseline = float(np.median(data[:,2])) if len(data) > 0 else None
+
+        return self.baseline
+
+    def check(self):
+        """
+        Check if the cooldown is over.
+
+        Returns
+        -------
+        str
+            "band" or "flat" if it is over, None if not or if there is no
+            telemetry to decide with.
+
+        """
+        temperature = self.mu.getTemperature()
+        if(temperature == None or self.baseline == None):
+            return None
+
+        # BACK NEAR THE BASELINE
+        if(temperature <= self.baseline + self.band):
+            return "band"
+
+        # NO LONGER COOLING, THE WINDOW MUST BE MOSTLY COVERED
+        data = self.mu.getTelemetry(self.window)
+        if(len(data) >= 3 and data[-1,0] - data[0,0] >= 0.8 * self.window):
+            slope = np.polyfit(data[:,0] - data[0,0], data[:,2], deg = 1)[0]
+            if(abs(slope) <= self.slope):
+                return "flat"
+
+        return None
+
+if __name__ == "__main__":
+    main()
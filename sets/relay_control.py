@@ -7,6 +7,13 @@ Created on Tue Sep 20 11:40:21 2022
 
 import serial
 import time
+import serial_emulator
+
+# THE FIRMWARE PRINTS A LINE LIKE "<Arduino is ready>" ONCE IT HAS BOOTED
+READY = b"ready"
+
+# SECONDS TO WAIT FOR THE FIRMWARE AFTER THE PORT OPENS AND RESETS THE BOARD
+READY_TIMEOUT = 3
 
 def main():
     """ For unit testing. """
@@ -30,16 +37,53 @@ def main():
     
 class Relay(serial.Serial):
     """ Class for controlling an arduino running the SETS firmware. """
-    def __init__(self, comport):
+    def __init__(self, comport, timeout = READY_TIMEOUT):
         """ Initialization for the class, requires the comport. """
+        # A SIM COMPORT CONNECTS TO AN EMULATED RELAY ARDUINO
+        self.emulator = None
+        if(comport.upper().startswith(serial_emulator.SIMULATED)):
+            self.emulator = serial_emulator.RelayEmulator()
+            comport = self.emulator.port
         super().__init__(comport)
         self.baudrate = 9600  # Set Baud rate to 9600
         self.bytesize = 8     # Number of data bits = 8
         self.parity   ='N'    # No parity
         self.stopbits = 1     # Number of Stop bits = 1
-        time.sleep(3)         # Sleep 3 seconds for serial initilization
+        self.ready = self.waitReady(timeout) # Wait for the firmware to boot
         return
     
+    def waitReady(self, timeout = READY_TIMEOUT):
+        """
+        Wait for the firmware to report that it is ready after opening the
+        port resets the board.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            seconds to wait. The default is READY_TIMEOUT.
+
+        Returns
+        -------
+        bool
+            True if the firmware reported ready, False if the wait timed out.
+
+        """
+        readTimeout = self.timeout
+        self.timeout = 0.05
+        deadline = time.time() + timeout
+        received = b""
+        try:
+            while(time.time() < deadline):
+                received = received + self.read(max(1, self.in_waiting))
+                if(READY in received.lower()):
+                    return True
+        finally:
+            self.timeout = readTimeout
+        
+        print("Relay did not report ready after {} s, continuing".format(timeout))
+        
+        return False
+    
     def rOpenBool(self, E):
         if(len(E) != 6):
             print("ERROR")
@@ -74,6 +118,8 @@ class Relay(serial.Serial):
             self.setError("error closing port: {0}".format(e))
         except:
             self.setError("error closing port")
+        if(self.emulator != None):
+            self.emulator.close()
         return
 
 class RelayFake:
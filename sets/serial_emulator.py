@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:48:09 2026
+
+Loopback serial emulators for the relay and purge system arduinos.
+
+Each emulator opens a pseudo terminal and answers on it like the firmware
+does on the COM port, so relay_control.Relay and purge_system.MuController
+talk to it through pyserial unchanged. Opening the port resets the board
+like the arduino auto reset: the firmware boots again, the relay prints
+"<Arduino is ready>" and the purge system starts sending its "flow temp"
+telemetry line every second. Every byte takes its time on the wire at the
+baud rate, in both directions.
+
+RelayEmulator keeps the six relays switched by "<OPEN n>" and "<CLOSE n>",
+n = 0 for all of them, an open relay lets its emitter light.
+PurgeEmulator starts a purge on the byte "3" and models the cold plate
+temperature, heated by a linked SimulatedITC4005.
+
+They are selected by setting Relay or Purge in device_addresses.cfg to an
+address starting with SIM, for example SIM::RELAY. Pseudo terminals need
+Linux or macOS.
+"""
+
+import os, re, select, errno, time, threading
+import numpy as np
+
+# ADDRESS PREFIX THAT SELECTS THE EMULATOR
+SIMULATED = "SIM"
+
+# BITS ON THE WIRE PER BYTE, 8N1
+FRAME_BITS = 10
+
+# RELAY FIRMWARE
+READY_LINE = b"<Arduino is ready>\r\n"
+RELAY_COMMAND = re.compile(rb"<\s*(OPEN|CLOSE)\s+(\d+)\s*>", re.IGNORECASE)
+RELAYS = 6
+
+# PURGE SYSTEM FIRMWARE
+PURGE = b"3"
+
+# DS18B20 RESOLUTION OF THE COLD PLATE TEMPERATURE IN C
+TEMPERATURE_STEP = 0.0625
+
+class SerialEmulator:
+    def __init__(self, baudrate = 9600, bootTime = 1.6):
+        """
+        Open a pseudo terminal and start the firmware thread.
+
+        Parameters
+        ----------
+        baudrate : int, optional
+            baud rate of the emulated port. The default is 9600.
+        bootTime : float, optional
+            seconds the board takes to boot after the port is opened. The
+            default is 1.6, the arduino bootloader.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.baudrate = baudrate
+        self.bootTime = bootTime
+        self.lock = threading.Lock()
+
+        # THE HOST OPENS THE SLAVE SIDE BY NAME, THE EMULATOR KEEPS THE MASTER
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        os.close(slave)
+
+        # FIRMWARE STATE
+        self.connected = False
+        self.booted = None
+        self.received = b""
+
+        # BYTES PASSED EACH WAY
+        self.bytesIn = 0
+        self.bytesOut = 0
+
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target = self.run, name = "{} emulator".format(type(self).__name__), daemon = True)
+        self.thread.start()
+
+        return
+
+    def byteTime(self, count):
+        return count * FRAME_BITS / self.baudrate
+
+    def run(self):
+        """
+        Firmware loop, runs on the emulator thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        while(self.stopEvent.is_set() == False):
+            try:
+                ready = select.select([self.master], [], [], 0.02)[0]
+                data = os.read(self.master, 1024) if len(ready) > 0 else b""
+            except OSError as e:
+                # NO HOST HAS THE PORT OPEN
+                if(e.errno != errno.EIO or self.stopEvent.is_set()):
+                    break
+                self.connected = False
+                self.stopEvent.wait(0.02)
+                continue
+
+            # OPENING THE PORT RESETS THE BOARD
+            if(self.connected == False):
+                self.connected = True
+                self.booted = time.time() + self.bootTime
+                self.received = b""
+                self.reset()
+
+            # A BOARD STILL BOOTING DROPS WHAT IT GETS
+            if(time.time() < self.booted):
+                continue
+            if(self.booted > 0):
+                self.booted = 0
+                self.boot()
+
+            if(len(data) > 0):
+                time.sleep(self.byteTime(len(data)))
+                self.bytesIn = self.bytesIn + len(data)
+                self.received = self.received + data
+                self.receive()
+
+            self.tick(time.time())
+
+        return
+
+    def send(self, data):
+        """
+        Send bytes to the host, taking their time on the wire.
+
+        Returns
+        -------
+        None.
+
+        """
+        time.sleep(self.byteTime(len(data)))
+        try:
+            os.write(self.master, data)
+            self.bytesOut = self.bytesOut + len(data)
+        except OSError:
+            pass
+
+        return
+
+    def reset(self):
+        """ The board was reset, called on the emulator thread. """
+        return
+
+    def boot(self):
+        """ The firmware finished booting, called on the emulator thread. """
+        return
+
+    def receive(self):
+        """ New bytes are in self.received, called on the emulator thread. """
+        return
+
+    def tick(self, t):
+        """ Called on the emulator thread between reads once booted. """
+        return
+
+    def close(self):
+        """
+        Stop the firmware thread and close the pseudo terminal.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stopEvent.set()
+        self.thread.join(2)
+        try:
+            os.close(self.master)
+        except OSError:
+            pass
+
+        return
+
+class RelayEmulator(SerialEmulator):
+    def __init__(self, baudrate = 9600, bootTime = 1.6):
+        """
+        Emulate the relay arduino, every relay is closed at power on.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.relays = [False] * RELAYS
+        self.commands = 0
+        super().__init__(baudrate, bootTime)
+
+        return
+
+    def reset(self):
+        with self.lock:
+            self.relays = [False] * RELAYS
+
+        return
+
+    def boot(self):
+        self.send(READY_LINE)
+
+        return
+
+    def receive(self):
+        """
+        Switch the relays of every complete command received.
+
+        Returns
+        -------
+        None.
+
+        """
+        end = self.received.rfind(b">")
+        if(end < 0):
+            return
+        commands, self.received = self.received[:end + 1], self.received[end + 1:]
+
+        with self.lock:
+            for action, n in RELAY_COMMAND.findall(commands):
+                n = int(n)
+                state = action.upper() == b"OPEN"
+                if(n == 0):
+                    self.relays = [state] * RELAYS
+                elif(1 <= n <= RELAYS):
+                    self.relays[n - 1] = state
+                self.commands = self.commands + 1
+
+        return
+
+    def getLit(self):
+        """
+        Emitters whose relay is open.
+
+        Returns
+        -------
+        list
+            emitter numbers, 1 to 6.
+
+        """
+        with self.lock:
+            return [i + 1 for i in range(0, RELAYS) if self.relays[i]]
+
+class PurgeEmulator(SerialEmulator):
+    def __init__(self, baudrate = 9600, bootTime = 1.6, period = 1.0, flow = 60.0, purgeFlow = 300.0, purgeTime = 10.0,
+                 ambient = 25.0, plateResistance = 0.2, plateTime = 10.0, seed = None):
+        """
+        Emulate the purge system arduino.
+
+        Parameters
+        ----------
+        baudrate : int, optional
+            baud rate of the emulated port. The default is 9600.
+        bootTime : float, optional
+            seconds the board takes to boot. The default is 1.6.
+        period : float, optional
+            seconds between telemetry lines. The default is 1.
+        flow : float, optional
+            nitrogen flow in L/hour. The default is 60.
+        purgeFlow : float, optional
+            flow in L/hour during a purge. The default is 300.
+        purgeTime : float, optional
+            seconds a purge lasts. The default is 10.
+        ambient : float, optional
+            cold plate temperature with the laser off in C. The default is
+            25.
+        plateResistance : float, optional
+            cold plate temperature rise in K per W of laser drive. The
+            default is 0.2.
+        plateTime : float, optional
+            thermal time constant of the cold plate in seconds. The default
+            is 10.
+        seed : int, optional
+            seed for the telemetry noise. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.period = period
+        self.flow = flow
+        self.purgeFlow = purgeFlow
+        self.purgeTime = purgeTime
+        self.ambient = ambient
+        self.plateResistance = plateResistance
+        self.plateTime = plateTime
+        self.rng = np.random.default_rng(seed)
+
+        # LASER HEATING THE COLD PLATE, A LINKED SimulatedITC4005
+        self.laser = None
+
+        self.temperature = ambient
+        self.tUpdate = time.time()
+        self.tNext = 0.0
+        self.purgeEnd = 0.0
+        super().__init__(baudrate, bootTime)
+
+        return
+
+    def boot(self):
+        self.tNext = time.time()
+
+        return
+
+    def receive(self):
+        """
+        Start a purge for every purge byte received.
+
+        Returns
+        -------
+        None.
+
+        """
+        if(PURGE in self.received):
+            self.purgeEnd = time.time() + self.purgeTime
+        self.received = b""
+
+        return
+
+    def tick(self, t):
+        """
+        Follow the cold plate temperature and send the telemetry when due.
+
+        Returns
+        -------
+        None.
+
+        """
+        power = 0.0 if self.laser == None else self.laser.outputPower()
+        steady = self.ambient + self.plateResistance * power
+        self.temperature += (steady - self.temperature) * (1 - np.exp(-max(t - self.tUpdate, 0.0) / self.plateTime))
+        self.tUpdate = t
+
+        if(t < self.tNext):
+            return
+        self.tNext = self.tNext + self.period * (np.floor((t - self.tNext) / self.period) + 1)
+
+        flow = (self.purgeFlow if t < self.purgeEnd else self.flow) * (1 + 0.01 * self.rng.standard_normal())
+        temperature = TEMPERATURE_STEP * np.round((self.temperature + 0.02 * self.rng.standard_normal()) / TEMPERATURE_STEP)
+        self.send("{:.2f} {:.4f}\r\n".format(flow, temperature).encode('ascii'))
+
+        return
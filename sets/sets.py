@@ -22,19 +22,29 @@ from tkinter import ttk
 # GENERAL IMPORTS
 import time, os
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg, NavigationToolbar2Tk)
-import threading
+import threading, queue
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
 
-# ITC4005, RELAY, HR4000 IMPORTS
+# PLOTTING, LOADED WHEN THE FIRST FIGURE IS MADE
+import lazy_import
+plt = lazy_import.LazyModule("matplotlib.pyplot")
+mplfigure = lazy_import.LazyModule("matplotlib.figure")
+backend_tkagg = lazy_import.LazyModule("matplotlib.backends.backend_tkagg")
+
+# ITC4005, RELAY, HR4000 IMPORTS, LOADED WHEN THE DEVICES ARE CONNECTED
 # import instruments
-import spectrum_analyzer
-import relay_control
-import laser_driver
-import purge_system
+spectrum_analyzer = lazy_import.LazyModule("spectrum_analyzer")
+relay_control = lazy_import.LazyModule("relay_control")
+laser_driver = lazy_import.LazyModule("laser_driver")
+purge_system = lazy_import.LazyModule("purge_system")
+spectrum_analyzer_sim = lazy_import.LazyModule("spectrum_analyzer_sim")
+laser_driver_sim = lazy_import.LazyModule("laser_driver_sim")
+import acquisition
+import device_worker
 import dataanalysis
+import spectrum_files
+import analysis_cache
 
 # FOR READING CONFIG FILE
 import configparser
@@ -42,9 +52,19 @@ import configparser
 # DATA ANALYSIS IMPORTS
 import dataanalysis as da
 
+# PRODUCTION DATABASE, LOADED WHEN A RESULT IS WRITTEN
+pyodbc = lazy_import.LazyModule("pyodbc")
+
 # Do we save?
 SAVE = True
 
+# Also save each spectrum as its own .csv file next to the run file?
+SAVE_CSV = False
+
+# Seconds to wait for each device to connect, and attempts per device
+CONNECT_TIMEOUT = 30
+CONNECT_ATTEMPTS = 2
+
 """ Class for managing threads and event """
 class ThreadManager:
     def __init__(self):
@@ -59,12 +79,25 @@ class ThreadManager:
 """ Class for controlling device addresses """
 class DeviceAddrs: 
     # Config File
-    cfgfile = r'device_addresses.cfg'
+    cfgfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'device_addresses.cfg')
     
     # Device adresses
     relayAddr = 'COM3'
     purgeAddr = 'COM5'
     ldAddr = 'USB0::0x1313::0x804A::M00466376'
+    osaAddr = 'USB'
+    
+    # Simulated laser driver settings, used with a SIM laser driver address
+    ldLatency = 0.004
+    ldCommandLatency = 0.0005
+    ldErrorRate = 0.0
+    
+    # Simulated spectrometer settings, used with a SIM OSA address
+    osaSeedFolder = ''
+    osaWavelength = 443.5
+    osaThermalResistance = 5.0
+    osaReadNoise = 6.0
+    osaTransferTime = 0.002
     
     def loadConfig(self):
         print("Loading device addresses config file...")
@@ -81,9 +114,48 @@ class DeviceAddrs:
         self.relayAddr  = str(self.config['DEVICE ADDRESSES']['Relay'])
         self.purgeAddr  = str(self.config['DEVICE ADDRESSES']['Purge'])
         self.ldAddr     = str(self.config['DEVICE ADDRESSES']['ITC4005_Address'])
+        self.osaAddr    = self.config.get('DEVICE ADDRESSES', 'OSA', fallback = self.osaAddr)
+        self.ldLatency          = self.config.getfloat('SIMULATION', 'ITC4005_Latency', fallback = self.ldLatency)
+        self.ldCommandLatency   = self.config.getfloat('SIMULATION', 'ITC4005_Command_Latency', fallback = self.ldCommandLatency)
+        self.ldErrorRate        = self.config.getfloat('SIMULATION', 'ITC4005_Error_Rate', fallback = self.ldErrorRate)
+        self.osaSeedFolder          = self.config.get('SIMULATION', 'HR4000_Seed_Folder', fallback = self.osaSeedFolder)
+        self.osaWavelength          = self.config.getfloat('SIMULATION', 'HR4000_Wavelength', fallback = self.osaWavelength)
+        self.osaThermalResistance   = self.config.getfloat('SIMULATION', 'HR4000_Thermal_Resistance', fallback = self.osaThermalResistance)
+        self.osaReadNoise           = self.config.getfloat('SIMULATION', 'HR4000_Read_Noise', fallback = self.osaReadNoise)
+        self.osaTransferTime        = self.config.getfloat('SIMULATION', 'HR4000_Transfer_Time', fallback = self.osaTransferTime)
         
         return
     
+    def getSimulation(self):
+        """
+        Options for the simulated laser driver.
+
+        Returns
+        -------
+        dict
+            SimulatedITC4005 options.
+
+        """
+        return {"latency" : self.ldLatency,
+                "commandLatency" : self.ldCommandLatency,
+                "errorRate" : self.ldErrorRate}
+    
+    def getOsaSimulation(self):
+        """
+        Options for the simulated spectrometer.
+
+        Returns
+        -------
+        dict
+            SimulatedHR4000 options.
+
+        """
+        return {"seedFolder" : self.osaSeedFolder,
+                "wavelength" : self.osaWavelength,
+                "thermalResistance" : self.osaThermalResistance,
+                "readNoise" : self.osaReadNoise,
+                "transferTime" : self.osaTransferTime}
+    
     def saveConfig(self):
         print("Saving config file...")
         
@@ -91,6 +163,17 @@ class DeviceAddrs:
         self.config.set('DEVICE ADDRESSES', 'Relay', str(self.relayAddr))
         self.config.set('DEVICE ADDRESSES', 'Purge', str(self.purgeAddr))
         self.config.set('DEVICE ADDRESSES', 'ITC4005_Address', str(self.ldAddr))
+        self.config.set('DEVICE ADDRESSES', 'OSA', str(self.osaAddr))
+        if(self.config.has_section('SIMULATION') == False):
+            self.config.add_section('SIMULATION')
+        self.config.set('SIMULATION', 'ITC4005_Latency', str(self.ldLatency))
+        self.config.set('SIMULATION', 'ITC4005_Command_Latency', str(self.ldCommandLatency))
+        self.config.set('SIMULATION', 'ITC4005_Error_Rate', str(self.ldErrorRate))
+        self.config.set('SIMULATION', 'HR4000_Seed_Folder', str(self.osaSeedFolder))
+        self.config.set('SIMULATION', 'HR4000_Wavelength', str(self.osaWavelength))
+        self.config.set('SIMULATION', 'HR4000_Thermal_Resistance', str(self.osaThermalResistance))
+        self.config.set('SIMULATION', 'HR4000_Read_Noise', str(self.osaReadNoise))
+        self.config.set('SIMULATION', 'HR4000_Transfer_Time', str(self.osaTransferTime))
         
         f = open(self.cfgfile, 'w')
         self.config.write(f)
@@ -138,12 +221,22 @@ class DeviceAddrsBox:
         self.ldAddrBox.insert(0, self.deviceAddrs.ldAddr)
         self.ldAddrBox.config(state = 'disabled')
         
+        # Label for OSA address
+        osaAddrLabel = tk.Label(self.master, text = "OSA Addr:", font = ('Ariel 12'))
+        osaAddrLabel.grid(row = 4, column = 0, sticky = "w")
+        
+        # Entry box for OSA address
+        self.osaAddrBox = tk.Entry(self.master, font = ('Ariel 12'))
+        self.osaAddrBox.grid(row = 4, column = 1, columnspan = 1, sticky = "EW", padx = (0,5))
+        self.osaAddrBox.insert(0, self.deviceAddrs.osaAddr)
+        self.osaAddrBox.config(state = 'disabled')
+        
         pass
 
 """ Class for controlling device settings """
 class MeasurementSettings:
     # Config File
-    cfgfile = r'measurement_settings.cfg'
+    cfgfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'measurement_settings.cfg')
     
     # Measurement settings
     current = 3.3
@@ -151,6 +244,20 @@ class MeasurementSettings:
     intigrationTime = 30000
     dwellTime = 5
     coolDownTime = 5
+    adaptiveDwell = False
+    steadyDrift = 0.002
+    steadyWindow = 1.0
+    adaptiveCooldown = False
+    cooldownBand = 0.5
+    cooldownSlope = 0.01
+    cooldownWindow = 10.0
+    cooldownMaxTime = 60.0
+    framesAveraged = 1
+    darkFrames = 0
+    darkMaxAge = 600.0
+    autoRange = False
+    telemetryRate = 0.0
+    writeDatabase = True
     savePath = r'P:/AI Production Data/SETS/sets/testdata'
     
     def loadConfig(self):
@@ -169,6 +276,20 @@ class MeasurementSettings:
         self.intigrationTime    = int(self.config['MEASUREMENT SETTINGS']['OSA_Integration_Time'])
         self.dwellTime          = float(self.config['MEASUREMENT SETTINGS']['Laser_Dwell_Time'])
         self.coolDownTime       = float(self.config['MEASUREMENT SETTINGS']['Cooldown_Time'])
+        self.adaptiveDwell      = self.config.getboolean('MEASUREMENT SETTINGS', 'Adaptive_Dwell', fallback = self.adaptiveDwell)
+        self.steadyDrift        = self.config.getfloat('MEASUREMENT SETTINGS', 'Steady_State_Drift', fallback = self.steadyDrift)
+        self.steadyWindow       = self.config.getfloat('MEASUREMENT SETTINGS', 'Steady_State_Window', fallback = self.steadyWindow)
+        self.adaptiveCooldown   = self.config.getboolean('MEASUREMENT SETTINGS', 'Adaptive_Cooldown', fallback = self.adaptiveCooldown)
+        self.cooldownBand       = self.config.getfloat('MEASUREMENT SETTINGS', 'Cooldown_Band', fallback = self.cooldownBand)
+        self.cooldownSlope      = self.config.getfloat('MEASUREMENT SETTINGS', 'Cooldown_Slope', fallback = self.cooldownSlope)
+        self.cooldownWindow     = self.config.getfloat('MEASUREMENT SETTINGS', 'Cooldown_Window', fallback = self.cooldownWindow)
+        self.cooldownMaxTime    = self.config.getfloat('MEASUREMENT SETTINGS', 'Cooldown_Max_Time', fallback = self.cooldownMaxTime)
+        self.framesAveraged     = self.config.getint('MEASUREMENT SETTINGS', 'Frames_Averaged', fallback = self.framesAveraged)
+        self.darkFrames         = self.config.getint('MEASUREMENT SETTINGS', 'Dark_Frames', fallback = self.darkFrames)
+        self.darkMaxAge         = self.config.getfloat('MEASUREMENT SETTINGS', 'Dark_Max_Age', fallback = self.darkMaxAge)
+        self.autoRange          = self.config.getboolean('MEASUREMENT SETTINGS', 'Auto_Range', fallback = self.autoRange)
+        self.telemetryRate      = self.config.getfloat('MEASUREMENT SETTINGS', 'Telemetry_Rate', fallback = self.telemetryRate)
+        self.writeDatabase      = self.config.getboolean('MEASUREMENT SETTINGS', 'Write_Database', fallback = self.writeDatabase)
         dc                      = self.config['MEASUREMENT SETTINGS']['Duty_Cycles']
         self.dutyCycles         = np.array(dc.split(","), dtype = int)
         self.savePath           = self.config['MEASUREMENT SETTINGS']['Save_Folder']
@@ -184,7 +305,21 @@ class MeasurementSettings:
         self.config.set('MEASUREMENT SETTINGS', 'OSA_Integration_Time', str(self.intigrationTime))
         self.config.set('MEASUREMENT SETTINGS', 'Laser_Dwell_Time', str(self.dwellTime))
         self.config.set('MEASUREMENT SETTINGS', 'Cooldown_Time', str(self.coolDownTime))
-        dc = ','.join(self.dutyCycles)
+        self.config.set('MEASUREMENT SETTINGS', 'Adaptive_Dwell', str(self.adaptiveDwell))
+        self.config.set('MEASUREMENT SETTINGS', 'Steady_State_Drift', str(self.steadyDrift))
+        self.config.set('MEASUREMENT SETTINGS', 'Steady_State_Window', str(self.steadyWindow))
+        self.config.set('MEASUREMENT SETTINGS', 'Adaptive_Cooldown', str(self.adaptiveCooldown))
+        self.config.set('MEASUREMENT SETTINGS', 'Cooldown_Band', str(self.cooldownBand))
+        self.config.set('MEASUREMENT SETTINGS', 'Cooldown_Slope', str(self.cooldownSlope))
+        self.config.set('MEASUREMENT SETTINGS', 'Cooldown_Window', str(self.cooldownWindow))
+        self.config.set('MEASUREMENT SETTINGS', 'Cooldown_Max_Time', str(self.cooldownMaxTime))
+        self.config.set('MEASUREMENT SETTINGS', 'Frames_Averaged', str(self.framesAveraged))
+        self.config.set('MEASUREMENT SETTINGS', 'Dark_Frames', str(self.darkFrames))
+        self.config.set('MEASUREMENT SETTINGS', 'Dark_Max_Age', str(self.darkMaxAge))
+        self.config.set('MEASUREMENT SETTINGS', 'Auto_Range', str(self.autoRange))
+        self.config.set('MEASUREMENT SETTINGS', 'Telemetry_Rate', str(self.telemetryRate))
+        self.config.set('MEASUREMENT SETTINGS', 'Write_Database', str(self.writeDatabase))
+        dc = ','.join(str(dc) for dc in self.dutyCycles)
         self.config.set('MEASUREMENT SETTINGS', 'Duty_Cycles', str(dc))
         self.config.set('MEASUREMENT SETTINGS', 'Save_Folder', self.savePath)
         
@@ -273,11 +408,17 @@ The device manager class handles connecting and closing all devices used
 in the station!
 """
 class DeviceManager:
-    def __init__(self):
+    def __init__(self, measurementSettings = None):
+        # Settings used when connecting
+        self.measurementSettings = measurementSettings
+        
         self.osa = None
         # self.osa.connect(integration_time = 1500)
         self.osaConnect = False
         
+        # Background acquisition, the only reader of the OSA once connected
+        self.acquisition = None
+        
         self.ld = None
         self.ldConnect = False
         
@@ -287,108 +428,255 @@ class DeviceManager:
         self.purge = None
         self.purgeConnect = False
         
+        # Device addresses from the config file, the defaults if it cannot be read
         self.addrs = DeviceAddrs()
+        try:
+            self.addrs.loadConfig()
+        except Exception as e:
+            print("...Using default device addresses: {}".format(e))
     
-    def connectDevices(self):
+    def connectDevices(self, callback = None):
         """
-        Method to connect all devices
-        """            
-        # Try to connect to the OSA
-        print("Trying to connect to the OSA...")
-        if(self.osaConnect == False):
-            try:
-                self.osa = spectrum_analyzer.SpectrumAnalyzer() # Create OSA object
-                self.osa.connect(integration_time = 1500)       # Connect OSA object to OSA
-                self.osaConnect = True
-                print("...OSA connection established!5243424")
-                
-            except:
-                self.osaConnect = False
-                print("...OSA connection failed :(")
+        Method to connect all devices, every device that is not connected yet
+        is connected at the same time on its own thread.
+
+        Parameters
+        ----------
+        callback : function, optional
+            called as callback(name, connected) as soon as each device
+            connects or fails, name is "osa", "relay", "purge" or "ld".
+            Called from a worker thread. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        connectors = {"osa" : self.connectOsa,
+                      "relay" : self.connectRelay,
+                      "purge" : self.connectPurge,
+                      "ld" : self.connectLaserDriver}
+        pending = [name for name in connectors if getattr(self, name + "Connect") == False]
+        if(len(pending) == 0):
+            return
         
-        # Try to connect to the relay controller
-        print("Trying to connect to the Relay Control...")
-        if(self.relayConnect == False):
-            try:
-                self.relay = relay_control.Relay(self.addrs.relayAddr) # Create OSA object
-                self.relayConnect = True
-                print("...Relay connection established!")
-                
-            except:
-                self.relayConnect = False
-                print("...Relay connection failed :(")
+        pool = ThreadPoolExecutor(max_workers = len(pending))
+        futures = {pool.submit(self.tryConnect, name, connectors[name]) : name for name in pending}
         
-        # Try to connect to the relay controller
-        print("Trying to connect to the purge system...")
-        if(self.purgeConnect == False):
-            try:
-                self.purge = relay_control(self.addrs.purgeAddr) # Create OSA object
-                self.purgeConnect = True
-                print("...Purge system connection established!")
-                
-            except:
-                self.purgeConnect = False
-                print("...Purge system connection failed :(")
+        try:
+            # ACCEPT EACH DEVICE AS SOON AS IT RESOLVES
+            for future in as_completed(futures, timeout = CONNECT_TIMEOUT):
+                name = futures.pop(future)
+                device = future.result()
+                self.acceptDevice(name, device)
+                if(callback != None):
+                    callback(name, device != None)
+        
+        except FutureTimeout:
+            # GIVE UP ON THE SLOW DEVICES, CLOSE THEM IF THEY CONNECT LATER
+            for future, name in futures.items():
+                print("...{} connection timed out :(".format(name))
+                future.add_done_callback(self.discardDevice)
+                if(callback != None):
+                    callback(name, False)
+        
+        finally:
+            pool.shutdown(wait = False)
         
-        # Try to connect to the laser drivers
-        print("Trying to connect to the Laser Driver...")
-        if(self.ldConnect == False):
+        return
+    
+    def tryConnect(self, name, connect):
+        """
+        Connect a device, retrying if it fails.
+
+        Parameters
+        ----------
+        name : str
+            device name for messages.
+        connect : function
+            connects the device and returns it.
+
+        Returns
+        -------
+        object
+            the device, None if every attempt failed.
+
+        """
+        for attempt in range(1, CONNECT_ATTEMPTS + 1):
+            print("Trying to connect to {} ({}/{})...".format(name, attempt, CONNECT_ATTEMPTS))
             try:
-                self.ld = laser_driver.CurrentSupply(self.addrs.ldAddr)
-                self.ldConnect = True
-                self.ld.setPresets()
-                print("...Connection to laser driver established!")
+                device = connect()
+                print("...{} connection established!".format(name))
+                return device
+            
+            except Exception as e:
+                print("...{} connection failed :( {}".format(name, e))
+        
+        return None
+    
+    def acceptDevice(self, name, device):
+        """
+        Store a connected device.
 
-                
-            except:
-                self.ldConnect = False
-                print("...Laser driver connection failed :(")
+        Parameters
+        ----------
+        name : str
+            device name, "osa", "relay", "purge" or "ld".
+        device : object
+            the device, None if it failed to connect.
+
+        Returns
+        -------
+        None.
+
+        """
+        # Each instrument gets its own I/O thread, the acquisition owns the OSA
+        if(name in ("relay", "purge", "ld") and device != None):
+            device = device_worker.DeviceProxy(device, name)
+        
+        setattr(self, name, device)
+        setattr(self, name + "Connect", device != None)
+        
+        # Start reading spectra, the acquisition is the only reader of the OSA
+        if(name == "osa" and device != None):
+            self.acquisition = acquisition.SpectrumAcquisition(device)
+            self.acquisition.start()
+        
+        # Simulated devices see each other
+        if(device != None):
+            self.linkSimulation()
         
         return
     
-    def closeDevices(self):
+    def linkSimulation(self):
         """
-        Method to close all devices
+        Connect the simulated devices to each other. A simulated OSA sees
+        the output of a simulated laser driver on the emitter an emulated
+        relay lets light, and the laser heats the cold plate of an emulated purge
+        system.
+
+        Returns
+        -------
+        None.
+
         """
-        # Close the laser drivers
-        if(self.ldConnect == True):
-            print("Trying to close laser driver")
-            
-            try:
-                self.ld.set_current(0)
-                self.ld.disable_output()
-                self.ld.close()
-                self.ldConnect = False
-                print("...Laser driver closed!")
-                
-            except:
-                print("...Laser driver failed to close :(")
+        spec = self.osa.spec if self.osaConnect else None
+        itc = self.ld.itc.inst if self.ldConnect else None
+        relay = self.relay.emulator if self.relayConnect else None
+        purge = self.purge.emulator if self.purgeConnect else None
+        if(isinstance(itc, laser_driver_sim.SimulatedITC4005) == False):
+            itc = None
+        
+        if(isinstance(spec, spectrum_analyzer_sim.SimulatedHR4000)):
+            if(itc != None):
+                spec.laser = itc
+                spec.v0 = itc.v0
+                spec.resistance = itc.resistance
+            if(relay != None):
+                spec.relay = relay
+        
+        if(purge != None and itc != None):
+            purge.laser = itc
+        
+        return
+    
+    def discardDevice(self, future):
+        """
+        Close a device that connected after its timeout.
 
-        # Close the relay
-        if(self.relayConnect == True):
-            print("Trying to close relay...")
+        Parameters
+        ----------
+        future : Future
+            finished tryConnect call.
+
+        Returns
+        -------
+        None.
+
+        """
+        device = future.result()
+        if(device != None):
             try:
-                self.relay.close()
-                self.relayConnect = False
-                print("...Relay closed!")
-            except:
-                print("...Failed to close relay :(")
+                device.close()
+            except Exception as e:
+                print(e)
         
-        # Close the powermeter
-        if(self.purgeConnect == True):
-            print("Trying to close purge system")
-            try:
-                self.purge.close()
-                self.purgeConnect = False
-                print("...Purge system closed!")
-                
-            except:
-                print("...Failed to close purge system :(")
+        return
+    
+    def connectOsa(self):
+        """
+        Connect the OSA.
+
+        Returns
+        -------
+        SpectrumAnalyzer
+            connected OSA.
+
+        """
+        osa = spectrum_analyzer.SpectrumAnalyzer() # Create OSA object
+        integrationTime = 1500 if self.measurementSettings == None else self.measurementSettings.intigrationTime
+        osa.connect(integration_time = integrationTime, address = self.addrs.osaAddr, simulation = self.addrs.getOsaSimulation()) # Connect OSA object to OSA
+        
+        return osa
+    
+    def connectRelay(self):
+        """
+        Connect the relay controller.
+
+        Returns
+        -------
+        Relay
+            connected relay controller.
+
+        """
+        return relay_control.Relay(self.addrs.relayAddr)
+    
+    def connectPurge(self):
+        """
+        Connect the purge system.
+
+        Returns
+        -------
+        MuController
+            connected purge system.
+
+        """
+        return purge_system.MuController(self.addrs.purgeAddr)
+    
+    def connectLaserDriver(self):
+        """
+        Connect the laser driver and load its presets.
+
+        Returns
+        -------
+        CurrentSupply
+            connected laser driver.
+
+        """
+        ld = laser_driver.CurrentSupply(self.addrs.ldAddr, simulation = self.addrs.getSimulation())
+        try:
+            ld.setPresets()
+        except:
+            ld.close()
+            raise
+        
+        return ld
+    
+    def closeDevices(self):
+        """
+        Method to close all devices
+        """
+        # Close the laser driver, relay and purge system at the same time
+        names = [name for name in ("ld", "relay", "purge") if getattr(self, name + "Connect") == True]
+        if(len(names) > 0):
+            with ThreadPoolExecutor(max_workers = len(names)) as pool:
+                list(pool.map(self.closeDevice, names))
         
         # Close the OSA
         if(self.osaConnect == True):
             print("Trying to close the OSA...")
             try:
+                self.acquisition.stop()
                 self.osa.close()
                 self.osaConnect = False
                 print("...OSA closed!")
@@ -398,6 +686,37 @@ class DeviceManager:
         
         return
     
+    def closeDevice(self, name):
+        """
+        Close a laser driver, relay or purge system and stop its worker.
+
+        Parameters
+        ----------
+        name : str
+            device name, "ld", "relay" or "purge".
+
+        Returns
+        -------
+        None.
+
+        """
+        print("Trying to close {}...".format(name))
+        try:
+            device = getattr(self, name)
+            
+            # Turn the current down before the laser driver switches off
+            if(name == "ld"):
+                device.setCurrent(0)
+            
+            device.close()
+            setattr(self, name + "Connect", False)
+            print("...{} closed!".format(name))
+            
+        except Exception as e:
+            print("...{} failed to close :( {}".format(name, e))
+        
+        return
+    
     def allConnected(self):
         """
         Method used to verify that all devices are connected
@@ -436,6 +755,9 @@ class DeviceManagerBox:
     
         # Generate str list for all devices
         self.devicesStr = ['Relay Controller', 'OSA', 'Laser Driver', 'Purge System']
+        
+        # Label of each device in the device manager
+        self.labelIndex = {"relay" : 0, "osa" : 1, "ld" : 2, "purge" : 3}
     
         # Labels for device connection status
         self.deviceLabels = []
@@ -456,49 +778,89 @@ class DeviceManagerBox:
     
     def connect(self):
         """
-        Method to connect all devices
+        Method to connect all devices, the devices connect on a background
+        thread and each label is updated as soon as its device resolves
         """
-        # Color to indicate connected device
-        bg = '#84e47e'
-        
-        # Call device manager to open all devices
-        self.deviceManager.connectDevices()
-        
-        # Allow the disconnect button to be pressed
-        self.disconnectButton.configure(state = 'normal')
+        # Color to indicate a device still connecting
+        bg = '#f5d76e'
         
         # ['Relay Controller', 'OSA', 'Laser Driver', 'Purge System']
+        for name, i in self.labelIndex.items():
+            if(getattr(self.deviceManager, name + "Connect") == False):
+                self.deviceLabels[i].configure(bg = bg)
         
-        # Report if relay has been connected in GUI
-        if(self.deviceManager.relayConnect == True):
-            self.deviceLabels[0].configure(bg = bg)
+        # No second connect or a disconnect until every device has resolved
+        self.connectButton.configure(state = 'disabled')
+        self.disconnectButton.configure(state = 'disabled')
         
-        # Report if osa has been connected in GUI
-        if(self.deviceManager.osaConnect == True):
-            self.deviceLabels[1].configure(bg = bg)
+        # Call device manager to open all devices, results come back on the queue
+        results = queue.Queue()
+        def run():
+            try:
+                self.deviceManager.connectDevices(callback = lambda name, connected: results.put((name, connected)))
+            finally:
+                results.put((None, None))
+        threading.Thread(target = run, daemon = True).start()
         
-        # Report if laser driver has been connected in GUI
-        if(self.deviceManager.ldConnect == True):
-            self.deviceLabels[2].configure(bg = bg)
+        self.master.after(100, self.pollConnect, results)
+        
+        return
+    
+    def pollConnect(self, results):
+        """
+        Report connection results in the GUI, runs on the GUI thread
+        """
+        while(True):
+            try:
+                name, connected = results.get_nowait()
+            except queue.Empty:
+                break
             
-        # Report if purge system has been connected in GUI
-        if(self.deviceManager.purgeConnect == True):
-            self.deviceLabels[3].configure(bg = bg) 
+            # Every device has resolved
+            if(name == None):
+                self.connectButton.configure(state = 'normal')
+                self.disconnectButton.configure(state = 'normal')
+                return
             
+            # Green if connected, red if not
+            self.deviceLabels[self.labelIndex[name]].configure(bg = '#84e47e' if connected else '#F55e65')
+        
+        self.master.after(100, self.pollConnect, results)
+        
         return
 
     def disconnect(self):
         """
         Method to disconnect all devices
         """
+        # No connect or second disconnect until every device has closed
+        self.connectButton.configure(state = 'disabled')
+        self.disconnectButton.configure(state = 'disabled')
+        
+        # Call device manager to close all devices on a background thread
+        thread = threading.Thread(target = self.deviceManager.closeDevices, daemon = True)
+        thread.start()
+        
+        self.master.after(100, self.pollDisconnect, thread)
+        
+        return
+    
+    def pollDisconnect(self, thread):
+        """
+        Report the closed devices in the GUI once the disconnect finishes,
+        runs on the GUI thread
+        """
+        if(thread.is_alive()):
+            self.master.after(100, self.pollDisconnect, thread)
+            return
+        
         # Color to indicate disconnected device
         bg = '#F55e65'
         
-        # Call device manager to close all devices
-        self.deviceManager.closeDevices()
-        
-        # Allow the disconnect button to be pressed
-        self.disconnectButton.configure(state = 'disabled')
+        # Allow the connect button to be pressed, and disconnect again if a device failed to close
+        self.connectButton.configure(state = 'normal')
+        if(any(getattr(self.deviceManager, name + "Connect") for name in self.labelIndex)):
+            self.disconnectButton.configure(state = 'normal')
         
         # Report if relay has been disconnected in GUI
         if(self.deviceManager.relayConnect == False):
@@ -561,7 +923,7 @@ class SpecWindow:
         self.stopButton.grid(row = 0, column = 2, sticky = "EW")
         
         # Create a figure
-        self.fig = Figure(figsize = (5, 5), dpi = 100)
+        self.fig = mplfigure.Figure(figsize = (5, 5), dpi = 100)
         
         # Create a plot
         self.plot1 = self.fig.add_subplot(111)
@@ -573,7 +935,7 @@ class SpecWindow:
         self.plot1.set_xlabel("Wavelength (nm)", fontsize = 15)
         
         # Create the canvas and insert the figure into it
-        self.canvas = FigureCanvasTkAgg(self.fig, master = self.specPlot)
+        self.canvas = backend_tkagg.FigureCanvasTkAgg(self.fig, master = self.specPlot)
         self.canvas.draw()
         self.canvas.get_tk_widget().pack()
         
@@ -594,11 +956,9 @@ class SpecWindow:
         # CLEAR PLOT
         self.plot1.clear()
         
-        # Measure the spectrum
-        self.dm.osa.measureSpectrum()
-        
-        # Take a single measurement
-        x, y = self.dm.osa.getData()
+        # Wait for the next new spectrum
+        info, y = self.dm.acquisition.waitForFrame(timeout = 5)
+        x = self.dm.acquisition.wavelengths
         
         # Plot the spetrometer data
         self.plot1.plot(x, y)
@@ -672,7 +1032,6 @@ class SpecWindow:
         """
         while(self.event.is_set() == False):
             self.measureAndPlot()
-            time.sleep(0.01)
             
         self.running = False
         
@@ -731,11 +1090,18 @@ class Application:
         # Create thread manager object 
         self.threadManager = ThreadManager()
         
+        # Create measurement settings object, the defaults if the config file cannot be read
+        self.measurementSettings = MeasurementSettings()
+        try:
+            self.measurementSettings.loadConfig()
+        except Exception as e:
+            print("...Using default measurement settings: {}".format(e))
+        
         # Create device manager object
-        self.deviceManager = DeviceManager()
+        self.deviceManager = DeviceManager(self.measurementSettings)
         
-        # Create measurement settings object
-        self.measurementSettings = MeasurementSettings()
+        # Create cache for analysis results
+        self.analysisCache = analysis_cache.AnalysisCache()
         
         # DEFINE TABS UNDER PARENT
         self.runframe = tk.Frame(self.tab_parent)
@@ -1134,10 +1500,15 @@ class Application:
         
         return
     
-    def load_dt(self): #, datapath, emitter):
+    def load_dt(self, emitter = 1): #, datapath, emitter):
         """
         Find the dT of a single measurement
 
+        Parameters
+        ----------
+        emitter : int, optional
+            emitter number. The default is 1.
+
         Returns
         -------
         None.
@@ -1146,15 +1517,36 @@ class Application:
         
         # GET FOLDER NAME
         datapath = self.entry.get()        
+        runfile = os.path.join(datapath, spectrum_files.RUNFILE)
         
-        emitter = "emitter-1"
         """ Generate emitter data object """
         # CREATE EMITTER DATA OBJECTS
         EM = da.emitterData()
         
         # LOAD EMITTER DATA INTO OBJECT
-        EM.loadFolder(datapath+"\\"+emitter)
+        if(os.path.exists(runfile)):
+            EM.loadRunFile(runfile, emitter)
+        else:
+            EM.loadFolder(datapath+"\\"+"emitter-{}".format(emitter), cache = self.analysisCache)
+        
+        self.print_dt(EM)
         
+        return
+    
+    def print_dt(self, EM):
+        """
+        Print the dT of an emitter
+
+        Parameters
+        ----------
+        EM : emitterData
+            emitter data object.
+
+        Returns
+        -------
+        None.
+
+        """
         """ Report data calcs """            
         # REPORT DT DATA
         try:
@@ -1218,15 +1610,33 @@ class Application:
         kurtFigure = None
         kurtPlot = None
         
+        # ANALYZE THE WHOLE HEXEL AT ONCE
+        runfile = os.path.join(datapath, spectrum_files.RUNFILE)
+        HX = da.hexelData()
+        try:
+            if(os.path.exists(runfile)):
+                HX.loadRunFile(runfile)
+                emitters = HX.titles
+            else:
+                HX.loadFolder(datapath, emitters, cache = self.analysisCache)
+        except (ValueError, FileNotFoundError) as ex:
+            self.mprint("...{}".format(ex))
+            HX = None
+        
         # OPEN EMITTER DATA FOLDERS
         for i in range(0,len(emitters)):
             
             """ Generate emitter data object """
-            # CREATE EMITTER DATA OBJECTS
-            EM = da.emitterData()
+            if(HX != None):
+                # GET EMITTER DATA OBJECT FROM THE HEXEL ANALYSIS
+                EM = HX.getEmitter(i)
             
-            # LOAD EMITTER DATA INTO OBJECT
-            EM.loadFolder(datapath+"\\"+emitters[i])
+            else:
+                # CREATE EMITTER DATA OBJECTS
+                EM = da.emitterData()
+                
+                # LOAD EMITTER DATA INTO OBJECT
+                EM.loadFolder(datapath+"\\"+emitters[i], cache = self.analysisCache)
             
             """ Generate raw intensity plots """
             # GENERATE FIGURES AND PLOTS
@@ -1294,14 +1704,14 @@ class Application:
 
         """
         # GENERATE AND INSERT CANVAS
-        canvas = FigureCanvasTkAgg(fig, master = frame)  
+        canvas = backend_tkagg.FigureCanvasTkAgg(fig, master = frame)  
         canvas.get_tk_widget().grid(row=0, column=0, ipadx=40, ipady=20, sticky = "ewns")
         canvas.draw()
             
         # GENERATE AND INSERT TOOLBAR
         toolbarFrame = tk.Frame(frame)
         toolbarFrame.grid(row=1, column=0, sticky = "w", padx = 40)
-        toolbar = NavigationToolbar2Tk(canvas, toolbarFrame)
+        toolbar = backend_tkagg.NavigationToolbar2Tk(canvas, toolbarFrame)
 
         # CLOSE FIGURE (TO PREVENT MEMORY LEAKS)
         plt.close(fig)
@@ -1349,7 +1759,7 @@ class Application:
         plot1.set_ylim([0.0, 16000.0])
         
         # GENERATE CANVAS OBJECT
-        canvas = FigureCanvasTkAgg(fig, master = frame)  
+        canvas = backend_tkagg.FigureCanvasTkAgg(fig, master = frame)  
         canvas.get_tk_widget().grid(row=1, column=0, ipadx=60, ipady=20)
         canvas.draw()
 
@@ -1444,6 +1854,199 @@ class Application:
         self.mprint("")
                 
         return
+    
+    def dwell(self, dc):
+        """
+        Wait for the emitter to reach steady state at a duty cycle.
+        
+        With adaptive dwell on, spectra are analyzed as they arrive and the
+        wait ends once the weighted mean drifts less than the steady state
+        limit over the steady state window. The dwell time is the longest
+        the wait can take.
+
+        Parameters
+        ----------
+        dc : int
+            duty cycle being measured.
+
+        Returns
+        -------
+        elapsed : float
+            time waited in seconds.
+        steady : bool
+            True if steady state was detected before the dwell time ran out.
+
+        """
+        settings = self.measurementSettings
+        if(settings.adaptiveDwell == False):
+            self.sleep(settings.dwellTime)
+            return settings.dwellTime, False
+        
+        ACQ = self.deviceManager.acquisition
+        detector = da.steadyStateDetector(window = settings.steadyWindow, drift = settings.steadyDrift)
+        start = time.time()
+        sequence = None
+        elapsed = 0.0
+        
+        # ANALYZE EVERY SPECTRUM STARTED DURING THE DWELL
+        while(elapsed < settings.dwellTime):
+            
+            # CHECK IF STOP BUTTON HAS BEEN PRESSED
+            if(self.running == False):
+                raise ProgramReset()
+            
+            if(sequence == None):
+                frame, y = ACQ.waitForFrame(after = start, timeout = 5)
+            else:
+                frame, y = ACQ.waitForFrame(sequence = sequence, timeout = 5)
+            sequence = frame["sequence"]
+            elapsed = float(frame["tEnd"] - start)
+            
+            # TRACK THE WEIGHTED MEAN
+            DC = da.dutyCycleData(dutyCycle = dc, x = ACQ.wavelengths, y = y)
+            if(DC.reliable and detector.add(0.5 * (frame["tStart"] + frame["tEnd"]) - start, DC.wMean)):
+                return elapsed, True
+        
+        return elapsed, False
+    
+    def take_spectrum(self, averager, frames, after, integrationTime):
+        """
+        Take the spectrum for a duty cycle from the acquisition.
+
+        Parameters
+        ----------
+        averager : FrameAverager
+            averager for the frames.
+        frames : int
+            number of frames to average.
+        after : float
+            time.time() the laser reached the setting being measured, the
+            newest frames started after it are averaged. A single frame is
+            the first one started from now on.
+        integrationTime : int
+            integration time in micro-seconds the frames must have.
+
+        Returns
+        -------
+        frame : numpy record
+            frame information.
+        y : numpy array
+            intensities.
+        noise : numpy array
+            per-pixel noise, None for a single frame.
+
+        """
+        ACQ = self.deviceManager.acquisition
+        timeout = 5 + 2 * frames * integrationTime * 1e-6
+        
+        # THE AVERAGE OF THE LAST FRAMES OR THE FIRST ONE FROM NOW ON
+        if(frames > 1):
+            frame = ACQ.averageFrames(averager, frames, after = after, integrationTime = integrationTime, timeout = timeout)
+            return frame, averager.getMean(), averager.getNoise()
+        
+        frame, y = ACQ.waitForFrame(after = max(after, time.time()), integrationTime = integrationTime, timeout = timeout)
+        
+        return frame, y, None
+    
+    def take_darks(self, darks, averager, runFile, emitter, steps, after, telemetry = None):
+        """
+        Take a dark spectrum at each integration time with the laser off
+        and save them to the run file. The current integration time goes
+        first so the frames taken since the laser was turned off are used,
+        and is set again at the end.
+
+        Parameters
+        ----------
+        darks : acquisition.DarkFrameManager
+            dark spectra of the run.
+        averager : FrameAverager
+            averager for the frames.
+        runFile : spectrum_files.RunFile
+            run file to save the dark spectra to.
+        emitter : int
+            emitter number the dark spectra are saved under.
+        steps : set
+            integration times in micro-seconds.
+        after : float
+            time.time() the laser was turned off.
+        telemetry : laser_driver.TelemetryPoller, optional
+            laser driver telemetry to save with the dark spectra. The
+            default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        ACQ = self.deviceManager.acquisition
+        count = self.measurementSettings.darkFrames
+        start = ACQ.integrationTime
+        
+        for step in sorted(steps, key = lambda step: step != start):
+            if(step != ACQ.integrationTime):
+                ACQ.setIntegrationTime(step)
+            timeout = 5 + 2 * count * step * 1e-6
+            frame, dark = darks.capture(ACQ, averager, count, after = after, integrationTime = step, timeout = timeout)
+            runFile.append(emitter, 0, dark, integrationTime = frame["integrationTime"], tStart = frame["tStart"], tEnd = frame["tEnd"], flags = spectrum_files.FLAG_DARK,
+                           telemetry = None if telemetry == None else telemetry.getWindow(frame["tStart"], frame["tEnd"]))
+        
+        if(ACQ.integrationTime != start):
+            ACQ.setIntegrationTime(start)
+        
+        return
+    
+    def cooldown(self, controller = None, start = None):
+        """
+        Wait for the cold plate to cool down before the next emitter.
+        
+        With a cooldown controller the wait ends once the temperature is
+        back near its baseline or has stopped falling, up to the cooldown
+        max time. Without one, or without telemetry, the fixed cooldown
+        time is used.
+
+        Parameters
+        ----------
+        controller : purge_system.CooldownController, optional
+            controller with its baseline set. The default is None.
+        start : float, optional
+            time.time() the laser was turned off, the time since counts
+            toward the cooldown. The default is now.
+
+        Returns
+        -------
+        elapsed : float
+            time waited in seconds.
+        reason : str
+            "band" or "flat" if the controller ended the wait, "fixed" if
+            the fixed time was used and "limit" if the max time ran out.
+
+        """
+        settings = self.measurementSettings
+        if(start == None):
+            start = time.time()
+        if(controller == None or controller.baseline == None or controller.mu.getTemperature() == None):
+            self.sleep(max(0, settings.coolDownTime - (time.time() - start)))
+            return time.time() - start, "fixed"
+        
+        while(time.time() - start < settings.cooldownMaxTime):
+            
+            # CHECK IF STOP BUTTON HAS BEEN PRESSED
+            if(self.running == False):
+                raise ProgramReset()
+            
+            reason = controller.check()
+            if(reason != None):
+                return time.time() - start, reason
+            
+            # FALL BACK TO THE FIXED TIME IF THE TELEMETRY STOPS
+            if(controller.mu.getTemperature() == None):
+                self.mprint(".........Lost purge system telemetry.")
+                self.sleep(max(0, settings.coolDownTime - (time.time() - start)))
+                return time.time() - start, "fixed"
+            
+            time.sleep(0.5)
+        
+        return time.time() - start, "limit"
         
 
     
@@ -1481,11 +2084,11 @@ class Application:
             return
         
         # CHECK IF ENTRY SETTINGS ARE VALID
-        current = self.measurementSettings.current
-        if(current.replace('.','',1).isdigit() == False):
+        try:
+            currentnum = float(self.measurementSettings.current)
+        except ValueError:
             self.mprint("ERROR:\n...Invalid current input.")
             return
-        currentnum = float(current)
         if(currentnum > 3.5):
             self.mprint("ERROR:\n...Current exceeds maximum value.")
             return
@@ -1577,6 +2180,9 @@ class Application:
         
         self.emitters = [0, 1, 2, 3, 4, 5]
         
+        # LASER DRIVER TELEMETRY, STARTED AFTER THE PRESETS IF ENABLED
+        telemetry = None
+        
         try:
                         
             # GET HEXEL TITLE
@@ -1591,24 +2197,26 @@ class Application:
                     return
             
             # Set Ocean Optics HR4000 integration time in micro seconds
-            self.mprint("...OSA integration time set to {} us.".format(self.measurementSettings.integrationTime))
+            self.mprint("...OSA integration time set to {} us.".format(self.measurementSettings.intigrationTime))
             
             # Sleep Time - Set time to reach steady state in seconds   
             self.mprint("...Emitter dwell time set to {} s.".format(self.measurementSettings.dwellTime))
+            if(self.measurementSettings.adaptiveDwell):
+                self.mprint("...Dwell ends early below {} nm/s drift over {} s.".format(self.measurementSettings.steadyDrift, self.measurementSettings.steadyWindow))
             
             # Sleep Time between switching emitters
             self.mprint("...Cooldown time set to {} s.".format(self.measurementSettings.coolDownTime))
             
             # DUTY CYCLES TO MEASURE
             self.mprint("...Duty cycles to measure:")
-            for dutycycle in self.measurementSettings.dutycycles:
+            for dutycycle in self.measurementSettings.dutyCycles:
                 self.mprint("......{}".format(dutycycle))
 
             # Generate save folder
             testdata_path = os.path.abspath(self.measurementSettings.savePath)
             strtime = time.strftime("%Y%m%d-%H%M%S")  
             datafolder = "Hexel"+titlemod+"-"+strtime
-            folder = "\\".join([testdata_path,datafolder])
+            folder = os.path.join(testdata_path,datafolder)
             
             # Insert folder name into load measurement entry box
             self.entry.delete(0,"end")
@@ -1616,7 +2224,7 @@ class Application:
             
             # PRINT SAVE LOCATION
             self.mprint("...Data save location:")
-            for s in folder.split("\\"):
+            for s in folder.split(os.sep):
                 self.mprint("......{}/".format(s))
 
             # CHECK DEVICE COMMUNICATION
@@ -1641,10 +2249,15 @@ class Application:
             
             # SET PRESETS FOR LASER DRIVER
             self.mprint("......Setting device presets.")
-            current = float(self.centry.get())
+            current = float(self.measurementSettings.current)
             self.mprint("......Current set to {} A.".format(current))
             CS.setPresets(current = current)
             
+            # SAMPLE THE DRIVE CONDITIONS IN THE BACKGROUND TO TAG EACH SPECTRUM
+            if(self.measurementSettings.telemetryRate > 0):
+                telemetry = laser_driver.TelemetryPoller(CS, rate = self.measurementSettings.telemetryRate)
+                telemetry.start()
+            
             ###################### CHECK NI USB6001 ##########################
             self.mprint("...NI USB-6001")
             try:
@@ -1660,12 +2273,50 @@ class Application:
             try:
                 # SA = sa.SpectrumAnalyzer(integration_time = integrationTime, serialnum = hr4000serial)
                 SA = self.deviceManager.osa
+                ACQ = self.deviceManager.acquisition
+                if(ACQ.isRunning() == False):
+                    raise RuntimeError()
             except:
                 self.mprint("ERROR:\n...Failed to connect to spectrum analyzer.")
                 return
             
             self.mprint("......Connection established.")
             
+            # CREATE THE RUN FILE, WAVELENGTHS AND SETTINGS ARE STORED ONCE
+            metadata = {"hexel" : titlemod,
+                        "started" : strtime,
+                        "current" : current,
+                        "spectrometer" : SA.serial,
+                        "integrationTime" : SA.integration_time,
+                        "dwellTime" : self.measurementSettings.dwellTime,
+                        "coolDownTime" : self.measurementSettings.coolDownTime,
+                        "adaptiveDwell" : self.measurementSettings.adaptiveDwell,
+                        "steadyDrift" : self.measurementSettings.steadyDrift,
+                        "steadyWindow" : self.measurementSettings.steadyWindow,
+                        "adaptiveCooldown" : self.measurementSettings.adaptiveCooldown,
+                        "framesAveraged" : self.measurementSettings.framesAveraged,
+                        "darkFrames" : self.measurementSettings.darkFrames,
+                        "autoRange" : self.measurementSettings.autoRange,
+                        "telemetryRate" : self.measurementSettings.telemetryRate,
+                        "dutyCycles" : [float(dc) for dc in self.measurementSettings.dutyCycles]}
+            runFile = spectrum_files.createRunFile(os.path.join(folder, spectrum_files.RUNFILE), SA.wavelengths, metadata, calibration = SA.calibrationId)
+            
+            # COOLDOWN BASELINE FROM THE PURGE SYSTEM BEFORE ANY EMITTER IS ON
+            cooldown = None
+            if(self.measurementSettings.adaptiveCooldown and self.deviceManager.purgeConnect):
+                cooldown = purge_system.CooldownController(self.deviceManager.purge,
+                                                           band = self.measurementSettings.cooldownBand,
+                                                           slope = self.measurementSettings.cooldownSlope,
+                                                           window = self.measurementSettings.cooldownWindow)
+                if(cooldown.setBaseline() == None):
+                    self.mprint("...No purge system telemetry, using the fixed cooldown time.")
+                    cooldown = None
+                else:
+                    self.mprint("...Cold plate baseline {:.2f} C.".format(cooldown.baseline))
+            
+            # LOG OF THE TIME SPENT WAITING FOR STEADY STATE AT EACH STEP
+            dwellLog = open(os.path.join(folder, "dwell.csv"), 'w')
+            dwellLog.write("emitter,dutyCycle,dwell,steady\n")
             
             ####################### START MEASUREMENT ########################            
             self.mprint("\nRunning measurement for {}.".format(titlemod))
@@ -1673,47 +2324,108 @@ class Application:
             # Create data object
             dataObject = DutyCycles()
             
+            # PREALLOCATED BUFFERS FOR AVERAGING SPECTRA
+            averager = spectrum_analyzer.FrameAverager(len(ACQ.wavelengths))
+            frames = self.measurementSettings.framesAveraged
+            
+            # DARK SPECTRA, TAKEN WHILE THE LASER IS OFF BETWEEN EMITTERS
+            darks = None
+            if(self.measurementSettings.darkFrames > 0):
+                darks = acquisition.DarkFrameManager(maxAge = self.measurementSettings.darkMaxAge)
+            
+            # INTEGRATION TIMES THE SPECTRA WERE TAKEN AT
+            usedSteps = set()
+            
             # EMITTER SELECTION LOOP
             for i in self.emitters:
                 
                 self.mprint("...Testing emitter {}.".format(i + 1))
                 
-                # SET CURRENT TO 0
-                CS.switchOff()
+                # SET CURRENT TO 0, ALWAYS SENT BEFORE DARK SPECTRA ARE TAKEN
+                CS.switchOff(force = darks != None)
+                darkStart = time.time()
                 
                 # TURN ON SPECIFIC EMITTER 
-                RC.turnOn(i)
+                RC.rOpenOnly(i + 1)
+                
+                # DARK SPECTRA WHILE THE EMITTER COOLS DOWN, AT THE INTEGRATION TIMES
+                # THE DUTY CYCLES START AT AND THE ONES AUTO RANGING HAS USED
+                if(darks != None):
+                    steps = {ACQ.integrationTime} | usedSteps
+                    if(self.measurementSettings.autoRange):
+                        steps |= {SA.getRangeStart(dc) for dc in self.measurementSettings.dutyCycles}
+                    self.take_darks(darks, averager, runFile, i + 1, steps, darkStart, telemetry)
                 
                 # Wait to turn on new emitter
                 if(i != 0):
                     # WAIT FOR EMITTER TO COOL DOWN
-                    self.mprint("......Waiting {} seconds.".format(self.measurementSettings.coolDownTime))
-                    self.sleep(self.measurementSettings.coolDownTime)
+                    if(cooldown == None):
+                        self.mprint("......Waiting {} seconds.".format(self.measurementSettings.coolDownTime))
+                    else:
+                        self.mprint("......Waiting for the cold plate to cool down.")
+                    elapsed, reason = self.cooldown(cooldown, start = darkStart)
+                    if(cooldown != None):
+                        self.mprint(".........Cooled down after {:.1f} s ({}).".format(elapsed, reason))
                 
                 # Means
                 means = []
                 
+                # EMITTER DATA OBJECT, UPDATED AS EACH DUTY CYCLE IS TAKEN
+                EM = da.emitterData()
+                EM.title = "emitter-{}".format(i + 1)
+                EM.hexel = datafolder
+                
                 # DUTY CYCLE LOOP
-                for dc in self.measurementSettings.dutycycles:
+                for dc in self.measurementSettings.dutyCycles:
                     # START DUTY CYCLE MEASUREMENT
                     self.mprint("......Testing duty cycle: {}%".format(dc))
                     
                     # SET CURRENT CONTROLLER DUTY CYCLE
                     CS.setDutyCycle(dc)
                     
+                    # START AT THE LAST GOOD INTEGRATION TIME FOR THE DUTY CYCLE
+                    integrationTime = ACQ.integrationTime
+                    if(self.measurementSettings.autoRange):
+                        integrationTime = SA.getRangeStart(dc)
+                        ACQ.setIntegrationTime(integrationTime)
+                    
                     # TURN CURRENT SUPPLY ON
                     CS.switchOn()
                     
                     # WAIT FOR STEADY STATE
-                    self.sleep(self.measurementSettings.dwellTime)
+                    dwellStart = time.time()
+                    elapsed, steady = self.dwell(dc)
+                    if(self.measurementSettings.adaptiveDwell):
+                        if(steady):
+                            self.mprint(".........Steady after {:.2f} s.".format(elapsed))
+                        else:
+                            self.mprint(".........Not steady after {:.2f} s.".format(elapsed))
+                    dwellLog.write("{},{},{:.3f},{}\n".format(i + 1, dc, elapsed, int(steady)))
+                    dwellLog.flush()
                     
                     # MEASURE SPECTRUM
-                    # SA.measureSpectrum()
-
-                    # GET X AND Y DATA FOR REALTIME PLOT
-                    # y = np.random.rand(16000)             # for testing
-                    # x = np.linspace(400,500,len(y))       # for testing
-                    x, y = self.deviceManager.osa.getData()
+                    frame, y, noise = self.take_spectrum(averager, frames, dwellStart, integrationTime)
+                    
+                    # RETAKE AT A BETTER INTEGRATION TIME IF CLIPPED OR WEAK
+                    if(self.measurementSettings.autoRange):
+                        for retake in range(0, 3):
+                            newTime = SA.rangeIntegrationTime(y, integrationTime)
+                            if(newTime == integrationTime):
+                                break
+                            self.mprint(".........Integration time {} us -> {} us.".format(integrationTime, newTime))
+                            integrationTime = newTime
+                            ACQ.setIntegrationTime(integrationTime)
+                            frame, y, noise = self.take_spectrum(averager, frames, time.time(), integrationTime)
+                        SA.rememberRange(dc, integrationTime)
+                    x = ACQ.wavelengths
+                    usedSteps.add(integrationTime)
+                    
+                    # SUBTRACT THE DARK, WITHOUT ONE THE ANALYSIS SUBTRACTS THE FLOOR INSTEAD
+                    subtracted = darks != None and darks.subtract(y, frame["integrationTime"])
+                    if(darks != None and subtracted == False):
+                        self.mprint(".........WARNING: No dark spectrum for {} us, using the floor.".format(frame["integrationTime"]))
+                    SA.intensities = y
+                    SA.noise = noise
                     
                     # GENERATE REALTIME PLOTS
                     # self.plot(self.plotframe, self.fig1, self.plot1, self.can1, x = x, y = y)
@@ -1722,16 +2434,27 @@ class Application:
                     emittercorrection = i + 1
                     emitter_folder = "emitter-{}".format(emittercorrection)
                     dc_file = "dc-{}.csv".format(dc)
-                    filename = "\\".join([folder, emitter_folder, dc_file])
+                    filename = os.path.join(folder, emitter_folder, dc_file)
 
+                    # Laser driver telemetry over the integration
+                    drive = None if telemetry == None else telemetry.getWindow(frame["tStart"], frame["tEnd"])
+                    if(drive != None and drive["flags"] != 0):
+                        self.mprint("......WARNING: laser driver output was off or tripped during the spectrum.")
+                    
                     # Save spectrum
-                    SA.saveIntensityData(filename)
+                    runFile.append(emittercorrection, dc, y, integrationTime = frame["integrationTime"], tStart = frame["tStart"], tEnd = frame["tEnd"],
+                                   flags = spectrum_files.FLAG_DARK_SUBTRACTED if subtracted else 0, telemetry = drive)
+                    if(noise is not None):
+                        runFile.append(emittercorrection, dc, noise, integrationTime = frame["integrationTime"], tStart = frame["tStart"], tEnd = frame["tEnd"], flags = spectrum_files.FLAG_NOISE, telemetry = drive)
+                    if(SAVE_CSV):
+                        SA.saveIntensityData(filename)
                     
                     # Print recent DT
-                    self.load_dt(emitter_folder)
+                    EM.addDutyCycle(dc, x, y, floor = not subtracted)
+                    self.print_dt(EM)
                     
                     # Find statistics
-                    mean, sdev, skew, kurt = SA.findStatistics()
+                    mean, sdev, skew, kurt = SA.findStatistics(floor = not subtracted)
                     
                     dataObject.store(dc, emittercorrection, mean, sdev)
                     
@@ -1753,8 +2476,9 @@ class Application:
             
             # Print data in console
             print(dataObject)
-            self.mprint('\nSaving data to database!')
-            dataObject.write(h_name)
+            if(self.measurementSettings.writeDatabase):
+                self.mprint('\nSaving data to database!')
+                dataObject.write(h_name)
         
         ############################ EXCEPTIONS ##############################
         except FileNotFoundError as ex:
@@ -1769,9 +2493,9 @@ class Application:
             self.mprint("...ITC4005 interlock is on.")
         
         except ProgramReset:
-            # EXCEPTION FOR PROGRAM RESET
+            # EXCEPTION FOR PROGRAM RESET, ALWAYS SENT AS THE CACHE MAY BE STALE
             try:
-                CS.switchOff()
+                CS.switchOff(force = True)
             except:
                 pass
             self.mprint("Program reset triggered.")
@@ -1785,10 +2509,25 @@ class Application:
             message = template.format(type(ex).__name__, ex.args)
             print(message)
             self.mprint("\nUNKNOWN ERROR:\n...Message Ryan to troubleshoot.")  
+            try:
+                CS.switchOff(force = True)
+            except:
+                pass
             
         finally:
+            # ALWAYS SENT, THE LASER MUST BE OFF WHATEVER THE CACHE SAYS
             try:
-                CS.switchOff()
+                CS.switchOff(force = True)
+            except:
+                pass
+            if(telemetry != None):
+                telemetry.stop()
+            try:
+                self.mprint("...Laser driver: {} transactions, {:.2f} s waiting.".format(CS.itc.transactions, CS.itc.busyTime))
+            except:
+                pass
+            try:
+                dwellLog.close()
             except:
                 pass
             self.running = False
@@ -1825,8 +2564,8 @@ class DutyCycle:
         Return string
         """
         line1 = str(self.dutyCycle)
-        line2 = '...'+' '.join(self.CWL)
-        line3 = '...'+' '.join(self.FWHM)
+        line2 = '...'+' '.join(str(cwl) for cwl in self.CWL)
+        line3 = '...'+' '.join(str(fwhm) for fwhm in self.FWHM)
         
         lines = '\n'.join([line1, line2, line3])
         
@@ -1865,7 +2604,7 @@ class DutyCycles:
     
     def __str__(self):
         
-        lines = '\n'.join(self.dutyCycles)
+        lines = '\n'.join(str(dc) for dc in self.dutyCycles)
             
         return lines
     
@@ -1885,7 +2624,6 @@ arguments are;
     the center wavelength readings for each emitter (array of 6)
     the spectrum width readings for each emitter (array of 6)
 """
-import pyodbc
 def writeToDb(HexelSn, DC, CWL, FWHM):
     cnxn = pyodbc.connect(("Driver={SQL Server}; Server=NSQL\LASERPRODUCTION; Database=CosModules; Trusted_Connection=yes;"))
     cursor = cnxn.cursor()     
@@ -4,12 +4,20 @@ Created on Fri Jan 28 11:51:49 2022
 
 @author: ryan.robinson
 """
-import math
 import numpy, os
-import matplotlib.pyplot as plt
+import lazy_import
 
-# FOR OCEAN OPTICS HR4000
-from seabreeze.spectrometers import Spectrometer, list_devices
+# SHARED SPECTRAL MOMENTS AND FILE READERS
+import dataanalysis
+import spectrum_files
+import calibration_cache
+import spectrum_analyzer_sim
+
+# FOR OCEAN OPTICS HR4000, LOADED WHEN A SPECTROMETER IS CONNECTED
+spectrometers = lazy_import.LazyModule("seabreeze.spectrometers")
+
+# PLOTTING IS ONLY LOADED WHEN A FIGURE IS MADE
+plt = lazy_import.LazyModule("matplotlib.pyplot")
 
 
 def main():
@@ -44,33 +52,129 @@ class SpecStats:
     def calcState(self, x, yf):
         self.x = x
         self.yf = yf
-        self.getMean()
-        self.getSdev()
-        self.getSkew()
-        self.getKurt()
+        mean, sdev, skew, kurt = dataanalysis.getMoments(x, yf)
+        self.mean = float(mean[0])
+        self.sdev = float(sdev[0])
+        self.skew = float(skew[0])
+        self.kurt = float(kurt[0])
         return
+
+# AVERAGES SPECTRA PIXEL BY PIXEL
+class FrameAverager:
+    def __init__(self, pixels):
+        """
+        Running per-pixel mean and variance of a series of spectra, kept in
+        preallocated arrays so adding a frame does not allocate.
+
+        Parameters
+        ----------
+        pixels : int
+            number of pixels per spectrum.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.mean = numpy.zeros(pixels)
+        self.m2 = numpy.zeros(pixels)
+        self.delta = numpy.zeros(pixels)
+        self.scratch = numpy.zeros(pixels)
+        self.n = 0
         
-    def getMean(self):
-        self.mean = numpy.dot(self.x, self.yf)
         return
     
-    def getSdev(self):
-        n = 2
-        moment = numpy.dot((self.x - self.mean)**n, self.yf)
-        self.sdev = math.sqrt(abs(moment))
-        return
+    def reset(self):
+        """
+        Forget all frames.
 
-    def getSkew(self):
-        n = 3
-        moment = numpy.dot((self.x - self.mean)**n, self.yf)
-        self.skew = moment / (self.sdev**n)
+        Returns
+        -------
+        None.
+
+        """
+        self.mean[:] = 0
+        self.m2[:] = 0
+        self.n = 0
+        
         return
+    
+    def add(self, y):
+        """
+        Add a frame.
 
-    def getKurt(self):
-        n = 4
-        moment = numpy.dot((self.x - self.mean)**n, self.yf)
-        self.kurt = moment / (self.sdev**n)
+        Parameters
+        ----------
+        y : numpy array
+            intensities.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.n = self.n + 1
+        
+        # WELFORD UPDATE, IN PLACE
+        numpy.subtract(y, self.mean, out = self.delta)
+        numpy.multiply(self.delta, 1.0 / self.n, out = self.scratch)
+        self.mean += self.scratch
+        numpy.subtract(y, self.mean, out = self.scratch)
+        self.scratch *= self.delta
+        self.m2 += self.scratch
+        
         return
+    
+    def getMean(self):
+        """
+        Get the averaged spectrum.
+
+        Returns
+        -------
+        numpy array
+            copy of the per-pixel mean.
+
+        """
+        return self.mean.copy()
+    
+    def getVariance(self):
+        """
+        Get the per-pixel variance between frames.
+
+        Returns
+        -------
+        numpy array
+            sample variance, zeros with fewer than 2 frames.
+
+        """
+        if(self.n < 2):
+            return numpy.zeros(len(self.mean))
+        
+        return self.m2 / (self.n - 1)
+    
+    def getNoise(self):
+        """
+        Get the per-pixel noise of the averaged spectrum.
+
+        Returns
+        -------
+        numpy array
+            standard error of the mean of each pixel.
+
+        """
+        if(self.n < 2):
+            return numpy.zeros(len(self.mean))
+        
+        return numpy.sqrt(self.getVariance() / self.n)
+
+# HR4000 FULL SCALE IN COUNTS
+SATURATION = 16383
+
+# INTEGRATION TIMES IN MICRO-SECONDS THE AUTO RANGING CHOOSES FROM
+INTEGRATION_STEPS = [5000, 7500, 10000, 15000, 20000, 30000, 45000, 60000]
+
+# PEAK TO PEAK COUNTS THE AUTO RANGING AIMS FOR
+TARGET_COUNTS = (8000, 13000)
 
 # CONTROLS THE OCEAN OPTICS HR4000 OSA
 # REQUIRES SEABREEZE TO BE INSTALLED
@@ -85,28 +189,140 @@ class SpectrumAnalyzer():
         None.
 
         """
+        # AVERAGING BUFFERS AND NOISE OF THE LAST AVERAGED SPECTRUM
+        self.averager = None
+        self.noise = None
+        
+        # LAST GOOD INTEGRATION TIME FOR EACH DUTY CYCLE
+        self.rangeMemory = {}
+        
+        # WAVELENGTH CALIBRATION OF THE CONNECTED SPECTROMETER
+        self.serial = None
+        self.calibrationId = None
+        
         return
     
     def listDevices(self):
-        devices = list_devices()
+        devices = spectrometers.list_devices()
         print(devices)
         return
     
-    def connect(self, integration_time = 1500):
+    def connect(self, integration_time = 1500, address = None, simulation = {}):
         """
         Connect to device
+
+        Parameters
+        ----------
+        integration_time : int, optional
+            integration time in micro-seconds. The default is 1500.
+        address : str, optional
+            an address starting with SIM connects the simulated HR4000.
+            The default is None, the first spectrometer found.
+        simulation : dict, optional
+            SimulatedHR4000 options. The default is {}.
+
+        Returns
+        -------
+        None.
+
         """
         # SET OSA INTEGRATION TIME
         self.integration_time = integration_time
         
         # SET OSA DEVICE
         # SERIAL NUMBER: HR4D1482
-        self.spec = Spectrometer.from_first_available()
+        if(address != None and address.upper().startswith(spectrum_analyzer_sim.SIMULATED)):
+            self.spec = spectrum_analyzer_sim.SimulatedHR4000(**simulation)
+        else:
+            self.spec = spectrometers.Spectrometer.from_first_available()
         
         self.spec.integration_time_micros(self.integration_time)
         
-        # GET WAVELENGTH X AXIS
+        # GET WAVELENGTH X AXIS, SEABREEZE WORKS IT OUT FROM THE COEFFICIENTS IT READ ON OPEN
+        self.serial = self.spec.serial_number
         self.wavelengths = self.spec.wavelengths()
+        self.calibrationId = calibration_cache.calibrationId(self.serial, self.wavelengths)
+        
+        # SHARE THE ANALYSIS WINDOW WITH THE DATA ANALYSIS UNDER THE CALIBRATION ID
+        dataanalysis.getCalibration(self.wavelengths, ID = self.calibrationId)
+        
+        return
+    
+    def getRangeStart(self, dutyCycle):
+        """
+        Get the integration time to start a duty cycle with, the last good
+        setting for that duty cycle or the current integration time.
+
+        Parameters
+        ----------
+        dutyCycle : float
+            duty cycle in percent.
+
+        Returns
+        -------
+        int
+            integration time in micro-seconds.
+
+        """
+        return self.rangeMemory.get(float(dutyCycle), self.integration_time)
+    
+    def rangeIntegrationTime(self, y, integrationTime):
+        """
+        Choose the integration time that brings a spectrum into the target
+        band.
+
+        Parameters
+        ----------
+        y : numpy array
+            raw intensities.
+        integrationTime : int
+            integration time y was taken with in micro-seconds.
+
+        Returns
+        -------
+        int
+            integration time from INTEGRATION_STEPS to use, equal to
+            integrationTime if y is already good or no step is better.
+
+        """
+        counts = numpy.max(y) - numpy.min(y)
+        saturated = numpy.max(y) >= SATURATION
+        if(saturated == False and TARGET_COUNTS[0] <= counts <= TARGET_COUNTS[1]):
+            return integrationTime
+        
+        # SIGNAL IS LINEAR IN INTEGRATION TIME, HALVE IT IF CLIPPED
+        if(saturated):
+            best = 0.5 * integrationTime
+        else:
+            best = integrationTime * TARGET_COUNTS[1] / max(counts, 1)
+        
+        # LONGEST STEP THAT STAYS UNDER THE TOP OF THE BAND
+        steps = [step for step in INTEGRATION_STEPS if step <= best]
+        step = steps[-1] if len(steps) > 0 else INTEGRATION_STEPS[0]
+        
+        # ONLY MOVE IF IT HELPS
+        if(saturated == False and counts < TARGET_COUNTS[0] and step <= integrationTime):
+            return integrationTime
+        
+        return step
+    
+    def rememberRange(self, dutyCycle, integrationTime):
+        """
+        Remember a good integration time for a duty cycle.
+
+        Parameters
+        ----------
+        dutyCycle : float
+            duty cycle in percent.
+        integrationTime : int
+            integration time in micro-seconds.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.rangeMemory[float(dutyCycle)] = integrationTime
         
         return
     
@@ -114,9 +330,7 @@ class SpectrumAnalyzer():
         """
         Load file to class, this is mainly used for unit testing.
         """
-        loadedData = numpy.genfromtxt(filename, delimiter = ',')
-        self.wavelengths = loadedData[:,0]
-        self.intensities = loadedData[:,1]
+        self.wavelengths, self.intensities = spectrum_files.loadSpectrum(filename)
         
         return
     
@@ -136,10 +350,16 @@ class SpectrumAnalyzer():
         
         return
     
-    def findStatistics(self):
+    def findStatistics(self, floor = True):
         """
         Finds the weighted mean and standard deviation of the data.
 
+        Parameters
+        ----------
+        floor : bool, optional
+            subtract the minimum as the noise floor, False if a dark
+            spectrum was already subtracted. The default is True.
+
         Returns
         -------
         wmean : float
@@ -148,48 +368,39 @@ class SpectrumAnalyzer():
             standard deviation.
 
         """
-        # Subtract the noise floor
-        tmp_int = self.intensities - min(self.intensities)
-        
-        # Check if sum is zero
-        if(numpy.sum(tmp_int) == 0):
-            return float('nan'), float('nan'), float('nan'), float('nan')
-        
-        # Normalize spectrum
-        tmp_int = tmp_int/numpy.sum(tmp_int)
-        
-        # Set the max filter level
-        filterlv = 0.0015
-        
-        # Zero values unter the filterlv
-        for i in range(0,len(tmp_int)):
-            if(tmp_int[i] < filterlv):
-                tmp_int[i] = 0
-        
-        if(numpy.sum(tmp_int) == 0):
-            return float('nan'), float('nan'), float('nan'), float('nan')
-        
-        tmp_int = tmp_int/numpy.sum(tmp_int)
-        
-        # plt.figure(2)
-        # plt.plot(tmp_int)
-        
-        stats = SpecStats()
-        stats.calcState(self.wavelengths, tmp_int)
+        # Subtract the noise floor, filter and normalize
+        mean, sdev, skew, kurt = dataanalysis.filteredMoments(self.wavelengths, self.intensities, floor = floor)
 
-        return stats.mean, stats.sdev, stats.skew, stats.kurt
+        return float(mean[0]), float(sdev[0]), float(skew[0]), float(kurt[0])
     
-    def measureSpectrum(self):
+    def measureSpectrum(self, frames = 1):
         """
         Measure data from the OSA.
 
+        Parameters
+        ----------
+        frames : int, optional
+            number of spectra to average. The default is 1.
+
         Returns
         -------
         None.
 
         """
         # READ INTENSITIES
-        self.intensities = self.spec.intensities()
+        if(frames <= 1):
+            self.intensities = self.spec.intensities()
+            self.noise = None
+            return
+        
+        # AVERAGE SEVERAL READS
+        if(self.averager == None or len(self.averager.mean) != len(self.wavelengths)):
+            self.averager = FrameAverager(len(self.wavelengths))
+        self.averager.reset()
+        for i in range(0, frames):
+            self.averager.add(self.spec.intensities())
+        self.intensities = self.averager.getMean()
+        self.noise = self.averager.getNoise()
         
         return
     
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:52:16 2026
+
+Simulated Ocean Optics HR4000 for running the station without hardware.
+
+SimulatedHR4000 stands in for the seabreeze Spectrometer used by
+spectrum_analyzer.SpectrumAnalyzer. Each call to intensities() blocks
+until the next frame of a free running spectrometer is read out, so the
+acquisition runs at the real line rate, and returns a spectrum of the
+emitter that is lit: a line near 445 nm that shifts to the red as the
+emitter heats up with duty cycle and current, each emitter with its own
+wavelength and thermal resistance, on a dark floor with read and shot
+noise, clipped at the 14 bit full scale.
+
+The line shapes and the emitter wavelengths can be seeded from a measured
+hexel folder such as sets/testdata, the spectra of the nearest duty cycle
+are then shifted to the simulated wavelength, so analysis runs on real
+shapes. The laser is read from a linked SimulatedITC4005, or set by hand
+with setLight, and the emitter from a linked serial_emulator.RelayEmulator.
+
+It is selected by setting OSA in device_addresses.cfg to an address
+starting with SIM, for example SIM::HR4000.
+"""
+
+import os, glob, time, threading
+import numpy as np
+
+import dataanalysis
+import spectrum_files
+
+# ADDRESS PREFIX THAT SELECTS THE SIMULATOR
+SIMULATED = "SIM"
+
+# HR4000 DETECTOR AND ADC
+PIXELS = 3648
+FULL_SCALE = 16383
+
+# WAVELENGTH CALIBRATION OF THE STATION HR4000, nm = c0 + c1 p + c2 p^2 + c3 p^3
+COEFFICIENTS = [423.025488, 2.68160e-02, 1.668729e-07, -6.04825e-10]
+
+# EMITTERS IN A HEXEL
+EMITTERS = 6
+
+# DRIVE THE RESPONSIVITY AND THE SEEDED SPECTRA ARE REFERRED TO
+REFERENCE_CURRENT = 3.3
+THRESHOLD_CURRENT = 0.4
+
+# RED SHIFT OF THE GAN EMITTERS IN nm PER K
+WAVELENGTH_SHIFT = 0.06
+
+class SimulatedHR4000:
+    def __init__(self, wavelength = 443.5, thermalResistance = 5.0, thermalTime = 0.3, linewidth = 0.5,
+                 responsivity = 0.44, darkLevel = 680.0, darkRate = 0.002, readNoise = 6.0, gain = 0.5,
+                 transferTime = 0.002, seedFolder = None, seed = None):
+        """
+        Power on the simulated spectrometer.
+
+        Parameters
+        ----------
+        wavelength : float, optional
+            cold wavelength of the emitters in nm, each emitter is spread
+            around it. The default is 443.5, the line is near 445 nm at the
+            middle duty cycles.
+        thermalResistance : float, optional
+            mean emitter thermal resistance in K/W. The default is 5.0.
+        thermalTime : float, optional
+            thermal time constant of an emitter in seconds. The default is
+            0.3.
+        linewidth : float, optional
+            standard deviation of the line in nm. The default is 0.5.
+        responsivity : float, optional
+            peak counts per micro-second at 100% duty cycle and the
+            reference current. The default is 0.44.
+        darkLevel : float, optional
+            dark floor in counts. The default is 680.
+        darkRate : float, optional
+            dark counts per micro-second. The default is 0.002.
+        readNoise : float, optional
+            read noise in counts. The default is 6.
+        gain : float, optional
+            counts per photo-electron, sets the shot noise. The default is
+            0.5.
+        transferTime : float, optional
+            seconds to read a frame out over USB, the next frame integrates
+            meanwhile. The default is 0.002.
+        seedFolder : str, optional
+            hexel folder of measured spectra to take the line shapes and
+            emitter wavelengths from. The default is None, a gaussian line.
+        seed : int, optional
+            seed for the emitter spread and the noise. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.linewidth = linewidth
+        self.responsivity = responsivity
+        self.darkLevel = darkLevel
+        self.darkRate = darkRate
+        self.readNoise = readNoise
+        self.gain = gain
+        self.transferTime = transferTime
+        self.thermalTime = thermalTime
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+        # DIODE MODEL FOR THE ELECTRICAL POWER, V = V0 + R * I
+        self.v0 = 1.6
+        self.resistance = 0.12
+
+        # EMITTER SPREAD
+        self.coldWavelength = wavelength + 0.4 * self.rng.standard_normal(EMITTERS)
+        self.thermalResistance = thermalResistance * (1 + 0.1 * self.rng.standard_normal(EMITTERS))
+
+        # MEASURED SPECTRA, (DUTY CYCLE, WEIGHTED MEAN, SHAPE) PER EMITTER
+        self.coefficients = list(COEFFICIENTS)
+        self.pixels = PIXELS
+        self.seeds = None
+        if(seedFolder != None and seedFolder != ""):
+            self.loadSeeds(seedFolder)
+
+        self.axis = np.polynomial.polynomial.polyval(np.arange(self.pixels), self.coefficients)
+        self.serial_number = "HR4SIM00"
+        self.model = "HR4000"
+        self.f = SimulatedFeatures(self)
+
+        # LIGHT SOURCE, A LINKED SimulatedITC4005 OR THE SETTINGS FROM setLight,
+        # ON THE EMITTER A LINKED RelayEmulator LETS LIGHT
+        self.laser = None
+        self.relay = None
+        self.on = False
+        self.emitter = 1
+        self.dutyCycle = 50.0
+        self.current = REFERENCE_CURRENT
+
+        # TEMPERATURE RISE OF EACH EMITTER
+        self.temperature = np.zeros(EMITTERS)
+        self.tUpdate = time.time()
+
+        # FREE RUNNING FRAME CLOCK
+        self.integrationTime = 10000
+        self.frameEnd = time.time()
+        self.frames = 0
+
+        return
+
+    def loadSeeds(self, folder):
+        """
+        Take the line shapes, the wavelength axis and the emitter
+        wavelengths from a measured hexel folder.
+
+        Parameters
+        ----------
+        folder : str
+            hexel folder with emitter-N/dc-M.csv spectra, or a folder
+            holding one.
+
+        Raises
+        ------
+        FileNotFoundError
+            no emitter spectra in the folder.
+
+        Returns
+        -------
+        None.
+
+        """
+        emitters = sorted(glob.glob(os.path.join(folder, "emitter-*")))
+        if(len(emitters) == 0):
+            emitters = sorted(glob.glob(os.path.join(folder, "*", "emitter-*")))
+        if(len(emitters) == 0):
+            raise FileNotFoundError("No emitter spectra in {}".format(folder))
+        hexel = os.path.dirname(emitters[0])
+        emitters = [e for e in emitters if os.path.dirname(e) == hexel]
+
+        self.seeds = []
+        floors = []
+        power = REFERENCE_CURRENT * (self.v0 + self.resistance * REFERENCE_CURRENT)
+        for e, path in enumerate(emitters[:EMITTERS]):
+            files = glob.glob(os.path.join(path, "dc-*.csv"))
+            dutyCycles = [float(os.path.basename(f)[3:-4]) for f in files]
+            order = np.argsort(dutyCycles)
+            dutyCycles = np.array(dutyCycles)[order]
+            x, y = spectrum_files.loadSpectra([files[k] for k in order])
+
+            # FLOOR, NORMALIZED SHAPE AND WEIGHTED MEAN OF EACH SPECTRUM
+            floor = np.median(y, axis = 1)
+            floors.extend(floor)
+            shapes = np.clip(y - floor[:, None], 0, None)
+            shapes = shapes / np.max(shapes, axis = 1)[:, None]
+            means = dataanalysis.filteredMoments(x, y)[0]
+            self.seeds.append((dutyCycles, means, shapes))
+
+            # WAVELENGTH AGAINST DUTY CYCLE GIVES THE COLD WAVELENGTH AND THERMAL RESISTANCE
+            if(len(dutyCycles) > 1):
+                slope, intercept = np.polyfit(dutyCycles, means, 1)
+                self.coldWavelength[e] = intercept
+                self.thermalResistance[e] = slope * 100 / (WAVELENGTH_SHIFT * power)
+            else:
+                self.coldWavelength[e] = means[0] - WAVELENGTH_SHIFT * self.thermalResistance[e] * power * dutyCycles[0] / 100
+
+        # THE SEEDS SET THE AXIS AND THE DARK FLOOR
+        self.pixels = len(x)
+        self.coefficients = list(np.polynomial.polynomial.polyfit(np.arange(self.pixels), x, 3))
+        self.seedAxis = x
+        self.darkLevel = float(np.median(floors))
+
+        return
+
+    def integration_time_micros(self, integrationTime):
+        """
+        Set the integration time, the frame clock restarts.
+
+        Parameters
+        ----------
+        integrationTime : int
+            integration time in micro-seconds.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.lock:
+            self.integrationTime = int(integrationTime)
+            self.frameEnd = time.time()
+
+        return
+
+    def wavelengths(self):
+        return self.axis.copy()
+
+    def setLight(self, on = None, emitter = None, dutyCycle = None, current = None):
+        """
+        Set the laser by hand, used when no simulated laser driver is
+        linked. Arguments left as None are unchanged.
+
+        Parameters
+        ----------
+        on : bool, optional
+            laser output.
+        emitter : int, optional
+            lit emitter, 1 to 6.
+        dutyCycle : float, optional
+            duty cycle in percent.
+        current : float, optional
+            current in A.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.lock:
+            if(on != None):
+                self.on = on
+            if(emitter != None):
+                self.emitter = emitter
+            if(dutyCycle != None):
+                self.dutyCycle = dutyCycle
+            if(current != None):
+                self.current = current
+
+        return
+
+    def getLight(self):
+        """
+        Laser drive right now.
+
+        Returns
+        -------
+        on : bool
+            laser output.
+        emitter : int
+            lit emitter, 1 to 6.
+        dutyCycle : float
+            duty cycle in percent, 100 for DC.
+        current : float
+            current in A.
+
+        """
+        on, emitter, dutyCycle, current = self.on, self.emitter, self.dutyCycle, self.current
+        if(self.laser != None):
+            settings = self.laser.settings
+            on, current = settings["OUTP:STAT"], settings["SOUR:CURR"]
+            dutyCycle = 100.0 if settings["SOUR:FUNC:SHAP"] == "DC" else settings["SOUR:PULS:DCYC"]
+
+        # THE FIRST EMITTER NOT SHORTED BY ITS RELAY
+        if(self.relay != None):
+            lit = self.relay.getLit()
+            on = on and len(lit) > 0
+            emitter = lit[0] if len(lit) > 0 else emitter
+
+        return on, emitter, dutyCycle, current
+
+    def heat(self, t, on, emitter, dutyCycle, current):
+        """
+        Move the emitter temperatures toward their steady state up to t.
+
+        Returns
+        -------
+        None.
+
+        """
+        power = current * (self.v0 + self.resistance * current) * dutyCycle / 100 if on else 0.0
+        steady = np.zeros(EMITTERS)
+        steady[(emitter - 1) % EMITTERS] = self.thermalResistance[(emitter - 1) % EMITTERS] * power
+
+        dt = max(t - self.tUpdate, 0.0)
+        self.temperature += (steady - self.temperature) * (1 - np.exp(-dt / self.thermalTime))
+        self.tUpdate = t
+
+        return
+
+    def line(self, emitter, dutyCycle, center):
+        """
+        Normalized line of an emitter centered on a wavelength.
+
+        Returns
+        -------
+        numpy array
+            line shape, peak 1.
+
+        """
+        if(self.seeds == None):
+            return np.exp(-0.5 * ((self.axis - center) / self.linewidth)**2)
+
+        # SHIFT THE MEASURED SPECTRUM OF THE NEAREST DUTY CYCLE
+        dutyCycles, means, shapes = self.seeds[(emitter - 1) % len(self.seeds)]
+        k = np.argmin(np.abs(dutyCycles - dutyCycle))
+
+        return np.interp(self.axis, self.seedAxis + (center - means[k]), shapes[k], left = 0.0, right = 0.0)
+
+    def spectrum(self, integrationTime, on, emitter, dutyCycle, current):
+        """
+        One frame of counts.
+
+        Returns
+        -------
+        numpy array
+            counts, float.
+
+        """
+        dark = self.darkLevel + self.darkRate * integrationTime
+        signal = np.zeros(self.pixels)
+        if(on and current > THRESHOLD_CURRENT):
+            e = (emitter - 1) % EMITTERS
+            center = self.coldWavelength[e] + WAVELENGTH_SHIFT * self.temperature[e]
+            peak = self.responsivity * integrationTime * dutyCycle / 100 * (current - THRESHOLD_CURRENT) / (REFERENCE_CURRENT - THRESHOLD_CURRENT)
+            signal = peak * self.line(emitter, dutyCycle, center)
+
+        # READ AND SHOT NOISE
+        noise = np.sqrt(self.readNoise**2 + self.gain * (signal + self.darkRate * integrationTime))
+        y = dark + signal + noise * self.rng.standard_normal(self.pixels)
+
+        return np.clip(np.round(y), 0, FULL_SCALE)
+
+    def intensities(self, correct_dark_counts = False, correct_nonlinearity = False):
+        """
+        Read the next frame, waits until it has been integrated and read
+        out.
+
+        Returns
+        -------
+        numpy array
+            counts of each pixel.
+
+        """
+        with self.lock:
+            # THE NEXT FRAME TO END AFTER THE REQUEST
+            now = time.time()
+            period = self.integrationTime * 1e-6
+            if(now >= self.frameEnd):
+                self.frameEnd = self.frameEnd + (np.floor((now - self.frameEnd) / period) + 1) * period
+            frameEnd = self.frameEnd
+            integrationTime = self.integrationTime
+
+        time.sleep(max(frameEnd - time.time(), 0.0) + self.transferTime)
+
+        with self.lock:
+            light = self.getLight()
+            self.heat(frameEnd, *light)
+            self.frames = self.frames + 1
+
+            return self.spectrum(integrationTime, *light)
+
+    def close(self):
+        return
+
+class SimulatedFeatures:
+    def __init__(self, spec):
+        """
+        The seabreeze feature tree of the simulated spectrometer, only the
+        EEPROM is there.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.eeprom = SimulatedEeprom(spec)
+
+        return
+
+class SimulatedEeprom:
+    def __init__(self, spec):
+        self.spec = spec
+
+        return
+
+    def eeprom_read_slot(self, slot):
+        """
+        Read an EEPROM slot, slots 1 to 4 hold the wavelength coefficients.
+
+        Returns
+        -------
+        bytes
+            null padded ASCII like the HR4000.
+
+        """
+        if(slot == 0):
+            text = self.spec.serial_number
+        elif(1 <= slot <= 4):
+            text = "{:.6e}".format(self.spec.coefficients[slot - 1])
+        else:
+            text = ""
+
+        return text.encode('ascii').ljust(16, b"\x00")
@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:40 2026
+
+Readers and writers for the SETS spectrum files.
+
+The spectrum .csv files are written by SpectrumAnalyzer.saveIntensityData
+with numpy.savetxt, so every line is "%.18e,%.18e" and every line has the
+same width. The reader here parses that layout directly and falls back to
+numpy.genfromtxt for anything else.
+
+A run file holds a whole hexel in one binary file:
+    16 byte preamble    magic, format version and header length
+    JSON header         pixels, record layout and run metadata
+    wavelengths         float64, stored once
+    records             one fixed size record per spectrum, appended as
+                        the measurement runs
+The records are read back with numpy.memmap without copying.
+"""
+
+import numpy as np # for data manipulation
+import os, json, time, struct
+
+# RUN FILE NAME INSIDE A HEXEL FOLDER
+RUNFILE = "spectra.sets"
+
+# RUN FILE LAYOUT
+MAGIC = b"SETSRUN\x00"
+VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+
+# RECORD FLAGS, SPECTRA HAVE NEITHER FLAG_DARK NOR FLAG_NOISE SET
+FLAG_DARK = 1
+FLAG_NOISE = 2
+
+# SPECTRUM FLAG, THE DARK SPECTRUM WAS SUBTRACTED, WITHOUT IT THE FLOOR IS
+FLAG_DARK_SUBTRACTED = 4
+
+def isSpectrum(flags):
+    """
+    Test record flags for a spectrum, not a dark or noise record.
+
+    Parameters
+    ----------
+    flags : int or numpy array
+        record flags.
+
+    Returns
+    -------
+    bool or numpy array
+        True for spectra.
+
+    """
+    return (flags & (FLAG_DARK | FLAG_NOISE)) == 0
+
+
+def main():
+    """
+    For testing
+
+    Returns
+    -------
+    None.
+
+    """
+    filename = r'testdata\Hexel1002596-20220216-123108\emitter-1\dc-10.csv'
+
+    x, y = loadSpectrum(filename)
+    print(x[:5])
+    print(y[:5])
+
+    return
+
+def _fixedWidthColumns(raw):
+    """
+    Split the bytes of a fixed width two column file into its columns.
+
+    Parameters
+    ----------
+    raw : bytes
+        contents of the file.
+
+    Returns
+    -------
+    xraw : numpy array
+        uint8 array of the wavelength column, shape (rows, width).
+    yraw : numpy array
+        uint8 array of the intensity column, shape (rows, width).
+
+    Both are None if the file is not in the fixed width layout.
+
+    """
+    # LINE WIDTH FROM THE FIRST LINE
+    newline = raw.find(b'\n')
+    width = newline + 1
+    if(newline <= 0 or len(raw) % width != 0):
+        return None, None
+
+    # THE SEPARATOR AND LINE ENDING MUST LINE UP ON EVERY ROW
+    comma = raw.find(b',', 0, newline)
+    end = newline - 1 if raw[newline - 1:newline] == b'\r' else newline
+    if(comma <= 0):
+        return None, None
+    lines = np.frombuffer(raw, dtype = np.uint8).reshape(-1, width)
+    if(np.all(lines[:,comma] == ord(',')) == False or np.all(lines[:,newline] == ord('\n')) == False):
+        return None, None
+
+    return lines[:,:comma], lines[:,comma + 1:end]
+
+def _parseColumn(column, out):
+    """
+    Parse a fixed width column of text numbers into a float array.
+
+    Parameters
+    ----------
+    column : numpy array
+        uint8 array, shape (rows, width).
+    out : numpy array
+        float array to write the values into, shape (rows,).
+
+    Returns
+    -------
+    numpy array
+        out.
+
+    """
+    text = np.ascontiguousarray(column).view('S{}'.format(column.shape[1])).ravel()
+    np.copyto(out, text, casting = 'unsafe')
+
+    return out
+
+class SpectrumReader:
+    def __init__(self):
+        """
+        Reader for spectrum .csv files.
+
+        The wavelength column of the last file read is kept, so files from
+        the same spectrometer share one wavelength array and only their
+        intensity column is parsed.
+
+        Returns
+        -------
+        None.
+
+        """
+        # RAW BYTES AND PARSED VALUES OF THE LAST WAVELENGTH COLUMN
+        self.axis = (None, None)
+
+        return
+
+    def read(self, filename, y = None):
+        """
+        Read a spectrum file.
+
+        Parameters
+        ----------
+        filename : str
+            file to read.
+        y : numpy array, optional
+            preallocated float array to read the intensities into.
+
+        Returns
+        -------
+        x : numpy array
+            wavelengths, read only, shared by the reads of the same axis.
+        y : numpy array
+            intensities.
+
+        """
+        with open(filename, 'rb') as f:
+            raw = f.read()
+
+        xraw, yraw = _fixedWidthColumns(raw)
+
+        # FALL BACK TO THE GENERIC PARSER FOR ODD FILES
+        if(xraw is None):
+            data = np.genfromtxt(filename, delimiter = ",")
+            if(y is None):
+                return data[:,0], data[:,1]
+            y[:] = data[:,1]
+            return data[:,0], y
+
+        # REUSE THE WAVELENGTHS IF THE COLUMN IS IDENTICAL, READ ONLY AS EVERY CALLER SHARES THEM
+        lastraw, x = self.axis
+        if(lastraw is None or lastraw.shape != xraw.shape or np.array_equal(lastraw, xraw) == False):
+            x = _parseColumn(xraw, np.empty(len(xraw)))
+            x.setflags(write = False)
+            self.axis = (np.array(xraw), x)
+
+        # PARSE THE INTENSITIES
+        if(y is None):
+            y = np.empty(len(yraw))
+        _parseColumn(yraw, y)
+
+        return x, y
+
+    def readStack(self, filenames, out = None):
+        """
+        Read many spectrum files that share a wavelength axis into one array.
+
+        Parameters
+        ----------
+        filenames : list
+            files to read.
+        out : numpy array, optional
+            preallocated float array, shape (len(filenames), pixels).
+
+        Raises
+        ------
+        ValueError
+            a file does not share the wavelength axis of the first file.
+
+        Returns
+        -------
+        x : numpy array
+            wavelengths.
+        out : numpy array
+            intensities, one row per file.
+
+        """
+        x = None
+        for i, filename in enumerate(filenames):
+
+            # SIZE THE OUTPUT FROM THE FIRST FILE
+            if(out is None):
+                x0, y0 = self.read(filename)
+                out = np.empty((len(filenames), len(y0)))
+                out[0] = y0
+                x = x0
+                continue
+
+            xi, yi = self.read(filename, y = out[i])
+            if(x is None):
+                x = xi
+            elif(xi is not x and np.array_equal(xi, x) == False):
+                raise ValueError("{} does not share the wavelength axis".format(filename))
+
+        return x, out
+
+# SHARED READER SO THE WAVELENGTH AXIS IS REUSED ACROSS CALLS
+READER = SpectrumReader()
+
+def loadSpectrum(filename, y = None):
+    """
+    Load a spectrum file with the shared reader.
+
+    Parameters
+    ----------
+    filename : str
+        file to read.
+    y : numpy array, optional
+        preallocated float array to read the intensities into.
+
+    Returns
+    -------
+    x : numpy array
+        wavelengths, read only.
+    y : numpy array
+        intensities.
+
+    """
+    return READER.read(filename, y)
+
+def loadSpectra(filenames, out = None):
+    """
+    Load spectrum files into one array with the shared reader.
+
+    Parameters
+    ----------
+    filenames : list
+        files to read.
+    out : numpy array, optional
+        preallocated float array, shape (len(filenames), pixels).
+
+    Returns
+    -------
+    x : numpy array
+        wavelengths.
+    out : numpy array
+        intensities, one row per file.
+
+    """
+    return READER.readStack(filenames, out)
+
+def recordDtype(pixels, intensity = "<f4"):
+    """
+    Record layout of a run file.
+
+    Parameters
+    ----------
+    pixels : int
+        number of pixels per spectrum.
+    intensity : str, optional
+        intensity dtype, "<f4" or "<u2" for raw counts. The default is "<f4".
+
+    Returns
+    -------
+    list
+        numpy dtype description of one record.
+
+    """
+    return [("emitter", "<u2"),
+            ("flags", "<u2"),
+            ("sequence", "<u4"),
+            ("dutyCycle", "<f4"),
+            ("integrationTime", "<f4"),
+            ("tStart", "<f8"),
+            ("tEnd", "<f8"),
+            ("ldSamples", "<u2"),
+            ("ldFlags", "<u2"),
+            ("ldCurrent", "<f4"),
+            ("ldVoltage", "<f4"),
+            ("ldVoltageMin", "<f4"),
+            ("ldVoltageMax", "<f4"),
+            ("intensities", intensity, (pixels,))]
+
+def createRunFile(filename, wavelengths, metadata = {}, intensity = "<f4", calibration = None):
+    """
+    Create a new run file.
+
+    Parameters
+    ----------
+    filename : str
+        file to create, any existing file is replaced.
+    wavelengths : numpy array
+        wavelength calibration of the spectrometer.
+    metadata : dict, optional
+        run settings to store in the header, must be JSON serializable.
+    intensity : str, optional
+        intensity dtype, "<f4" or "<u2" for raw counts. The default is "<f4".
+    calibration : str, optional
+        ID of the wavelength calibration, from calibration_cache. The
+        default is None.
+
+    Returns
+    -------
+    RunFile
+        run file opened for appending.
+
+    """
+    wavelengths = np.asarray(wavelengths, dtype = "<f8")
+    
+    # BUILD THE HEADER
+    header = {"pixels" : len(wavelengths),
+              "record" : recordDtype(len(wavelengths), intensity),
+              "created" : time.time(),
+              "calibration" : calibration,
+              "metadata" : metadata}
+    text = json.dumps(header).encode()
+    
+    # PAD SO THE WAVELENGTHS AND RECORDS START ON AN ALIGNED OFFSET
+    size = PREAMBLE.size + len(text)
+    text = text + b" " * (-size % ALIGN)
+    
+    # Create directories for file
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    
+    with open(filename, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(text)))
+        f.write(text)
+        f.write(wavelengths.tobytes())
+    
+    return RunFile(filename)
+
+class RunFile:
+    def __init__(self, filename):
+        """
+        Open an existing run file.
+
+        Parameters
+        ----------
+        filename : str
+            run file to open.
+
+        Raises
+        ------
+        ValueError
+            the file is not a run file.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.filename = filename
+        
+        # READ THE PREAMBLE AND HEADER
+        with open(filename, 'rb') as f:
+            magic, version, length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if(magic != MAGIC or version > VERSION):
+                raise ValueError("{} is not a SETS run file".format(filename))
+            header = json.loads(f.read(length).decode())
+        
+        self.pixels = header["pixels"]
+        self.metadata = header["metadata"]
+        self.created = header["created"]
+        self.calibration = header.get("calibration")
+        self.dtype = np.dtype([tuple(field[:2]) + tuple(tuple(v) for v in field[2:]) for field in header["record"]])
+        
+        # OFFSETS OF THE WAVELENGTHS AND RECORDS
+        self.wlOffset = PREAMBLE.size + length
+        self.dataOffset = self.wlOffset + 8 * self.pixels
+        
+        # NEXT SEQUENCE NUMBER
+        self.sequence = len(self.getRecords())
+        
+        # A PARTLY WRITTEN RECORD IS CUT OFF BEFORE THE FIRST APPEND
+        self.trimmed = False
+        
+        return
+    
+    def getWavelengths(self):
+        """
+        Wavelength calibration of the run.
+
+        Returns
+        -------
+        numpy array
+            read only view of the wavelengths.
+
+        """
+        return np.memmap(self.filename, dtype = "<f8", mode = 'r', offset = self.wlOffset, shape = (self.pixels,))
+    
+    def getRecords(self):
+        """
+        All complete records in the file.
+
+        Returns
+        -------
+        numpy array
+            read only structured view of the records, a partly written
+            record at the end of the file is ignored.
+
+        """
+        count = (os.path.getsize(self.filename) - self.dataOffset) // self.dtype.itemsize
+        if(count <= 0):
+            return np.zeros(0, dtype = self.dtype)
+        
+        return np.memmap(self.filename, dtype = self.dtype, mode = 'r', offset = self.dataOffset, shape = (count,))
+    
+    def trim(self):
+        """
+        Truncate the file to a whole number of records, dropping a record
+        left partly written by a crash.
+
+        Returns
+        -------
+        None.
+
+        """
+        size = os.path.getsize(self.filename)
+        end = self.dataOffset + max(size - self.dataOffset, 0) // self.dtype.itemsize * self.dtype.itemsize
+        if(size > end):
+            os.truncate(self.filename, end)
+        self.trimmed = True
+        
+        return
+    
+    def append(self, emitter, dutyCycle, intensities, integrationTime = 0, tStart = None, tEnd = None, flags = 0, telemetry = None):
+        """
+        Append a spectrum to the run file. The first append trims a partly
+        written record off the end of the file, so the new record lines up.
+
+        Parameters
+        ----------
+        emitter : int
+            emitter number, starting at 1.
+        dutyCycle : float
+            duty cycle in percent.
+        intensities : numpy array
+            intensity data.
+        integrationTime : float, optional
+            integration time in micro-seconds. The default is 0.
+        tStart : float, optional
+            time the integration started. The default is tEnd minus the
+            integration time.
+        tEnd : float, optional
+            time the integration ended. The default is now.
+        flags : int, optional
+            record flags, 0 for a spectrum, FLAG_DARK_SUBTRACTED for a
+            spectrum with the dark spectrum subtracted, FLAG_DARK for a dark
+            spectrum taken with the laser off or FLAG_NOISE for the
+            per-pixel noise of the spectrum before it. The default is 0.
+        telemetry : dict, optional
+            laser driver telemetry over the integration from
+            TelemetryPoller.getWindow, stored in the ld fields if the file
+            has them. The default is None, no telemetry.
+
+        Returns
+        -------
+        None.
+
+        """
+        if(tEnd == None):
+            tEnd = time.time()
+        if(tStart == None):
+            tStart = tEnd - integrationTime * 1e-6
+        
+        # FILL OUT THE RECORD
+        record = np.zeros(1, dtype = self.dtype)
+        record["emitter"] = emitter
+        record["flags"] = flags
+        record["sequence"] = self.sequence
+        record["dutyCycle"] = dutyCycle
+        record["integrationTime"] = integrationTime
+        record["tStart"] = tStart
+        record["tEnd"] = tEnd
+        record["intensities"] = intensities
+        
+        # LASER DRIVER TELEMETRY, NaN WITHOUT IT
+        if("ldSamples" in self.dtype.names):
+            if(telemetry == None):
+                telemetry = {"samples" : 0, "flags" : 0, "current" : np.nan,
+                             "voltage" : np.nan, "voltageMin" : np.nan, "voltageMax" : np.nan}
+            record["ldSamples"] = telemetry["samples"]
+            record["ldFlags"] = telemetry["flags"]
+            record["ldCurrent"] = telemetry["current"]
+            record["ldVoltage"] = telemetry["voltage"]
+            record["ldVoltageMin"] = telemetry["voltageMin"]
+            record["ldVoltageMax"] = telemetry["voltageMax"]
+        
+        # APPEND TO THE END OF THE FILE
+        if(self.trimmed == False):
+            self.trim()
+        with open(self.filename, 'ab') as f:
+            f.write(record.tobytes())
+        self.sequence = self.sequence + 1
+        
+        return
+    
+    def exportCsv(self, folder):
+        """
+        Write the run out as emitter-N/dc-XX.csv files for older tools.
+
+        Parameters
+        ----------
+        folder : str
+            hexel folder to write into.
+
+        Returns
+        -------
+        None.
+
+        """
+        x = np.asarray(self.getWavelengths())
+        for record in self.getRecords():
+            if(isSpectrum(record["flags"]) == False):
+                continue
+            dc = float(record["dutyCycle"])
+            dc = int(dc) if dc.is_integer() else dc
+            filename = os.path.join(folder, "emitter-{}".format(record["emitter"]), "dc-{}.csv".format(dc))
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            np.savetxt(filename, np.column_stack((x, record["intensities"])), delimiter = ",")
+        
+        return
+
+if __name__ == "__main__":
+    main()
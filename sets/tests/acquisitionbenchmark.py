@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:21:34 2026
+
+Benchmark the acquisition, save and analysis of one hexel on the simulated
+HR4000.
+
+Every emitter and duty cycle is lit on the simulated spectrometer, the
+acquisition thread averages the frames, the spectra are appended to a run
+file and the run file is analyzed with hexelData. The time of each stage is
+reported against the time the frames take at the line rate, and the fitted
+wavelength slopes are compared with the ones the simulator was set up with.
+
+Usage:
+    python acquisitionbenchmark.py [-i integration] [-f frames] [-s seedfolder]
+"""
+
+import sys, os, argparse, time, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import spectrum_analyzer
+import spectrum_analyzer_sim
+import spectrum_files
+import acquisition
+import dataanalysis
+
+# ONE HEXEL
+DUTY_CYCLES = [10, 25, 50, 75, 90, 99]
+CURRENT = 3.3
+
+def main():
+    parser = argparse.ArgumentParser(description = "Time one hexel of acquisition, save and analysis on the simulated HR4000.")
+    parser.add_argument("-i", "--integration", type = int, default = 10000, help = "integration time in micro-seconds")
+    parser.add_argument("-f", "--frames", type = int, default = 5, help = "frames averaged per spectrum")
+    parser.add_argument("-s", "--seedfolder", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata'),
+                        help = "measured hexel to replay, empty for a gaussian line")
+    args = parser.parse_args()
+    folder = tempfile.mkdtemp()
+
+    # SIMULATED SPECTROMETER, THE EMITTERS HEAT UP AS SOON AS THEY ARE LIT
+    SA = spectrum_analyzer.SpectrumAnalyzer()
+    SA.connect(integration_time = args.integration, address = spectrum_analyzer_sim.SIMULATED,
+               simulation = {"seedFolder" : args.seedfolder, "thermalTime" : 1e-3, "seed" : 1})
+    spec = SA.spec
+    ACQ = acquisition.SpectrumAcquisition(SA)
+    ACQ.start()
+
+    # ACQUIRE AND SAVE
+    filename = os.path.join(folder, "run.sets")
+    runFile = spectrum_files.createRunFile(filename, SA.wavelengths, {"dutyCycles" : DUTY_CYCLES}, calibration = SA.calibrationId)
+    averager = spectrum_analyzer.FrameAverager(len(SA.wavelengths))
+    acquireTime, saveTime = 0.0, 0.0
+    start = time.perf_counter()
+    for emitter in range(1, spectrum_analyzer_sim.EMITTERS + 1):
+        for dc in DUTY_CYCLES:
+            t0 = time.perf_counter()
+            spec.setLight(on = True, emitter = emitter, dutyCycle = dc, current = CURRENT)
+            frame = ACQ.averageFrames(averager, args.frames, after = time.time(), integrationTime = args.integration, timeout = 10)
+            t1 = time.perf_counter()
+            runFile.append(emitter, dc, averager.getMean(), integrationTime = frame["integrationTime"], tStart = frame["tStart"], tEnd = frame["tEnd"])
+            t2 = time.perf_counter()
+            acquireTime, saveTime = acquireTime + t1 - t0, saveTime + t2 - t1
+    total = time.perf_counter() - start
+    ACQ.stop()
+
+    # ANALYZE
+    t0 = time.perf_counter()
+    HD = dataanalysis.hexelData()
+    HD.loadRunFile(filename)
+    analysisTime = time.perf_counter() - t0
+
+    # A SPECTRUM NEEDS ITS FRAMES PLUS THE ONE IN PROGRESS WHEN THE LIGHT CHANGED
+    spectra = spectrum_analyzer_sim.EMITTERS * len(DUTY_CYCLES)
+    ideal = spectra * (args.frames + 1) * args.integration * 1e-6
+    print("{} spectra of {} x {} us frames, {:.1f} frames/s read".format(spectra, args.frames, args.integration, spec.frames / total))
+    print("acquire:  {:7.3f} s ({:.2f}x the line rate)".format(acquireTime, acquireTime / ideal))
+    print("save:     {:7.3f} s".format(saveTime))
+    print("analysis: {:7.3f} s".format(analysisTime))
+
+    # THE FITTED SLOPES AGAINST THE SIMULATED EMITTERS
+    power = CURRENT * (spec.v0 + spec.resistance * CURRENT)
+    expected = spectrum_analyzer_sim.WAVELENGTH_SHIFT * spec.thermalResistance * power / 100
+    print("slope nm/%:  fitted " + " ".join("{:.4f}".format(s) for s in np.ravel(HD.slope)))
+    print("             set    " + " ".join("{:.4f}".format(s) for s in expected))
+
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:06:24 2026
+
+Check the array based spectrum analysis against the original per-pixel
+loops on the hexels in sets/testdata, one spectrum at a time and as a
+batch.
+"""
+
+import sys, os, glob
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import dataanalysis
+import spectrum_files
+
+# RELATIVE TOLERANCE FOR RESULTS THAT ARE NOT BIT FOR BIT
+RTOL = 1e-9
+
+def loopNorm(x, y, calcwidth = 2.0, halfwidth = 10.0):
+    """
+    Original dutyCycleData.getNorm on a windowed spectrum.
+
+    Returns
+    -------
+    numpy array
+        normalized intensity distribution.
+
+    """
+    index = np.argmax(y)
+    wavelength_spacing = x[index] - x[index - 1]
+    d_index = int(halfwidth / wavelength_spacing)
+    dplus_index = min(d_index + index, len(x))
+    dminus_index = max(index - d_index, 0)
+    ynoise = np.concatenate((y[:dminus_index], y[dplus_index:]), axis = None)
+    yf = y - np.average(ynoise)
+    c_index = int(calcwidth / wavelength_spacing)
+    c_minus = index - c_index
+    c_plus = index + c_index
+    for i in range(0, len(yf)):
+        if(i < c_minus or i > c_plus):
+            yf[i] = 0
+
+    return yf / np.sum(yf)
+
+def loopStatistics(x, y):
+    """
+    Original SpectrumAnalyzer.findStatistics.
+
+    Returns
+    -------
+    tuple
+        mean, sdev, skew and kurt.
+
+    """
+    tmp_int = y - min(y)
+    if(np.sum(tmp_int) == 0):
+        return float('nan'), float('nan'), float('nan'), float('nan')
+    tmp_int = tmp_int / np.sum(tmp_int)
+    for i in range(0, len(tmp_int)):
+        if(tmp_int[i] < 0.0015):
+            tmp_int[i] = 0
+    if(np.sum(tmp_int) == 0):
+        return float('nan'), float('nan'), float('nan'), float('nan')
+    tmp_int = tmp_int / np.sum(tmp_int)
+    mean, sdev, skew, kurt = dataanalysis.getMoments(x, tmp_int)
+
+    return float(mean[0]), float(sdev[0]), float(skew[0]), float(kurt[0])
+
+def compare(name, a, b):
+    """
+    Report the largest difference between two results.
+
+    Returns
+    -------
+    None.
+
+    """
+    a = np.asarray(a, dtype = float)
+    b = np.asarray(b, dtype = float)
+    assert np.array_equal(np.isnan(a), np.isnan(b)), name
+    ok = ~np.isnan(a)
+    diff = np.max(np.abs(a[ok] - b[ok]) / np.maximum(np.abs(b[ok]), 1e-12), initial = 0.0)
+    print("{}: {}".format(name, "identical" if np.array_equal(a[ok], b[ok]) else "max rel diff {:.2e}".format(diff)))
+    assert diff < RTOL, name
+
+    return
+
+def main():
+    # LOAD ALL TEST DATA FILES
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata')
+    files = sorted(glob.glob(os.path.join(folder, '*', 'emitter-*', '*.csv')))
+    x, y = spectrum_files.SpectrumReader().readStack(files)
+    print("Files: {}".format(len(files)))
+
+    # FILTERED STATISTICS, ONE AT A TIME AND AS A BATCH
+    loop = np.array([loopStatistics(x, yi) for yi in y])
+    single = np.array([[m[0] for m in dataanalysis.filteredMoments(x, yi)] for yi in y])
+    batch = np.column_stack(dataanalysis.filteredMoments(x, y))
+    compare("findStatistics single", single, loop)
+    compare("findStatistics batch", batch, loop)
+
+    # NORMALIZED SPECTRA, ONE AT A TIME AND AS A BATCH
+    results = dataanalysis.analyzeSpectra(x, y)
+    xw = results["x"]
+    for i, yi in enumerate(results["y"]):
+        if(results["reliable"][i] == False):
+            continue
+        DC = dataanalysis.dutyCycleData(10, x, y[i])
+        reference = loopNorm(xw, yi.astype(float))
+        compare("getNorm {}".format(os.path.relpath(files[i], folder)), DC.yf, reference)
+        compare("analyzeSpectra {}".format(os.path.relpath(files[i], folder)), results["yf"][i], reference)
+
+    # A DARK SPECTRUM IS UNRELIABLE, ITS RESULTS CAN STILL BE CACHED
+    dark = np.full(len(x), 100.0)
+    DC = dataanalysis.dutyCycleData(10, x, dark)
+    cached = DC.getResults()
+    assert DC.reliable == False and np.isnan(cached["wMean"]), "dark spectrum"
+    compare("dark yf", cached["yf"], np.zeros(len(xw)))
+    compare("dark analyzeSpectra", dataanalysis.analyzeSpectra(x, dark[None, :])["yf"][0], cached["yf"])
+    DC.setResults(cached)
+    assert DC.wMean == None, "dark spectrum from cache"
+
+    print("All results match.")
+
+    return
+
+if __name__ == "__main__":
+    main()
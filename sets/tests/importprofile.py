@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:40:07 2026
+
+Startup benchmark for the SETS modules.
+
+Each module is imported in a fresh interpreter with python -X importtime
+and the report is summarized: the import time of the module, the slowest
+packages it pulls in and whether any hardware, database or plotting
+package was loaded. Offline modules must not load those packages and
+every module must import within the budget.
+
+Usage:
+    python importprofile.py [module ...] [-r repeat] [-o history.csv]
+"""
+
+import sys, os, subprocess, argparse, time, csv
+
+# SETS SOURCE FOLDER
+SETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# PACKAGES THAT SHOULD ONLY LOAD WHEN A DEVICE, PLOT OR DATABASE IS USED
+HEAVY = ["matplotlib", "seabreeze", "pyvisa", "serial", "pyodbc", "nidaqmx"]
+
+# MODULES USED FOR OFFLINE ANALYSIS, NONE OF THE HEAVY PACKAGES ALLOWED
+OFFLINE = ["dataanalysis", "spectrum_files", "analysis_cache", "calibration_cache",
+           "batch_analysis", "spectrum_analyzer", "acquisition", "laser_driver",
+           "instruments", "sets"]
+
+# IMPORT TIME BUDGET IN SECONDS
+BUDGET = 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description = "Profile the import time of the SETS modules.")
+    parser.add_argument("modules", nargs = "*", default = OFFLINE, help = "modules to import")
+    parser.add_argument("-r", "--repeat", type = int, default = 3, help = "imports per module, the best is kept")
+    parser.add_argument("-o", "--output", default = None, help = "csv file to append the results to")
+    args = parser.parse_args()
+
+    results = [profile(module, args.repeat) for module in args.modules]
+    report(results)
+
+    if(args.output != None):
+        save(results, args.output)
+
+    # FAIL IF A MODULE IS OVER BUDGET OR LOADS A HEAVY PACKAGE
+    failed = [r for r in results if r["error"] != None or r["total"] > BUDGET or len(r["heavy"]) > 0]
+
+    return 1 if len(failed) > 0 else 0
+
+def parseImportTime(text):
+    """
+    Parse the report written by python -X importtime.
+
+    Parameters
+    ----------
+    text : str
+        stderr of the interpreter.
+
+    Returns
+    -------
+    list
+        (name, depth, self time in s, cumulative time in s) per import.
+
+    """
+    imports = []
+    for line in text.splitlines():
+        if(line.startswith("import time:") == False):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if(len(fields) != 3 or fields[0].strip().isdigit() == False):
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), depth, int(fields[0]) * 1e-6, int(fields[1]) * 1e-6))
+
+    return imports
+
+def profile(module, repeat = 3):
+    """
+    Import a module in fresh interpreters and keep the fastest run.
+
+    Parameters
+    ----------
+    module : str
+        module to import.
+    repeat : int, optional
+        number of imports. The default is 3.
+
+    Returns
+    -------
+    dict
+        module, total time, slowest top level packages, heavy packages
+        loaded and the error if the import failed.
+
+    """
+    best = None
+    for i in range(0, repeat):
+        command = [sys.executable, "-X", "importtime", "-c", "import {}".format(module)]
+        run = subprocess.run(command, cwd = SETS, capture_output = True, text = True)
+        imports = parseImportTime(run.stderr)
+
+        if(run.returncode != 0):
+            error = run.stderr.strip().splitlines()[-1] if run.stderr.strip() else "exit {}".format(run.returncode)
+            return {"module" : module, "total" : float('nan'), "slowest" : [], "heavy" : [], "error" : error}
+
+        # THE MODULE ITSELF IS THE LAST TOP LEVEL IMPORT
+        total = [cumulative for name, depth, own, cumulative in imports if name == module and depth == 0]
+        total = total[-1] if len(total) > 0 else sum(own for name, depth, own, cumulative in imports)
+        if(best == None or total < best["total"]):
+            top = sorted([(cumulative, name) for name, depth, own, cumulative in imports if depth <= 1 and name != module], reverse = True)
+            loaded = set(name.split(".")[0] for name, depth, own, cumulative in imports)
+            best = {"module" : module,
+                    "total" : total,
+                    "slowest" : [(name, cumulative) for cumulative, name in top[:5]],
+                    "heavy" : [name for name in HEAVY if name in loaded],
+                    "error" : None}
+
+    return best
+
+def report(results):
+    """
+    Print the profile of every module.
+
+    Returns
+    -------
+    None.
+
+    """
+    print("{:<20}{:>10}  {}".format("module", "import ms", "heavy packages loaded"))
+    for r in results:
+        if(r["error"] != None):
+            print("{:<20}{:>10}  {}".format(r["module"], "FAILED", r["error"]))
+            continue
+        flag = "" if r["total"] <= BUDGET else "  OVER BUDGET"
+        print("{:<20}{:>10.1f}  {}{}".format(r["module"], r["total"] * 1e3, ", ".join(r["heavy"]) or "-", flag))
+        print("    slowest: " + ", ".join("{} {:.1f}".format(name, t * 1e3) for name, t in r["slowest"]))
+
+    return
+
+def save(results, filename):
+    """
+    Append the results to a csv history.
+
+    Returns
+    -------
+    None.
+
+    """
+    new = os.path.exists(filename) == False
+    with open(filename, 'a', newline = '') as f:
+        writer = csv.writer(f)
+        if(new):
+            writer.writerow(["date", "python", "module", "importMs", "heavy", "error"])
+        for r in results:
+            writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), sys.version.split()[0], r["module"],
+                             "{:.1f}".format(r["total"] * 1e3), " ".join(r["heavy"]), r["error"] or ""])
+
+    return
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:02:51 2026
+
+Benchmark the spectrum file reader against numpy.genfromtxt on the hexels
+in sets/testdata.
+"""
+
+import sys, os, glob, time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import spectrum_files
+
+def timeit(func, repeat = 5):
+    """
+    Best wall time of several runs.
+
+    Parameters
+    ----------
+    func : function
+        function to time.
+    repeat : int, optional
+        number of runs. The default is 5.
+
+    Returns
+    -------
+    float
+        best time in seconds.
+
+    """
+    best = float('inf')
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def main():
+    # FIND ALL TEST DATA FILES
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata')
+    files = sorted(glob.glob(os.path.join(folder, '*', 'emitter-*', '*.csv')))
+    print("Files: {}".format(len(files)))
+
+    # CHECK THE READERS AGREE
+    x, stack = spectrum_files.SpectrumReader().readStack(files)
+    for i, filename in enumerate(files):
+        data = np.genfromtxt(filename, delimiter = ",")
+        assert np.array_equal(data[:,0], x)
+        assert np.array_equal(data[:,1], stack[i])
+
+    # GENERIC PARSER
+    def genfromtxt():
+        for filename in files:
+            np.genfromtxt(filename, delimiter = ",")
+
+    # DEDICATED READER, ONE FILE AT A TIME
+    def read():
+        reader = spectrum_files.SpectrumReader()
+        for filename in files:
+            reader.read(filename)
+
+    # DEDICATED READER, ALL FILES INTO ONE PREALLOCATED ARRAY
+    out = np.empty_like(stack)
+    def readStack():
+        spectrum_files.SpectrumReader().readStack(files, out)
+
+    t0 = timeit(genfromtxt)
+    print("genfromtxt: {:.1f} ms ({:.0f} files/s)".format(t0*1e3, len(files)/t0))
+    for name, func in [("read", read), ("readStack", readStack)]:
+        t = timeit(func)
+        print("{}: {:.1f} ms ({:.0f} files/s, {:.1f}x)".format(name, t*1e3, len(files)/t, t0/t))
+
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:17:42 2026
+
+Run Application.run_measurement end to end on simulated devices.
+
+The laser driver, spectrometer, relay and purge system are all simulated:
+the ITC4005 and HR4000 simulators and the relay and purge system arduinos
+emulated on pseudo terminals, each with the timing of the real device. A
+headless Application prints to the console instead of the text boxes and
+analyzes the run file at the end instead of plotting it. The time of the
+measurement is reported against the dwell, cooldown and frames it must
+wait for, with the analysis results and the device traffic. Nothing is
+written to the database.
+
+Usage:
+    python measurementbenchmark.py [-d dwell] [-c cooldown] [-f frames] [-i integration] [--adaptive]
+"""
+
+import sys, os, argparse, time, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import sets
+import spectrum_files
+import dataanalysis
+
+# DUTY CYCLES OF A PRODUCTION HEXEL
+DUTY_CYCLES = [10, 25, 50, 75, 90, 99]
+
+class TextEntry:
+    """ Stands in for a tk.Entry. """
+    def __init__(self, text = ""):
+        self.text = text
+
+    def get(self):
+        return self.text
+
+    def delete(self, first, last = None):
+        self.text = ""
+
+    def insert(self, index, text):
+        self.text = str(text)
+
+class HeadlessApplication(sets.Application):
+    def __init__(self, hexel, measurementSettings, deviceManager):
+        """
+        The parts of the application run_measurement uses, without the gui.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.measurementSettings = measurementSettings
+        self.deviceManager = deviceManager
+        self.hexel = TextEntry(hexel)
+        self.entry = TextEntry()
+        self.running = True
+        self.enabled = True
+        self.results = None
+
+        return
+
+    def mprint(self, text, append = True, newline = True):
+        print(text, end = "\n" if newline else "", flush = True)
+
+    def sleep(self, t):
+        if(self.running == False):
+            raise sets.ProgramReset()
+        time.sleep(t)
+
+    def repeat_hexel(self, hexel = "100XXXX"):
+        return True
+
+    def load_folder(self):
+        """
+        Analyze the run file of the measurement.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.results = dataanalysis.hexelData()
+        self.results.loadRunFile(os.path.join(self.entry.get(), spectrum_files.RUNFILE))
+
+        return
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run a measurement end to end on simulated devices.")
+    parser.add_argument("-d", "--dwell", type = float, default = 1.0, help = "dwell time in seconds")
+    parser.add_argument("-c", "--cooldown", type = float, default = 1.0, help = "cooldown time in seconds")
+    parser.add_argument("-f", "--frames", type = int, default = 1, help = "frames averaged per spectrum")
+    parser.add_argument("-i", "--integration", type = int, default = 30000, help = "integration time in micro-seconds")
+    parser.add_argument("--adaptive", action = "store_true", help = "adaptive dwell and cooldown")
+    args = parser.parse_args()
+
+    # SETTINGS FOR THE RUN, SAVED TO A TEMPORARY FOLDER
+    settings = sets.MeasurementSettings()
+    settings.dutyCycles = DUTY_CYCLES
+    settings.intigrationTime = args.integration
+    settings.dwellTime = args.dwell
+    settings.coolDownTime = args.cooldown
+    settings.framesAveraged = args.frames
+    settings.adaptiveDwell = args.adaptive
+    settings.adaptiveCooldown = args.adaptive
+    settings.cooldownMaxTime = 4 * args.cooldown
+    settings.writeDatabase = False
+    settings.savePath = tempfile.mkdtemp()
+
+    # EVERY DEVICE SIMULATED, THE SPECTRA REPLAY THE TEST DATA
+    DM = sets.DeviceManager(settings)
+    DM.addrs.ldAddr = "SIM::ITC4005"
+    DM.addrs.osaAddr = "SIM::HR4000"
+    DM.addrs.relayAddr = "SIM::RELAY"
+    DM.addrs.purgeAddr = "SIM::PURGE"
+    DM.addrs.osaSeedFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata')
+    start = time.perf_counter()
+    DM.connectDevices()
+    connectTime = time.perf_counter() - start
+    if(DM.allConnected() == False):
+        print("Simulated devices failed to connect")
+        DM.closeDevices()
+        return 1
+
+    try:
+        # WAIT FOR THE FIRST PURGE SYSTEM TELEMETRY
+        while(args.adaptive and DM.purge.getTemperature() == None):
+            time.sleep(0.1)
+
+        app = HeadlessApplication("SIM0001", settings, DM)
+        start = time.perf_counter()
+        app.run_measurement()
+        total = time.perf_counter() - start
+
+    finally:
+        ld = DM.ld.itc
+        transactions, busyTime = ld.transactions, ld.busyTime
+        relayBytes = DM.relay.emulator.bytesIn
+        purgeLines = len(DM.purge.getTelemetry())
+        DM.closeDevices()
+
+    if(app.results == None):
+        print("Measurement did not finish")
+        return 1
+
+    # THE LEAST THE MEASUREMENT CAN TAKE WITH FIXED WAITS
+    emitters, dutyCycles = app.results.present.shape
+    frame = args.integration * 1e-6
+    fixed = emitters * dutyCycles * (args.dwell + (args.frames + 1) * frame) + (emitters - 1) * args.cooldown
+
+    print("\nconnect:      {:7.2f} s".format(connectTime))
+    print("measurement:  {:7.2f} s, {:.2f} s of fixed waits ({:.2f}x)".format(total, fixed, total / fixed))
+    print("spectra:      {} of {}".format(int(np.sum(app.results.present)), len(DUTY_CYCLES) * 6))
+    print("laser driver: {} transactions, {:.2f} s waiting".format(transactions, busyTime))
+    print("relay:        {} bytes received".format(relayBytes))
+    print("purge system: {} telemetry lines".format(purgeLines))
+    print("wavelength slope nm/%: " + " ".join("{:.4f}".format(s) for s in np.ravel(app.results.slope)))
+
+    return 0 if np.all(app.results.present) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:38:12 2026
+
+Time the laser driver commands of one hexel against the simulated ITC4005.
+
+The command sequence of run_measurement is played once the way the laser
+driver used to send it, one transaction per command, and once through
+CurrentSupply with batched queries and the settings cache. The number of
+transactions and the time spent waiting on the instrument are reported
+for each, and the simulator state is checked to be the same at the end. The cached
+sequence is then played on a simulator that replies to SYSTem:ERRor? with
+a signed code, which must not defeat the cache, and a setting above the
+current limit must be rejected and sent again on the retry.
+
+Usage:
+    python visabenchmark.py [-l latency] [-e errorrate]
+"""
+
+import sys, os, argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import laser_driver
+import laser_driver_sim
+
+# ONE HEXEL
+EMITTERS = 6
+DUTY_CYCLES = [10, 25, 50, 75, 90, 99]
+CURRENT = 3.3
+
+def original(inst):
+    """
+    The hexel as the laser driver sent it before batching and caching.
+
+    Returns
+    -------
+    None.
+
+    """
+    for Q in ["OUTPut:PROTection:VOLTage:TRIPped?", "OUTPut:PROTection:EXTernal:TRIPped?",
+              "OUTPut:PROTection:INTLock:TRIPped?", "OUTPut:PROTection:KEYLock:TRIPped?",
+              "OUTPut:PROTection:OTEMp:TRIPped?"]:
+        inst.send(Q)
+    for command in ["SOURce:CURRent:LIMit 3.5", "SOURce:CURRent {}".format(CURRENT), "SOURce:PULse:PERiod 0.002",
+                    "SOURce:FUNCtion:MODE CURRent", "SOURce:FUNCtion:SHAPe PULSE", "SOURce:AM 0"]:
+        inst.write(command)
+
+    for i in range(0, EMITTERS):
+        inst.write(":OUTPut:STATe OFF")
+        for dc in DUTY_CYCLES:
+            if(dc == 100):
+                inst.write("SOURce:FUNC:MODE CURR;SHAP DC")
+            else:
+                inst.write("SOURce:FUNCtion:SHAPe PULSE")
+                inst.write("SOURce:PULSe:DCYCle {}".format(dc))
+            inst.write(":OUTPut:STATe ON")
+            inst.write(":OUTPut:STATe OFF")
+        inst.write(":OUTPut:STATe OFF")
+
+    return
+
+def current(CS):
+    """
+    The hexel through CurrentSupply.
+
+    Returns
+    -------
+    None.
+
+    """
+    CS.protectionQuery()
+    CS.setPresets(current = CURRENT)
+
+    for i in range(0, EMITTERS):
+        CS.switchOff()
+        for dc in DUTY_CYCLES:
+            CS.setDutyCycle(dc)
+            CS.switchOn()
+            CS.switchOff()
+        CS.switchOff()
+
+    return
+
+def main():
+    parser = argparse.ArgumentParser(description = "Time one hexel of laser driver commands on the simulated ITC4005.")
+    parser.add_argument("-l", "--latency", type = float, default = 0.004, help = "seconds per transaction")
+    parser.add_argument("-e", "--errorrate", type = float, default = 0.0, help = "fraction of transactions that fail")
+    args = parser.parse_args()
+    simulation = {"latency" : args.latency, "errorRate" : args.errorrate, "seed" : 1}
+
+    # ORIGINAL COMMAND SEQUENCE
+    old = laser_driver.USBDevice(laser_driver_sim.SIMULATED, simulation)
+    original(old)
+    print("original:  {:4d} transactions, {:.3f} s waiting".format(old.transactions, old.busyTime))
+
+    # BATCHED AND CACHED
+    CS = laser_driver.CurrentSupply(laser_driver_sim.SIMULATED, simulation)
+    current(CS)
+    new = CS.itc
+    print("current:   {:4d} transactions, {:.3f} s waiting ({:.1f}x)".format(new.transactions, new.busyTime, old.busyTime / new.busyTime))
+
+    # BOTH MUST LEAVE THE INSTRUMENT IN THE SAME STATE
+    assert old.inst.settings == new.inst.settings, (old.inst.settings, new.inst.settings)
+    assert len(old.inst.errors) == 0 and len(new.inst.errors) == 0, (old.inst.errors, new.inst.errors)
+    print("Final settings match: {}".format(new.inst.settings))
+
+    # A SIGNED ERROR CODE IS STILL NO ERROR
+    signed = laser_driver.CurrentSupply(laser_driver_sim.SIMULATED, dict(simulation, signedErrors = True))
+    current(signed)
+    assert signed.itc.transactions == new.transactions, (signed.itc.transactions, new.transactions)
+    print("signed:    {:4d} transactions".format(signed.itc.transactions))
+    assert signed.itc.send("SYSTem:ERRor?") == '+0,"No error"'
+
+    # A REJECTED SETTING IS NOT CACHED, THE RETRY IS SENT
+    assert signed.setSettings({"SOURce:CURRent" : 4.0}) == 0 and "SOURce:CURRent" not in signed.shadow
+    transactions = signed.itc.transactions
+    signed.setSettings({"SOURce:CURRent" : 4.0})
+    assert signed.itc.transactions == transactions + 1
+    print("Rejected setting retried.")
+
+    return
+
+if __name__ == "__main__":
+    main()